@@ -2,11 +2,18 @@
 import streamlit as st
 import pandas as pd
 import hopsworks 
-import joblib
 import altair as alt
+import time
+from datetime import date, datetime, timedelta
 
-# Import the functions from the features folder. This is the functions we have created to generate features for weather measures and calendar
-from features import weather_measures, calendar 
+# Import the batch inference stages which precompute the predictions of DK1 and of all price areas every day
+from pipelines import batch_inference, multi_area
+
+# Import the history archive which holds the past electricity prices of DK1 and DK2
+from pipelines import history_archive
+
+# Import the instrumentation which records the load times when PIPELINE_METRICS is set
+from features import instrumentation
 
 # PART 2: Defining the functions for the Streamlit app
 def print_fancy_header(text, font_width="bold", font_size=22, color="#2656a3"):
@@ -18,68 +25,81 @@ def print_fancy_subheader(text, font_width="bold", font_size=22, color="#333"):
     st.markdown(res, unsafe_allow_html=True)  
 
 # We want to cache several functions to avoid running them multiple times
-@st.cache_data()
-def login_hopswork():
+# The Hopsworks project and model are shared resources that are created once per app process
+@st.cache_resource()
+def get_project():
     project = hopsworks.login()
-    fs = project.get_feature_store()
 
-    return fs
+    return project
 
-@st.cache_data()
-def get_feature_view():
-    project = hopsworks.login()
-    fs = project.get_feature_store()
-    feature_view = fs.get_feature_view(
-        name='electricity_training_feature_view',
-        version=1
-    )
+@st.cache_resource()
+def login_hopswork():
+    fs = get_project().get_feature_store()
 
-    return feature_view
+    return fs
 
-@st.cache_data()
+@st.cache_resource()
 def get_model():
-    project = hopsworks.login()
-    mr = project.get_model_registry()
-    retrieved_model = mr.get_model(
-        name="electricity_price_prediction_model",
-        version=1
-    )
-    saved_model_dir = retrieved_model.download()
-    retrieved_xgboost_model = joblib.load(saved_model_dir + "/dk_electricity_model.pkl")
+    # The booster is loaded once in its native format and predicts directly on float32 arrays
+    inference_engine = batch_inference.load_model(get_project())
+
+    return inference_engine
+
+# Timings of the first (cold) load in this app process, shared by all sessions
+@st.cache_resource()
+def cold_start_timings():
+    return {}
+
+def timed(timings, name, func, *args):
+    # Run a function and record its wall time in seconds, also in the metrics file when PIPELINE_METRICS is set
+    start = time.perf_counter()
+    with instrumentation.stage(f'app.{name}'):
+        result = func(*args)
+    timings[name] = time.perf_counter() - start
 
-    return retrieved_xgboost_model
+    return result
 
 # Function to load the dataset
 def load_new_data():
-    # Fetching weather forecast measures for the next 5 days
-    weather_forecast_df = weather_measures.forecast_weather_measures(
-        forecast_length=5
-    )
+    # Fetching the weather forecast for the next 5 days with today's renewable energy forecasts and the danish calendar features
+    return batch_inference.load_new_data(forecast_length=5)
 
-    # Fetching danish calendar
-    calendar_df = calendar.dk_calendar()
+# The predictions only change with the weather forecast, so they are computed once per forecast hour
+@st.cache_data(ttl=3600)
+def load_predictions(forecast_hour):
+    # Load the new data once and the model
+    new_data = load_new_data()
+    model = get_model()
 
-    # Merging the weather forecast and calendar dataframes
-    new_data = pd.merge(weather_forecast_df, calendar_df, how='inner', left_on='date', right_on='date')
+    # Models with lag features also need the prices before the first forecast hour
+    state = None
+    if batch_inference.uses_lag_features(model):
+        state = batch_inference.load_price_state(new_data['timestamp'].min())
 
-    return new_data
+    # Make predictions, returned as a DataFrame with the predictions and the time
+    predictions_df = batch_inference.predict(model, new_data, state)
 
-def load_predictions():
-    # Drop columns 'date', 'datetime', 'timestamp' from the DataFrame 'new_data'
-    data = load_new_data().drop(columns=['date', 'datetime', 'timestamp'])
+    return predictions_df
 
-    # Load the model and make predictions
-    predictions = get_model().predict(data)
+# The daily batch inference writes the predictions to a file, the index tells if they are from today
+@st.cache_data(ttl=600)
+def load_prediction_index(forecast_hour, directory=batch_inference.PREDICTIONS_DIR):
+    index = batch_inference.read_index(directory)
+    if index is None or index['run_date'] != date.today().strftime('%Y-%m-%d'):
+        return None
 
-    # Create a DataFrame with the predictions and the time
-    predictions_data = {
-        'prediction': predictions,
-        'time': load_new_data()["datetime"],
-    }
+    return index
 
-    predictions_df = pd.DataFrame(predictions_data).sort_values(by='time')
+# Read only the forecast dates selected with the slider for the selected price area
+@st.cache_data()
+def load_stored_predictions(index, days, area, directory=batch_inference.PREDICTIONS_DIR):
+    return batch_inference.read_predictions(days=days, directory=directory, index=index, area=area)
 
-    return predictions_df
+# Read only the time and the price column of the selected area for the past days from the history archive
+@st.cache_data(ttl=3600)
+def load_past_prices(days, area):
+    start = (date.today() - timedelta(days=days)).strftime('%Y-%m-%d')
+    return history_archive.get_archive().read('electricity_prices', ['datetime', f'{area.lower()}_spotpricedkk_kwh'], start=start)
 
 # PART 3: Page settings
 st.set_page_config(
@@ -95,24 +115,48 @@ with st.sidebar:
     progress_bar = st.sidebar.header('⚙️ Working Progress')
     progress_bar = st.sidebar.progress(0)
 
-    login_hopswork()
-    progress_bar.progress(40)
+    timings = {}
+    forecast_hour = datetime.now().strftime('%Y-%m-%d %H')
 
-    get_model()
-    progress_bar.progress(80)
+    # Use the predictions precomputed by the daily batch inference when they are from today
+    index = timed(timings, 'Predictions index', load_prediction_index, forecast_hour)
+    if index is not None:
+        progress_bar.progress(100)
+        max_value = len(index['dates'])
+    else:
+        # Otherwise fall back to live inference with the model from the Model Registry
+        area = 'DK1'
+        timed(timings, 'Hopsworks login', login_hopswork)
+        progress_bar.progress(40)
 
-    load_new_data()
-    progress_bar.progress(100)
+        timed(timings, 'Model', get_model)
+        progress_bar.progress(80)
 
-    # Sidebar filter: Date range
-    predictions_df = load_predictions()
+        # Predictions for the current forecast hour, served from the cache on reruns
+        predictions_df = timed(timings, 'Forecast and predictions', load_predictions, forecast_hour)
+        progress_bar.progress(100)
+        max_value = int(len(predictions_df['time'].unique()) / 24)
 
+    # Sidebar filter: Date range
     min_value = 1
-    max_value = int(len(predictions_df['time'].unique()) / 24)
-    default = int(48 / 24)
+    default = min(int(48 / 24), max_value)
 
     date_range = st.sidebar.slider("Select Date Range", min_value=min_value, max_value=max_value, value=default)
 
+    if index is not None:
+        # DK1 is predicted by the DK1 model, the other price areas by the multi-area model. The live inference only predicts DK1
+        stores = {area: (index, batch_inference.PREDICTIONS_DIR) for area in index['areas']}
+        area_index = load_prediction_index(forecast_hour, multi_area.PREDICTIONS_DIR)
+        if area_index is not None:
+            stores = {**{area: (area_index, multi_area.PREDICTIONS_DIR) for area in area_index['areas']}, **stores}
+
+        area = st.sidebar.selectbox("Select Price Area", sorted(stores))
+        area_index, directory = stores[area]
+        predictions_df = timed(timings, 'Stored predictions', load_stored_predictions, area_index, date_range, area, directory)
+
+    # The timings are filled in at the end of the page, after every stage including the charts has run
+    timings_expander = st.expander("⏱️ Load timings")
+
     st.write("© 2024 Camilla Dyg Hannesbo, Benjamin Ly, Tobias Moesgård Jensen")
 
 # PART 4: Main content
@@ -167,7 +211,8 @@ st.write(3 * "-")
 visualization_option = st.selectbox(
     "Select Visualization 🎨", 
     ["Matrix for forecasted Electricity Prices", 
-    "Linechart for forecasted Electricity Prices"]
+    "Linechart for forecasted Electricity Prices",
+    "Linechart for past Electricity Prices"]
 )
 
 filtered_predictions_df = predictions_df.head(date_range * 24)
@@ -213,3 +258,45 @@ elif visualization_option == "Linechart for forecasted Electricity Prices":
 
     # Display the chart
     st.altair_chart(chart, use_container_width=True)
+
+# Linechart of the past prices based on user selection
+elif visualization_option == "Linechart for past Electricity Prices":
+    def show_past_prices(days, area):
+        past_prices_df = load_past_prices(days, area)
+
+        if past_prices_df.empty:
+            st.info("The history archive has no electricity prices yet. They are added by the backfill and the daily feature pipeline.")
+            return
+
+        # Create Altair chart with line and dots
+        chart = alt.Chart(past_prices_df.rename(columns={f'{area.lower()}_spotpricedkk_kwh': 'price'})).mark_line(point=True).encode(
+            x='datetime:T',
+            y='price:Q',
+            tooltip=[alt.Tooltip('datetime:T', title='Date', format='%d-%m-%Y'),
+                     alt.Tooltip('datetime:T', title='Time', format='%H:%M'),
+                     alt.Tooltip('price:Q', title='Spot Price (DKK)', format='.2f')
+                    ]
+        )
+        # Make a markdown description for the line chart
+        st.markdown(f"""
+            This is a line chart of the electricity prices of {area} for the past days. The user can change the date range in the sidebar.
+            \n The plot is interactive which ables the user to hover over the line to see the exact price at a specific time.
+
+        """)
+
+        # Display the chart
+        st.altair_chart(chart, use_container_width=True)
+
+    # The load from the history archive and the chart are timed together
+    timed(timings, 'Past prices and chart', show_past_prices, date_range, area)
+
+# Keep the timings of the first load to compare the cold start with this rerun
+cold_timings = cold_start_timings()
+if not cold_timings:
+    cold_timings.update(timings)
+
+# Show the timings of all stages in the sidebar
+timings_expander.table(pd.DataFrame({
+    'Cold start (s)': pd.Series(cold_timings),
+    'This rerun (s)': pd.Series(timings),
+}).round(3))
@@ -0,0 +1,92 @@
+"""
+Latency and throughput benchmark of the model inference paths.
+
+Trains an XGBoost Regressor on synthetic data with the features of the model (weather, calendar and
+lag features) and compares the joblib path, XGBRegressor.predict on a DataFrame, with the
+InferenceEngine on the native booster, both from a DataFrame and from a float32 array. Measures the
+model load time and the prediction latency of a single hour, a 120-hour horizon and a 120-hour
+horizon batched over many locations.
+
+Run from the repository root:
+    python -m benchmarks.bench_inference --locations 500 --nthread 1
+"""
+import argparse
+import os
+import tempfile
+import time
+import joblib
+import numpy as np
+import pandas as pd
+import xgboost as xgb
+from features.lag_features import feature_names
+from pipelines.inference_engine import InferenceEngine, export_model
+
+
+FEATURES = [
+    'hour', 'temperature_2m', 'relative_humidity_2m', 'precipitation', 'rain', 'snowfall', 'weather_code',
+    'cloud_cover', 'wind_speed_10m', 'wind_gusts_10m', 'dayofweek', 'day', 'month', 'year', 'workday',
+] + feature_names(['dk1_spotpricedkk_kwh'])
+
+
+def synthetic_features(rows: int, rng: np.random.Generator) -> pd.DataFrame:
+    return pd.DataFrame(rng.random((rows, len(FEATURES))).astype(np.float32) * 100, columns=FEATURES)
+
+
+def median_seconds(func, repeats: int) -> float:
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--locations', type=int, default=500, help='Number of locations in the batched scenario.')
+    parser.add_argument('--nthread', type=int, default=1, help='Threads of the inference engine and the joblib model.')
+    parser.add_argument('--n-estimators', type=int, default=100, help='Number of trees of the model.')
+    parser.add_argument('--repeats', type=int, default=50, help='Repeats per measurement, the median is reported.')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    train = synthetic_features(20_000, rng)
+    model = xgb.XGBRegressor(n_estimators=args.n_estimators, n_jobs=args.nthread)
+    model.fit(train, rng.random(len(train)))
+
+    with tempfile.TemporaryDirectory() as model_dir:
+        joblib.dump(model, os.path.join(model_dir, 'dk_electricity_model.pkl'))
+        export_model(model, model_dir)
+
+        load_joblib = median_seconds(lambda: joblib.load(os.path.join(model_dir, 'dk_electricity_model.pkl')), 10)
+        load_engine = median_seconds(lambda: InferenceEngine.load(model_dir, args.nthread), 10)
+        model = joblib.load(os.path.join(model_dir, 'dk_electricity_model.pkl'))
+        engine = InferenceEngine.load(model_dir, args.nthread)
+
+    print(f"{'model load':<28}{'joblib ms':>12}{'engine ms':>12}")
+    print(f"{'':<28}{load_joblib * 1000:>12.2f}{load_engine * 1000:>12.2f}\n")
+
+    scenarios = {
+        'single hour': 1,
+        '120-hour horizon': 120,
+        f'120 hours x {args.locations} locations': 120 * args.locations,
+    }
+
+    print(f"{'scenario':<28}{'rows':>8}{'joblib ms':>12}{'engine df ms':>14}{'engine ms':>12}{'speedup':>9}{'engine rows/s':>15}")
+    for name, rows in scenarios.items():
+        df = synthetic_features(rows, rng)
+        X = engine.to_array(df)
+
+        # The predictions of both paths must be the same
+        assert np.allclose(model.predict(df), engine.predict(X), atol=1e-5)
+
+        repeats = max(3, args.repeats // max(1, rows // 1000))
+        joblib_seconds = median_seconds(lambda: model.predict(df), repeats)
+        engine_df_seconds = median_seconds(lambda: engine.predict(engine.to_array(df)), repeats)
+        engine_seconds = median_seconds(lambda: engine.predict(X), repeats)
+
+        print(f"{name:<28}{rows:>8}{joblib_seconds * 1000:>12.3f}{engine_df_seconds * 1000:>14.3f}{engine_seconds * 1000:>12.3f}{joblib_seconds / engine_seconds:>8.1f}x{rows / engine_seconds:>15,.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+Offline benchmark suite of the feature fetchers, the calendar, the merge step and the prediction on
+synthetic API data.
+
+Every request of the fetchers is answered by benchmarks.fixtures.OfflineAdapter mounted on the shared
+session with a synthetic payload of the requested range, so the runs are reproducible without network
+access. The payloads have the JSON shape of the APIs, but not the irregularities of real responses such
+as the repeated and missing hours of the daylight saving changes or empty pages. No recorded responses
+are committed, responses recorded locally with 'python -m benchmarks.fixtures record' are used instead
+of the synthetic payloads of the same requests and counted as 'recorded_fixtures' in the results.
+
+Each benchmark runs once to build the payloads, then its median wall time over the repeats is measured,
+and one more run under tracemalloc gives the peak memory. The sizes are 1 day, 1 year and 5 years of
+hourly data for the DK1 and DK2 price areas and the population weighted location grids of both areas.
+
+Results are appended with the current commit to benchmarks/results/offline.jsonl, --compare prints the
+change against the last results of an earlier commit.
+
+Run from the repository root:
+    python -m benchmarks.bench_offline --sizes 1d 1y 5y --compare
+"""
+import argparse
+import copy
+import json
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from benchmarks.fixtures import OfflineAdapter, install
+from features import calendar, electricity_prices, instrumentation, weather_measures
+from features import cache as feature_cache
+
+
+# Days of hourly data per size, ending on a fixed date so the payloads do not change between runs
+SIZES = {'1d': 1, '1y': 365, '5y': 1826}
+END_DATE = '2024-12-31'
+
+RESULTS_PATH = Path(__file__).resolve().parent / 'results' / 'offline.jsonl'
+
+
+def git_commit() -> tuple:
+    # Short hash of the checked out commit and whether the working tree has changes
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, dirty
+
+
+def rows(result) -> int:
+    if isinstance(result, tuple):
+        result = result[0]
+    return len(result)
+
+
+def measure(func, adapter: OfflineAdapter, repeats: int) -> tuple:
+    # The first call builds the payloads of the adapter and is not measured
+    result = func()
+
+    # Bytes received by one call
+    bytes_before, requests_before = adapter.bytes_sent, adapter.requests
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    bytes_received = (adapter.bytes_sent - bytes_before) / repeats
+    requests = (adapter.requests - requests_before) / repeats
+
+    # Peak memory traced during one more call
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {
+        'seconds': float(np.median(timings)),
+        'rows': rows(result),
+        'requests': requests,
+        'mb_received': bytes_received / 1024 ** 2,
+        'peak_mb': peak / 1024 ** 2,
+    }
+
+
+def train_model(features: pd.DataFrame):
+    # Model with the features of the merged frame and the lag features of the DK1 price, trained on random
+    # values so its trees are the same for every size
+    import xgboost as xgb
+    from features.lag_features import add_lag_features
+    from pipelines.inference_engine import InferenceEngine
+    from pipelines.training_pipeline import split_target
+
+    X, _ = add_lag_features(features, columns=['dk1_spotpricedkk_kwh'])
+    X, _ = split_target(X)
+    rng = np.random.default_rng(42)
+    model = xgb.XGBRegressor(n_estimators=100, max_depth=6, n_jobs=1)
+    model.fit(pd.DataFrame(rng.random((20_000, X.shape[1])), columns=X.columns), rng.random(20_000))
+
+    return InferenceEngine.from_model(model)
+
+
+def check_lag_features(renewable_energy: pd.DataFrame) -> None:
+    # The lagged columns are found by name, so a renamed fetcher column would silently drop their features
+    from features.lag_features import add_lag_features, feature_names, lag_columns
+
+    columns = lag_columns(renewable_energy)
+    assert columns, f"No renewable forecast columns get lag features: {list(renewable_energy.columns)}"
+
+    features, _ = add_lag_features(renewable_energy)
+    missing = [name for name in feature_names(columns) if name not in features.columns]
+    assert not missing, f"Lag features missing for the renewable forecasts: {missing}"
+
+
+def run_size(size: str, days: int, adapter: OfflineAdapter, locations: list, repeats: int, engine=None) -> tuple:
+    """
+    Runs the benchmarks of one size.
+
+    Parameters:
+    - size (str): Name of the size, e.g. '1y'.
+    - days (int): Days of hourly data.
+    - adapter (OfflineAdapter): Adapter mounted on the shared session.
+    - locations (list): Locations of the multi-location weather fetcher.
+    - repeats (int): Measured repeats per benchmark.
+    - engine (InferenceEngine): Engine used for the prediction benchmarks. Default is a model trained on this size.
+
+    Returns:
+    - tuple: Results per benchmark name and the engine.
+    """
+
+    from features.lag_features import LagState, add_lag_features
+    from pipelines import batch_inference
+    from pipelines.concurrent_fetch import merge_features
+
+    end = END_DATE
+    start = (pd.Timestamp(end) - pd.Timedelta(days=days - 1)).strftime('%Y-%m-%d')
+
+    # Long ranges use the windowed and paged backfill mode, the cache is bypassed so every call parses the responses
+    backfill = days > 31
+    results, frames = {}, {}
+
+    frames['electricity'], results['electricity_prices'] = measure(lambda: electricity_prices.electricity_prices(historical=True, area=['DK1', 'DK2'], start=start, end=end, backfill=backfill, cache=False), adapter, repeats)
+    frames['renewable_energy'], results['forecast_renewable_energy'] = measure(lambda: electricity_prices.forecast_renewable_energy(historical=True, area=['DK1', 'DK2'], start=start, end=end, backfill=backfill, cache=False), adapter, repeats)
+    frames['weather'], results['historical_weather_measures'] = measure(lambda: weather_measures.historical_weather_measures(historical=True, start=start, end=end, cache=False), adapter, repeats)
+    _, results['forecast_weather_measures'] = measure(lambda: weather_measures.forecast_weather_measures(forecast_length=min(days, 16), cache=False), adapter, repeats)
+    _, results['multi_location_weather_measures'] = measure(lambda: weather_measures.multi_location_weather_measures(locations, historical=True, start=start, end=end, aggregate=True, cache=False), adapter, repeats)
+    _, results['dk_calendar'] = measure(lambda: calendar.dk_calendar(start, end), adapter, repeats)
+    check_lag_features(frames['renewable_energy'])
+
+    merged, results['merge'] = measure(lambda: merge_features(frames), adapter, repeats)
+
+    # Prediction of every merged hour in one batch, and the recursive 120 hour horizon of the batch inference
+    engine = engine or train_model(merged)
+    features, _ = add_lag_features(merged, columns=['dk1_spotpricedkk_kwh'])
+    X = engine.to_array(features)
+    _, results['predict'] = measure(lambda: engine.predict(X), adapter, repeats)
+
+    horizon = merged.tail(120).reset_index(drop=True)
+    history = merged.iloc[:-len(horizon)] if len(merged) > len(horizon) else merged.iloc[:0]
+    history_state = LagState(['dk1_spotpricedkk_kwh'])
+    if not history.empty:
+        history_state.push(history)
+    # Every run starts from a copy of the state, the predictions are pushed into it
+    _, results['predict_horizon'] = measure(lambda: batch_inference.predict(engine, horizon, copy.deepcopy(history_state)), adapter, repeats)
+
+    return results, engine
+
+
+def previous_results(path: Path, commit: str) -> dict:
+    # Last result per benchmark and size of an earlier commit
+    if not path.exists():
+        return {}
+
+    previous = {}
+    with open(path) as file:
+        for line in file:
+            record = json.loads(line)
+            if record.get('commit') != commit:
+                previous[(record['benchmark'], record['size'])] = record
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=['1d', '1y'], help='Sizes of the payloads.')
+    parser.add_argument('--repeats', type=int, default=5, help='Measured repeats per benchmark, the median is reported.')
+    parser.add_argument('--locations', type=int, default=None, help='Number of locations of the multi-location fetcher. Default is the DK1 and DK2 grids.')
+    parser.add_argument('--output', default=str(RESULTS_PATH), help='JSONL file the results are appended to.')
+    parser.add_argument('--compare', action='store_true', help='Print the change against the last results of an earlier commit.')
+    args = parser.parse_args()
+
+    # No metrics file and an empty response cache, every request goes to the adapter
+    instrumentation.configure(None)
+    feature_cache.CACHE_DIR = Path(tempfile.mkdtemp())
+    adapter = OfflineAdapter()
+    install(adapter)
+
+    locations = weather_measures.LOCATION_GRIDS['DK1'] + weather_measures.LOCATION_GRIDS['DK2']
+    locations = locations[:args.locations] if args.locations else locations
+
+    commit, dirty = git_commit()
+    previous = previous_results(Path(args.output), commit) if args.compare else {}
+
+    records, engine = [], None
+    print(f"{'benchmark':<34}{'size':>5}{'rows':>10}{'ms':>11}{'rows/s':>13}{'MB in':>9}{'MB/s':>9}{'peak MB':>9}" + (f"{'vs prev':>9}" if args.compare else ''))
+    for size in args.sizes:
+        results, engine = run_size(size, SIZES[size], adapter, locations, args.repeats, engine)
+
+        for name, result in results.items():
+            record = {
+                'benchmark': name, 'size': size, **result,
+                'rows_per_s': result['rows'] / result['seconds'] if result['seconds'] else None,
+                'mb_per_s': result['mb_received'] / result['seconds'] if result['seconds'] else None,
+                'commit': commit, 'dirty': dirty, 'recorded_fixtures': adapter.recorded,
+                'time': datetime.now().isoformat(timespec='seconds'),
+            }
+            records.append(record)
+
+            change = ''
+            if args.compare:
+                before = previous.get((name, size))
+                change = f"{before['seconds'] / result['seconds']:>8.2f}x" if before else f"{'-':>9}"
+            print(f"{name:<34}{size:>5}{result['rows']:>10,}{result['seconds'] * 1000:>11.2f}{record['rows_per_s']:>13,.0f}{result['mb_received']:>9.2f}{record['mb_per_s']:>9.1f}{result['peak_mb']:>9.1f}{change}")
+
+    output = Path(args.output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'a') as file:
+        for record in records:
+            file.write(json.dumps(record) + '\n')
+
+    print(f"\n{adapter.requests} requests served offline, {adapter.requests - adapter.recorded} synthetic and {adapter.recorded} from recorded fixtures, results appended to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of the reshaping of long Energi Data Service records into wide feature columns.
+
+Compares the previous melt -> string concatenation -> pivot_table path with features.reshape.wide_frame
+on synthetic multi-year renewable energy forecasts (hours x price areas x forecast types), reporting
+wall time and peak traced memory.
+
+Run from the repository root:
+    python -m benchmarks.bench_reshape --years 5
+"""
+import argparse
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from features.reshape import wide_frame
+from features.time_utils import normalise_time
+
+
+INDEX = ['timestamp', 'datetime', 'date', 'hour']
+
+
+def synthetic_forecasts(years: int, areas: list, forecast_types: list) -> pd.DataFrame:
+    # One row per hour, price area and forecast type like the 'Forecasts_Hour' dataset
+    hours = pd.date_range('2020-01-01', periods=years * 365 * 24, freq='H')
+    df = pd.DataFrame({
+        'HourDK': np.repeat(hours.strftime('%Y-%m-%dT%H:%M:%S'), len(areas) * len(forecast_types)),
+        'PriceArea': np.tile(np.repeat(areas, len(forecast_types)), len(hours)),
+        'ForecastType': np.tile(forecast_types, len(hours) * len(areas)),
+    })
+    df['ForecastIntraday_KWH'] = np.random.default_rng(42).random(len(df)) * 1000
+    return normalise_time(df, 'HourDK', '%Y-%m-%dT%H:%M:%S').drop(columns='HourDK')
+
+
+def melt_pivot(df: pd.DataFrame) -> pd.DataFrame:
+    # The previous implementation of forecast_renewable_energy
+    reordered_df = df.melt(id_vars=INDEX + ["PriceArea", "ForecastType"], var_name="attribute", value_name="value")
+    reordered_df["heading"] = reordered_df["PriceArea"] + "_" + reordered_df["ForecastType"] + "_" + reordered_df["attribute"]
+    reordered_df.drop(columns=["PriceArea"], inplace=True)
+    reordered_df.drop(columns=["ForecastType"], inplace=True)
+    reordered_df.drop(columns=["attribute"], inplace=True)
+    wide = reordered_df.pivot_table(index=INDEX, columns="heading", values="value").reset_index()
+    wide.columns = list(map(str.lower, wide.columns))
+    wide.columns = wide.columns.str.replace(' ', '_')
+    return wide
+
+
+def direct(df: pd.DataFrame) -> pd.DataFrame:
+    return wide_frame(df, index=INDEX, columns=['PriceArea', 'ForecastType'], value='ForecastIntraday_KWH')
+
+
+def measure(func, df: pd.DataFrame) -> tuple:
+    # Wall time and peak memory traced while reshaping
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(df)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5, help='Number of years of hourly data.')
+    args = parser.parse_args()
+
+    df = synthetic_forecasts(args.years, ['DK1', 'DK2'], ['Solar', 'Onshore Wind', 'Offshore Wind'])
+
+    old_time, old_peak, old = measure(melt_pivot, df)
+    new_time, new_peak, new = measure(direct, df)
+
+    # Both implementations must produce identical frames
+    pd.testing.assert_frame_equal(old, new)
+
+    print(f"input rows: {len(df):,} -> {len(new):,} wide rows")
+    print(f"melt/pivot: {old_time:.3f} s, peak {old_peak / 2**20:.1f} MiB")
+    print(f"unstack:    {new_time:.3f} s, peak {new_peak / 2**20:.1f} MiB")
+    print(f"speedup:    {old_time / new_time:.1f}x, memory {old_peak / new_peak:.1f}x lower")
+
+
+if __name__ == "__main__":
+    main()
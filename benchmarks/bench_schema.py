@@ -0,0 +1,91 @@
+"""
+Memory benchmark of the declared feature schemas.
+
+Builds multi-year hourly electricity, renewable forecast, weather and calendar frames with the
+previous float64/int64/object dtypes, enforces the schemas from features.schema and compares the
+in-memory size and the Parquet size used for feature-store uploads. Fails if an hourly frame does
+not shrink by at least the required ratio. The calendar has one row per unique date, so it is only
+reported.
+
+Run from the repository root:
+    python -m benchmarks.bench_schema --years 5
+"""
+import argparse
+import io
+import sys
+import numpy as np
+import pandas as pd
+from features.schema import enforce_schema, ELECTRICITY_SCHEMA, RENEWABLE_FORECAST_SCHEMA, WEATHER_SCHEMA, CALENDAR_SCHEMA
+
+
+def hourly_frame(years: int, columns: list, rng: np.random.Generator) -> pd.DataFrame:
+    # Time columns like the fetchers returned them before the schemas
+    hours = pd.date_range('2020-01-01', periods=years * 365 * 24, freq='H')
+    df = pd.DataFrame({
+        'timestamp': hours.values.view('int64') // 1_000_000,
+        'datetime': hours,
+        'date': hours.strftime('%Y-%m-%d').astype(object),
+        'hour': hours.hour.astype('int64'),
+    })
+    for column in columns:
+        df[column] = rng.random(len(df)) * 100
+    return df
+
+
+def synthetic_frames(years: int) -> dict:
+    rng = np.random.default_rng(42)
+
+    electricity = hourly_frame(years, ['dk1_spotpricedkk_kwh', 'dk2_spotpricedkk_kwh'], rng)
+    renewable = hourly_frame(years, [f'{area}_{kind}_forecastintraday_kwh' for area in ['dk1', 'dk2'] for kind in ['offshore_wind', 'onshore_wind', 'solar']], rng)
+    weather = hourly_frame(years, [column for column in WEATHER_SCHEMA if column not in ['timestamp', 'datetime', 'date', 'hour']], rng)
+    weather['weather_code'] = rng.integers(0, 100, len(weather)).astype('float64')
+
+    days = pd.date_range('2020-01-01', periods=years * 365, freq='D')
+    calendar = pd.DataFrame({
+        'date': days.strftime('%Y-%m-%d').astype(object),
+        'dayofweek': days.dayofweek.astype('int64'),
+        'day': days.day.astype('int64'),
+        'month': days.month.astype('int64'),
+        'year': days.year.astype('int64'),
+        'workday': (days.dayofweek < 5).astype('int64'),
+    })
+
+    return {
+        'electricity': (electricity, ELECTRICITY_SCHEMA),
+        'renewable forecast': (renewable, RENEWABLE_FORECAST_SCHEMA),
+        'weather': (weather, WEATHER_SCHEMA),
+        'calendar': (calendar, CALENDAR_SCHEMA),
+    }
+
+
+def parquet_size(df: pd.DataFrame) -> int:
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.tell()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=5, help='Number of years of hourly data.')
+    parser.add_argument('--min-reduction', type=float, default=0.5, help='Required reduction of the in-memory size.')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'feature group':<20}{'before MiB':>12}{'after MiB':>12}{'reduction':>11}{'parquet before':>16}{'parquet after':>15}")
+    for name, (df, schema) in synthetic_frames(args.years).items():
+        compact = enforce_schema(df, schema)
+
+        before = df.memory_usage(deep=True).sum()
+        after = compact.memory_usage(deep=True).sum()
+        reduction = 1 - after / before
+        if name != 'calendar':
+            failed |= reduction < args.min_reduction
+
+        print(f"{name:<20}{before / 2**20:>12.1f}{after / 2**20:>12.1f}{reduction:>10.0%}{parquet_size(df) / 2**20:>15.1f}M{parquet_size(compact) / 2**20:>14.1f}M")
+
+    if failed:
+        sys.exit(f"An hourly feature group shrank by less than {args.min_reduction:.0%}")
+
+
+if __name__ == "__main__":
+    main()
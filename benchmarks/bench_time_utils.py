@@ -0,0 +1,69 @@
+"""
+Benchmark of the time normalisation used by the feature fetchers.
+
+Compares the previous per-row approach (strptime/strftime in Series.map, parsing twice with
+pd.to_datetime and Series.apply for the timestamp) with the vectorized features.time_utils.
+
+Run from the repository root:
+    python -m benchmarks.bench_time_utils --rows 1000000
+"""
+import argparse
+import time
+from datetime import datetime
+import pandas as pd
+from features.time_utils import normalise_time
+
+
+def synthetic_hours(rows: int) -> pd.DataFrame:
+    # Hourly 'HourDK' strings as returned by Energi Data Service
+    hours = pd.date_range('2000-01-01', periods=rows, freq='H')
+    return pd.DataFrame({'HourDK': hours.strftime('%Y-%m-%dT%H:%M:%S')})
+
+
+def per_row(df: pd.DataFrame) -> pd.DataFrame:
+    # The previous implementation of the fetchers
+    df["date"] = df["HourDK"].map(lambda x: datetime.strptime(x, '%Y-%m-%dT%H:%M:%S').strftime("%Y-%m-%d"))
+    df['datetime'] = pd.to_datetime(df['HourDK'])
+    df['hour'] = pd.to_datetime(df['datetime']).dt.hour
+    df["timestamp"] = df["datetime"].apply(lambda x: int(x.timestamp() * 1000))
+    return df
+
+
+def vectorized(df: pd.DataFrame) -> pd.DataFrame:
+    return normalise_time(df, 'HourDK', '%Y-%m-%dT%H:%M:%S')
+
+
+def best_of(func, df: pd.DataFrame, repeat: int) -> tuple:
+    # Best wall time of several runs on fresh copies of the input
+    timings = []
+    for _ in range(repeat):
+        data = df.copy()
+        start = time.perf_counter()
+        result = func(data)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=1_000_000, help='Number of synthetic hourly rows.')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per implementation.')
+    args = parser.parse_args()
+
+    df = synthetic_hours(args.rows)
+
+    old_time, old = best_of(per_row, df, args.repeat)
+    new_time, new = best_of(vectorized, df, args.repeat)
+
+    # Both implementations must produce identical columns
+    columns = ['date', 'datetime', 'hour', 'timestamp']
+    pd.testing.assert_frame_equal(old[columns], new[columns])
+
+    print(f"rows:       {args.rows:,}")
+    print(f"per-row:    {old_time:.3f} s")
+    print(f"vectorized: {new_time:.3f} s")
+    print(f"speedup:    {old_time / new_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
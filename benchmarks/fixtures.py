@@ -0,0 +1,312 @@
+"""
+Synthetic API data for the benchmarks: a requests transport adapter that serves Energi Data Service
+and Open-Meteo responses without the network.
+
+Mounted on the shared session of features.api_client.get_session(), the adapter answers every request
+of the fetchers with a synthetic payload in the JSON shape of the API, generated from the query (date
+range, paging, price area filter and locations). The payloads are regular hourly series: they have no
+repeated or missing hours at the daylight saving changes and no empty pages. Bodies are kept in memory,
+so repeated requests return the same bytes and the benchmarks measure the fetchers rather than the
+payload generation.
+
+No recorded responses are committed. Responses recorded locally, with network access, into
+benchmarks/fixtures/ are served instead of the synthetic payloads of the same requests:
+    python -m benchmarks.fixtures record --start 2024-01-01 --end 2024-01-07
+"""
+import argparse
+import gzip
+import json
+import threading
+import zlib
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import numpy as np
+import pandas as pd
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from features.api_client import get_session
+from features.cache import cache_key
+
+
+# Locally recorded responses, one gzipped JSON body per request, not committed
+FIXTURE_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+# Price areas and forecast types of the synthetic Energi Data Service records
+AREAS = ['DK1', 'DK2']
+FORECAST_TYPES = ['Solar', 'Onshore Wind', 'Offshore Wind']
+HOURLY_MEASURES = ['temperature_2m', 'relative_humidity_2m', 'precipitation', 'rain', 'snowfall', 'weather_code', 'cloud_cover', 'wind_speed_10m', 'wind_gusts_10m']
+
+
+def request_key(url: str) -> str:
+    # The same request always gets the same key, independent of the order of the query parameters
+    parts = urlsplit(url)
+    return cache_key(parts.netloc + parts.path, dict(sorted(parse_qsl(parts.query))))
+
+
+def _rng(*values) -> np.random.Generator:
+    # Deterministic values per dataset, area or location
+    return np.random.default_rng(zlib.crc32(repr(values).encode()))
+
+
+def _hours(start: str, end: str) -> pd.DatetimeIndex:
+    # Hours from the start to the end of the query, Energi Data Service ends at 'T23:59', Open-Meteo at the end date
+    return pd.date_range(pd.Timestamp(start).floor('D'), pd.Timestamp(end).floor('D') + pd.Timedelta(hours=23), freq='H')
+
+
+def elspotprices_records(start: str, end: str, areas: list = AREAS) -> pd.DataFrame:
+    """
+    Synthetic 'Elspotprices' records, newest hour first like the 'HourUTC DESC' sort of the fetchers.
+
+    Parameters:
+    - start (str): 'start' of the query, e.g. '2024-01-01T00:00'.
+    - end (str): 'end' of the query, e.g. '2024-01-31T23:59'.
+    - areas (list): Price areas. Default is AREAS.
+
+    Returns:
+    - pd.DataFrame: One record per hour and price area.
+    """
+
+    hours = _hours(start, end)[::-1]
+    frames = []
+    for area in areas:
+        # Daily price profile with noise, in DKK per MWh
+        prices = 600 + 300 * np.sin(2 * np.pi * hours.hour.values / 24) + _rng('Elspotprices', area).normal(0, 80, len(hours))
+        frames.append(pd.DataFrame({
+            'HourUTC': (hours - pd.Timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S'),
+            'HourDK': hours.strftime('%Y-%m-%dT%H:%M:%S'),
+            'PriceArea': area,
+            'SpotPriceDKK': prices.round(2),
+            'SpotPriceEUR': (prices / 7.45).round(2),
+        }))
+
+    # Interleave the areas per hour like the API
+    return pd.concat(frames).sort_index(kind='stable').reset_index(drop=True)
+
+
+def forecasts_hour_records(start: str, end: str, areas: list = AREAS, forecast_types: list = FORECAST_TYPES) -> pd.DataFrame:
+    """
+    Synthetic 'Forecasts_Hour' records with every forecast column of the dataset.
+
+    Parameters:
+    - start (str): 'start' of the query.
+    - end (str): 'end' of the query.
+    - areas (list): Price areas. Default is AREAS.
+    - forecast_types (list): Forecast types. Default is FORECAST_TYPES.
+
+    Returns:
+    - pd.DataFrame: One record per hour, price area and forecast type.
+    """
+
+    hours = _hours(start, end)
+    n = len(hours) * len(areas) * len(forecast_types)
+    times = np.repeat(hours.strftime('%Y-%m-%dT%H:%M:%S'), len(areas) * len(forecast_types))
+    values = _rng('Forecasts_Hour', tuple(areas)).random((5, n)).round(3) * 1000
+
+    return pd.DataFrame({
+        'HourUTC': times, 'HourDK': times,
+        'PriceArea': np.tile(np.repeat(areas, len(forecast_types)), len(hours)),
+        'ForecastType': np.tile(forecast_types, len(hours) * len(areas)),
+        'ForecastDayAhead': values[0], 'Forecast5Hour': values[1], 'Forecast1Hour': values[2],
+        'ForecastCurrent': values[3], 'ForecastIntraday': values[4],
+        'TimestampUTC': times, 'TimestampDK': times,
+    })
+
+
+def open_meteo_hourly(start: str, end: str, latitude: float, longitude: float) -> dict:
+    """
+    Synthetic Open-Meteo response of one location.
+
+    Parameters:
+    - start (str): First date.
+    - end (str): Last date (inclusive).
+    - latitude (float): Latitude of the location.
+    - longitude (float): Longitude of the location.
+
+    Returns:
+    - dict: Response with the 'hourly' arrays of HOURLY_MEASURES.
+    """
+
+    hours = _hours(start, end)
+    rng = _rng('open-meteo', latitude, longitude)
+    hourly = {'time': hours.strftime('%Y-%m-%dT%H:%M').tolist()}
+    for measure in HOURLY_MEASURES:
+        if measure in ('relative_humidity_2m', 'weather_code', 'cloud_cover'):
+            hourly[measure] = rng.integers(0, 100, len(hours)).tolist()
+        else:
+            hourly[measure] = rng.normal(8, 5, len(hours)).round(1).tolist()
+
+    return {'latitude': latitude, 'longitude': longitude, 'hourly_units': {}, 'hourly': hourly}
+
+
+class OfflineAdapter(BaseAdapter):
+    """
+    Transport adapter answering the requests of the fetchers with synthetic responses, or with recorded ones when they exist.
+    """
+
+    def __init__(self, fixture_dir: Path = FIXTURE_DIR, areas: list = AREAS):
+        super().__init__()
+        self.fixture_dir = Path(fixture_dir)
+        self.areas = list(areas)
+        self.bodies = {}
+        self.records = {}
+        self.requests = 0
+        self.bytes_sent = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+
+    def _energidataservice(self, dataset: str, query: dict) -> bytes:
+        # Build the full range once, every page of the range is a slice of it
+        areas = json.loads(query['filter'])['PriceArea'] if 'filter' in query else self.areas
+        range_key = (dataset, query['start'], query['end'], tuple(areas))
+        if range_key not in self.records:
+            if dataset == 'Elspotprices':
+                self.records[range_key] = elspotprices_records(query['start'], query['end'], areas)
+            else:
+                self.records[range_key] = forecasts_hour_records(query['start'], query['end'], areas)
+        records = self.records[range_key]
+
+        offset = int(query.get('offset', 0))
+        limit = int(query.get('limit', len(records)))
+        page = records.iloc[offset:offset + limit]
+
+        return ('{"total":%d,"limit":%d,"dataset":"%s","records":%s}' % (len(records), limit, dataset, page.to_json(orient='records'))).encode()
+
+    def _open_meteo(self, path: str, query: dict) -> bytes:
+        # Forecasts without dates start today, one entry per location when several are requested
+        if 'start_date' in query:
+            start, end = query['start_date'], query['end_date']
+        else:
+            today = pd.Timestamp.today().floor('D')
+            start, end = str(today.date()), str((today + pd.Timedelta(days=int(query.get('forecast_days', 7)) - 1)).date())
+
+        latitudes = [float(value) for value in query['latitude'].split(',')]
+        longitudes = [float(value) for value in query['longitude'].split(',')]
+        body = [open_meteo_hourly(start, end, lat, lon) for lat, lon in zip(latitudes, longitudes)]
+
+        return json.dumps(body if len(body) > 1 else body[0]).encode()
+
+    def body(self, url: str) -> bytes:
+        """
+        Returns the recorded body of a request, or a synthetic one when it was not recorded.
+
+        Parameters:
+        - url (str): Full URL of the request with its query.
+
+        Returns:
+        - bytes: The JSON body.
+        """
+
+        key = request_key(url)
+        with self._lock:
+            if key in self.bodies:
+                return self.bodies[key]
+
+        path = self.fixture_dir / f'{key}.json.gz'
+        if path.exists():
+            body = gzip.decompress(path.read_bytes())
+            self.recorded += 1
+        else:
+            parts = urlsplit(url)
+            query = dict(parse_qsl(parts.query))
+            if 'energidataservice' in parts.netloc:
+                body = self._energidataservice(parts.path.rsplit('/', 1)[1], query)
+            else:
+                body = self._open_meteo(parts.path, query)
+
+        with self._lock:
+            self.bodies[key] = body
+        return body
+
+    def send(self, request, **kwargs) -> requests.Response:
+        body = self.body(request.url)
+
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body
+        response.headers['Content-Type'] = 'application/json'
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(body)
+        return response
+
+    def close(self) -> None:
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Transport adapter that sends the requests to the APIs and saves every response as a fixture.
+    """
+
+    def __init__(self, fixture_dir: Path = FIXTURE_DIR):
+        super().__init__(max_retries=3)
+        self.fixture_dir = Path(fixture_dir)
+
+    def send(self, request, **kwargs) -> requests.Response:
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            self.fixture_dir.mkdir(parents=True, exist_ok=True)
+            (self.fixture_dir / f'{request_key(request.url)}.json.gz').write_bytes(gzip.compress(response.content))
+        return response
+
+
+def install(adapter: BaseAdapter) -> requests.Session:
+    """
+    Mounts an adapter on the shared session of the fetchers, for both http and https.
+
+    Parameters:
+    - adapter (BaseAdapter): OfflineAdapter or RecordingAdapter.
+
+    Returns:
+    - requests.Session: The shared session.
+    """
+
+    session = get_session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def record(start: str, end: str, fixture_dir: Path = FIXTURE_DIR) -> int:
+    """
+    Records the responses of every fetcher for a date range.
+
+    Parameters:
+    - start (str): First date in 'YYYY-MM-DD' format.
+    - end (str): Last date in 'YYYY-MM-DD' format.
+    - fixture_dir (Path): Directory of the fixtures. Default is FIXTURE_DIR.
+
+    Returns:
+    - int: Number of recorded responses.
+    """
+
+    from features import electricity_prices, weather_measures
+
+    install(RecordingAdapter(fixture_dir))
+
+    # The cache is bypassed so every request goes to the API
+    electricity_prices.electricity_prices(historical=True, start=start, end=end, backfill=True, cache=False)
+    electricity_prices.forecast_renewable_energy(historical=True, start=start, end=end, backfill=True, cache=False)
+    weather_measures.historical_weather_measures(historical=True, start=start, end=end, cache=False)
+    weather_measures.forecast_weather_measures(forecast_length=5, cache=False)
+    weather_measures.multi_location_weather_measures(weather_measures.LOCATION_GRIDS['DK1'] + weather_measures.LOCATION_GRIDS['DK2'], historical=True, start=start, end=end, cache=False)
+
+    return len(list(Path(fixture_dir).glob('*.json.gz')))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['record'], help='Record the API responses of the fetchers.')
+    parser.add_argument('--start', default='2024-01-01', help='First date to record.')
+    parser.add_argument('--end', default='2024-01-07', help='Last date to record.')
+    args = parser.parse_args()
+
+    print(f"{record(args.start, args.end)} fixtures in {FIXTURE_DIR}")
+
+
+if __name__ == "__main__":
+    main()
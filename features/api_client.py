@@ -0,0 +1,154 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from features import instrumentation
+
+
+# Seconds to connect and to wait for the response of one request, so a stuck request ends with an error
+REQUEST_TIMEOUT = (10, 60)
+
+# Shared session for all API calls, created lazily and reused across threads
+_SESSION = None
+_SESSION_LOCK = threading.Lock()
+
+
+def get_session(pool_size: int = 16, retries: int = 5, backoff_factor: float = 0.5) -> requests.Session:
+    """
+    Returns a shared, pooled requests session with retry and backoff.
+
+    Parameters:
+    - pool_size (int): Maximum number of pooled connections per host. Default is 16.
+    - retries (int): Number of retries for failed requests. Default is 5.
+    - backoff_factor (float): Backoff factor between retries in seconds. Default is 0.5.
+
+    Returns:
+    - requests.Session: Session shared by all fetchers.
+    """
+
+    global _SESSION
+
+    with _SESSION_LOCK:
+        if _SESSION is None:
+            # Retry on connection errors, rate limiting and server side errors with exponential backoff
+            retry = Retry(
+                total=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=[429, 500, 502, 503, 504],
+                allowed_methods=["GET"],
+            )
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+
+            # Count the requests and bytes received by the instrumented stages
+            session.hooks['response'].append(instrumentation.record_response)
+            _SESSION = session
+
+    return _SESSION
+
+
+def date_windows(start: str, end: str, window_days: int = 31) -> list:
+    """
+    Splits a date range into consecutive windows.
+
+    Parameters:
+    - start (str): First date of the range in 'YYYY-MM-DD' format.
+    - end (str): Last date of the range (inclusive) in 'YYYY-MM-DD' format.
+    - window_days (int): Number of days in each window. Default is 31 days.
+
+    Returns:
+    - list: List of (start, end) tuples with inclusive 'YYYY-MM-DD' dates.
+    """
+
+    first = datetime.strptime(start, '%Y-%m-%d').date()
+    last = datetime.strptime(end, '%Y-%m-%d').date()
+
+    windows = []
+    while first <= last:
+        window_end = min(first + timedelta(days=window_days - 1), last)
+        windows.append((first.strftime('%Y-%m-%d'), window_end.strftime('%Y-%m-%d')))
+        first = window_end + timedelta(days=1)
+
+    return windows
+
+
+def fetch_energidataservice_window(dataset: str, start: str, end: str, params: dict = None, columns: list = None, limit: int = 10000) -> pd.DataFrame:
+    """
+    Fetches all records for one date window from Energinet (Dataservice API) by paging through it with offset and limit.
+
+    Parameters:
+    - dataset (str): Name of the dataset, e.g. 'Elspotprices'.
+    - start (str): First date of the window in 'YYYY-MM-DD' format.
+    - end (str): Last date of the window (inclusive) in 'YYYY-MM-DD' format.
+    - params (dict): Extra query parameters such as 'filter' or 'sort'.
+    - columns (list): Columns to keep from the records. Default is all columns.
+    - limit (int): Number of records requested per page. Default is 10000.
+
+    Returns:
+    - pd.DataFrame: DataFrame with the records of the window.
+    """
+
+    API_URL = 'https://api.energidataservice.dk/dataset/' + dataset
+    session = get_session()
+
+    pages = []
+    offset = 0
+    while True:
+        r = session.get(API_URL, params={
+                    **(params or {}),
+                    'offset': offset,
+                    'limit': limit,
+                    'start': start+'T00:00',
+                    'end': end+'T23:59',
+                }, timeout=REQUEST_TIMEOUT)
+        r.raise_for_status()
+        body = r.json()
+        records = body['records']
+
+        # Only keep the requested columns so the raw JSON can be released right away
+        page = pd.DataFrame(records)
+        if columns is not None and not page.empty:
+            page = page[columns]
+        pages.append(page)
+
+        offset += len(records)
+        if len(records) < limit or offset >= body.get('total', offset):
+            break
+
+    return pd.concat(pages, ignore_index=True)
+
+
+def fetch_energidataservice(dataset: str, start: str, end: str, params: dict = None, columns: list = None, window_days: int = 31, limit: int = 10000, max_workers: int = 4) -> pd.DataFrame:
+    """
+    Fetches a long date range from Energinet (Dataservice API) in date windows that are fetched concurrently.
+
+    Parameters:
+    - dataset (str): Name of the dataset, e.g. 'Elspotprices'.
+    - start (str): First date of the range in 'YYYY-MM-DD' format.
+    - end (str): Last date of the range (inclusive) in 'YYYY-MM-DD' format.
+    - params (dict): Extra query parameters such as 'filter' or 'sort'.
+    - columns (list): Columns to keep from the records. Default is all columns.
+    - window_days (int): Number of days fetched per window. Default is 31 days.
+    - limit (int): Number of records requested per page. Default is 10000.
+    - max_workers (int): Number of windows fetched at the same time. Default is 4.
+
+    Returns:
+    - pd.DataFrame: DataFrame with the records of the whole range in window order.
+    """
+
+    windows = date_windows(start, end, window_days)
+
+    # Fetch the windows concurrently over the shared session, the results keep the window order
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(
+            instrumentation.bind(lambda window: fetch_energidataservice_window(dataset, window[0], window[1], params=params, columns=columns, limit=limit)),
+            windows,
+        ))
+
+    return pd.concat(frames, ignore_index=True)
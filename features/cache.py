@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from pathlib import Path
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from features.instrumentation import count
+
+
+# Location and limits of the on-disk response cache, can be overridden with environment variables
+CACHE_DIR = Path(os.environ.get('FEATURE_CACHE_DIR', Path(__file__).resolve().parent.parent / 'data' / 'cache'))
+MAX_CACHE_BYTES = int(os.environ.get('FEATURE_CACHE_MAX_BYTES', 512 * 1024 * 1024))
+
+# Time to live in seconds for windows that can still change (today and forecasts)
+FRESH_TTL = 60 * 60
+
+_EVICT_LOCK = threading.Lock()
+_WRITE_LOCK = threading.Lock()
+
+
+def cache_key(endpoint: str, params: dict) -> str:
+    """
+    Builds a content address for an endpoint and its query parameters.
+
+    Parameters:
+    - endpoint (str): Name or URL of the API endpoint.
+    - params (dict): Query parameters except the date range.
+
+    Returns:
+    - str: Hex digest identifying the request.
+    """
+
+    payload = json.dumps({'endpoint': endpoint, 'params': params}, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _month_days(path: Path) -> dict:
+    # Fetch time and number of rows of every cached day of a month, kept in the metadata of the month file
+    if not path.exists():
+        return {}
+    metadata = pq.read_schema(path).metadata or {}
+    return json.loads(metadata.get(b'cache_days', b'{}'))
+
+
+def _is_valid(entry: dict, day: str, settle_days: int, ttl: int) -> bool:
+    # Finalised historical days with rows never expire, the rest are valid for the time to live.
+    # Days without rows are never final, as an outage or a late publication must not be cached for good
+    if entry is None:
+        return False
+    if entry['rows'] and day < (date.today() - timedelta(days=settle_days)).strftime('%Y-%m-%d'):
+        return True
+    return time.time() - entry['fetched_at'] < ttl
+
+
+def _write_month(path: Path, fetched: pd.DataFrame, fetched_days: pd.Series, days: list, date_column: str) -> None:
+    # Replace the rows of the fetched days in the month file and keep the rows of the other days
+    entries = _month_days(path)
+    df = fetched[fetched_days.isin(days)]
+    if path.exists():
+        cached = pd.read_parquet(path)
+        if not cached.empty:
+            df = pd.concat([cached[~cached[date_column].str[:10].isin(days)], df], ignore_index=True)
+
+        # Days in order, the rows of a day keep the order of the response
+        df = df.iloc[df[date_column].str[:10].argsort(kind='stable')] if not df.empty else df
+
+    fetched_at = time.time()
+    for day in days:
+        entries[day] = {'fetched_at': fetched_at, 'rows': int((fetched_days == day).sum())}
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'cache_days': json.dumps(entries).encode()})
+
+    # Write to a temporary file first so concurrent readers never see a partial file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _read(path: Path) -> pd.DataFrame:
+    # Mark the file as recently used by updating its access time, the modification time is kept
+    df = pd.read_parquet(path)
+    os.utime(path, (time.time(), path.stat().st_mtime))
+    return df
+
+
+def evict(max_bytes: int = None) -> None:
+    """
+    Removes the least recently used month files until the cache fits within the size limit.
+
+    Parameters:
+    - max_bytes (int): Maximum size of the cache in bytes. Default is MAX_CACHE_BYTES.
+    """
+
+    max_bytes = MAX_CACHE_BYTES if max_bytes is None else max_bytes
+
+    with _EVICT_LOCK:
+        files = [(p.stat().st_atime, p.stat().st_size, p) for p in CACHE_DIR.glob('*/*.parquet')]
+        total = sum(size for _, size, _ in files)
+
+        for _, size, path in sorted(files):
+            if total <= max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def cached_fetch(endpoint: str, params: dict, start: str, end: str, fetch, date_column: str, settle_days: int = 0, ttl: int = FRESH_TTL) -> pd.DataFrame:
+    """
+    Serves a date range from the on-disk cache and fetches only the days that are missing or expired.
+
+    Parameters:
+    - endpoint (str): Name or URL of the API endpoint.
+    - params (dict): Query parameters except the date range, used for the cache key.
+    - start (str): First date of the range in 'YYYY-MM-DD' format.
+    - end (str): Last date of the range (inclusive) in 'YYYY-MM-DD' format.
+    - fetch (callable): Function taking (start, end) that returns the raw API DataFrame for that range.
+    - date_column (str): Column starting with the 'YYYY-MM-DD' date of each row, used to split the response per day.
+    - settle_days (int): Number of days before today that can still be revised by the API. Default is 0.
+    - ttl (int): Time to live in seconds for days that are not final yet. Default is FRESH_TTL.
+
+    Returns:
+    - pd.DataFrame: Raw API DataFrame for the whole range.
+    """
+
+    key_dir = CACHE_DIR / cache_key(endpoint, params)
+    days = pd.date_range(start, end, freq='D').strftime('%Y-%m-%d').tolist()
+    months = sorted({day[:7] for day in days})
+
+    # One file per month, the fetch time and rows of each of its days are in the file metadata
+    entries = {}
+    for month in months:
+        entries.update(_month_days(key_dir / f'{month}.parquet'))
+    missing = [day for day in days if not _is_valid(entries.get(day), day, settle_days, ttl)]
+    count(cache_days=len(days), cache_days_missing=len(missing))
+
+    if missing:
+        # Request one span from the first to the last missing day, usually only the tail of the range
+        fetched = fetch(missing[0], missing[-1])
+        fetched_days = fetched[date_column].str[:10] if not fetched.empty else pd.Series(dtype=object)
+
+        # Store every day of the span in its month file, days without rows are stored with the time they were fetched
+        span = days[days.index(missing[0]):days.index(missing[-1]) + 1]
+        with _WRITE_LOCK:
+            for month in sorted({day[:7] for day in span}):
+                _write_month(key_dir / f'{month}.parquet', fetched, fetched_days, [day for day in span if day[:7] == month], date_column)
+
+    # Only the requested days of the first and last month are kept, an empty range keeps the columns of the first month
+    frames = [_read(key_dir / f'{month}.parquet') for month in months]
+    df = pd.concat([frame for frame in frames if not frame.empty] or frames[:1], ignore_index=True)
+    if not df.empty:
+        df = df[df[date_column].str[:10].between(days[0], days[-1])].reset_index(drop=True)
+
+    # Evict after reading so the requested months are the most recently used ones
+    if missing:
+        evict()
+
+    return df
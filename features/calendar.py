@@ -1,31 +1,201 @@
-from datetime import datetime, date
+from datetime import date
+from pathlib import Path
 import numpy as np
 import pandas as pd
+from features.time_utils import date_parts
+from features.schema import enforce_schema, CALENDAR_SCHEMA
+from features.instrumentation import instrument
 
 
-def dk_calendar() -> pd.DataFrame:
+# The calendar file shipped with the repository and the remote copy used for an optional refresh
+CALENDAR_PATH = Path(__file__).resolve().parent.parent / 'data' / 'calendar_incl_holiday.csv'
+CALENDAR_URL = 'https://raw.githubusercontent.com/Camillahannesbo/MLOPs-Assignment-/main/data/calendar_incl_holiday.csv'
+
+# Years covered by the holiday rules, the calendar file overrides the years it contains
+FIRST_YEAR = 2000
+LAST_YEAR = 2099
+
+
+def easter_sunday(year: int) -> np.datetime64:
     """
-    Fetches calendar for Denmark.
+    Computes the date of Easter Sunday with the anonymous Gregorian algorithm.
+
+    Parameters:
+    - year (int): The year.
 
     Returns:
-    - pd.DataFrame: DataFrame with danish calendar.
+    - np.datetime64: Date of Easter Sunday.
+    """
+
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    g = (8 * b + 13) // 25
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 19 * l) // 433
+    month = (h + l - 7 * m + 90) // 25
+    day = (h + l - 7 * m + 33 * month + 19) % 32
+
+    return np.datetime64(f'{year:04d}-{month:02d}-{day:02d}')
+
+
+def danish_holidays(year: int) -> np.ndarray:
+    """
+    Computes the danish public holidays of a year.
+
+    Parameters:
+    - year (int): The year.
+
+    Returns:
+    - np.ndarray: Array of datetime64[D] dates of the holidays.
+    """
+
+    easter = easter_sunday(year)
+
+    # Maundy Thursday, Good Friday, Easter Sunday, Easter Monday, Ascension Day, Whit Sunday and Whit Monday
+    easter_offsets = [-3, -2, 0, 1, 39, 49, 50]
+
+    # Prayer Day was abolished from 2024
+    if year < 2024:
+        easter_offsets.append(26)
+
+    holidays = [easter + np.timedelta64(offset, 'D') for offset in easter_offsets]
+    holidays += [np.datetime64(f'{year:04d}-01-01'), np.datetime64(f'{year:04d}-12-25'), np.datetime64(f'{year:04d}-12-26')]
+
+    return np.array(sorted(holidays), dtype='datetime64[D]')
+
+
+class Calendar:
+    """
+    Danish calendar precomputed as compact NumPy arrays indexed by the number of days since the first date.
+    """
+
+    def __init__(self, start: np.datetime64, workday: np.ndarray):
+        self.start = np.datetime64(start, 'D')
+        self.days = self.start + np.arange(len(workday))
+        self.workday = workday.astype(np.int8)
+
+        parts = date_parts(self.days)
+        self.dayofweek = parts['dayofweek'].astype(np.int8)
+        self.day = parts['day'].astype(np.int8)
+        self.month = parts['month'].astype(np.int8)
+        self.year = parts['year'].astype(np.int16)
+
+    def lookup(self, dates) -> pd.DataFrame:
+        """
+        Looks up the calendar features of dates by their position in the arrays.
+
+        Parameters:
+        - dates: Dates as 'YYYY-MM-DD' strings or datetime64 values.
+
+        Returns:
+        - pd.DataFrame: DataFrame with 'dayofweek', 'day', 'month', 'year' and 'workday' in the order of the dates.
+        """
+
+        positions = (np.asarray(dates, dtype='datetime64[D]') - self.start).astype(np.int64)
+
+        if len(positions) and (positions.min() < 0 or positions.max() >= len(self.days)):
+            raise ValueError(f"Dates must be between {self.days[0]} and {self.days[-1]}")
+
+        return pd.DataFrame({
+            'dayofweek': self.dayofweek[positions],
+            'day': self.day[positions],
+            'month': self.month[positions],
+            'year': self.year[positions],
+            'workday': self.workday[positions],
+        })
+
+
+def build_calendar(source = CALENDAR_PATH) -> Calendar:
     """
+    Builds the danish calendar from the holiday rules and the calendar file.
 
-    df = pd.read_csv('https://raw.githubusercontent.com/Camillahannesbo/MLOPs-Assignment-/main/data/calendar_incl_holiday.csv', delimiter=';', usecols=['date', 'type'])
+    Parameters:
+    - source: Path or URL of the calendar file. Default is the file shipped in the 'data' folder.
 
-    # Formatting the date column to 'YYYY-MM-DD' dateformat
-    df["date"] = df["date"].map(lambda x: datetime.strptime(x, '%d/%m/%Y').strftime("%Y-%m-%d"))
+    Returns:
+    - Calendar: The precomputed calendar.
+    """
+
+    # Weekends and public holidays are not workdays
+    days = np.arange(np.datetime64(f'{FIRST_YEAR}-01-01'), np.datetime64(f'{LAST_YEAR + 1}-01-01'))
+    holidays = np.concatenate([danish_holidays(year) for year in range(FIRST_YEAR, LAST_YEAR + 1)])
+    workday = np.where((date_parts(days)['dayofweek'] >= 5) | np.isin(days, holidays), 0, 1)
+
+    # The calendar file overrides the rules for the dates it contains
+    df = pd.read_csv(source, delimiter=';', usecols=['date', 'type']).dropna()
+    positions = (pd.to_datetime(df['date'], format='%d/%m/%Y').values.astype('datetime64[D]') - days[0]).astype(np.int64)
+    workday[positions] = np.where(df['type'] == 'Not a Workday', 0, 1)
+
+    return Calendar(days[0], workday)
+
+
+# The calendar is built once per process
+_CALENDAR = None
+
+
+def get_calendar(refresh: bool = False) -> Calendar:
+    """
+    Returns the danish calendar, built on first use and cached for the process.
+
+    Parameters:
+    - refresh (bool): If True, rebuilds the calendar from the remote calendar file. Default is False.
+
+    Returns:
+    - Calendar: The precomputed calendar.
+    """
+
+    global _CALENDAR
+
+    if refresh:
+        _CALENDAR = build_calendar(CALENDAR_URL)
+    elif _CALENDAR is None:
+        _CALENDAR = build_calendar()
+
+    return _CALENDAR
+
+
+@instrument()
+def join_calendar(df: pd.DataFrame, date_column: str = 'date') -> pd.DataFrame:
+    """
+    Adds the calendar features to a DataFrame by looking up its dates, without merging.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame with a column of 'YYYY-MM-DD' dates.
+    - date_column (str): Name of the date column. Default is 'date'.
+
+    Returns:
+    - pd.DataFrame: The DataFrame with 'dayofweek', 'day', 'month', 'year' and 'workday' columns added.
+    """
+
+    features = get_calendar().lookup(df[date_column].values)
+    features.index = df.index
+
+    return pd.concat([df, features], axis=1).reset_index(drop=True)
+
+
+@instrument()
+def dk_calendar(start: str = '2022-01-01', end: str = None, refresh: bool = False) -> pd.DataFrame:
+    """
+    Fetches calendar for Denmark.
+
+    Parameters:
+    - start (str): First date of the calendar. Default is '2022-01-01'.
+    - end (str): Last date of the calendar. Default is the end of next year.
+    - refresh (bool): If True, rebuilds the calendar from the remote calendar file. Default is False.
+
+    Returns:
+    - pd.DataFrame: DataFrame with danish calendar.
+    """
 
-    # Add features to the calendar dataframe
-    df['date_'] = pd.to_datetime(df['date'])
-    df['dayofweek'] = df['date_'].dt.dayofweek
-    df['day'] = df['date_'].dt.day
-    df['month'] = df['date_'].dt.month
-    df['year'] = df['date_'].dt.year
-    df['workday'] = np.where(df['type'] == 'Not a Workday', 0, 1)
+    end = end or f'{date.today().year + 1}-12-31'
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(end, 'D') + 1)
 
-    # Drop the columns 'type' and 'date_' to finalize the calendar dataframe
-    calendar = df.drop(['type','date_'], axis=1)
+    # Look up the calendar features of every date in the range
+    calendar = get_calendar(refresh).lookup(dates)
+    calendar.insert(0, 'date', np.datetime_as_string(dates).astype(object))
 
-    # Return the DataFrame with calendar data
-    return calendar
\ No newline at end of file
+    # Return the DataFrame with calendar data in the compact dtypes of the schema
+    return enforce_schema(calendar, CALENDAR_SCHEMA)
@@ -1,9 +1,58 @@
-import requests
 from datetime import datetime, date, timedelta
 import pandas as pd
+from features.api_client import REQUEST_TIMEOUT, get_session, fetch_energidataservice
+from features.cache import cached_fetch
+from features.instrumentation import instrument, count
+from features.time_utils import normalise_time
+from features.reshape import wide_frame
+from features.schema import enforce_schema, ELECTRICITY_SCHEMA, RENEWABLE_FORECAST_SCHEMA
+
+
+def _fetch_elspotprices(start: str, end: str, backfill: bool, window_days: int, max_workers: int) -> pd.DataFrame:
+    # Fetches the raw electricity price records for a date range
+    if backfill:
+        # Fetch the range window by window and keep only the columns used below
+        return fetch_energidataservice('Elspotprices', start, end, params={
+                    'filter': '{"PriceArea":["DK1", "DK2"]}',
+                    'sort': 'HourUTC DESC'
+                }, columns=['HourDK', 'PriceArea', 'SpotPriceDKK'], window_days=window_days, max_workers=max_workers)
 
+    # Define the API URL for electricity prices data and make a request to the API
+    API_URL = 'https://api.energidataservice.dk/dataset/Elspotprices'
+    r = get_session().get(API_URL , params={
+                'offset': 0,
+                'start': start+'T00:00',
+                'end': end+'T23:59',
+                'filter': '{"PriceArea":["DK1", "DK2"]}',
+                'sort': 'HourUTC DESC'
+            }, timeout=REQUEST_TIMEOUT)
 
-def electricity_prices(historical: bool = False, area: list = None, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d")) -> pd.DataFrame:
+    # Extract JSON data from the response and make a DataFrame
+    data = r.json()['records']
+    return pd.DataFrame(data)
+
+
+def _fetch_forecasts_hour(start: str, end: str, backfill: bool, window_days: int, max_workers: int) -> pd.DataFrame:
+    # Fetches the raw renewable energy forecast records for a date range
+    if backfill:
+        # Fetch the range window by window, all columns are kept as some of them are dropped explicitly below
+        return fetch_energidataservice('Forecasts_Hour', start, end, window_days=window_days, max_workers=max_workers)
+
+    # Define the API URL for forecasted renewable energy data and make a request to the API
+    API_URL = 'https://api.energidataservice.dk/dataset/Forecasts_Hour'
+    r = get_session().get(API_URL , params={
+                'offset': 0,
+                'start': start+'T00:00',
+                'end': end+'T23:59',
+            }, timeout=REQUEST_TIMEOUT)
+
+    # Extract JSON data from the response and make a DataFrame
+    data = r.json()['records']
+    return pd.DataFrame(data)
+
+
+@instrument()
+def electricity_prices(historical: bool = False, area: list = None, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d"), backfill: bool = False, window_days: int = 31, max_workers: int = 4, cache: bool = True) -> pd.DataFrame:
     """
     Fetches electricity prices from Energinet (Dataservice API).
 
@@ -11,29 +60,24 @@ def electricity_prices(historical: bool = False, area: list = None, start: str =
     - historical (bool): If True, fetches historical data from start date to end date. If False, fetches data for the current day. Default is False.
     - start (str): Define a start date for the API call. Default is 'Yesterday'.
     - end (str): Define a end date for the API call. Default is 'Today'.
+    - backfill (bool): If True, the range is split into date windows that are paged through and fetched concurrently. Use this for long ranges. Default is False.
+    - window_days (int): Number of days fetched per window in backfill mode. Default is 31 days.
+    - max_workers (int): Number of windows fetched at the same time in backfill mode. Default is 4.
+    - cache (bool): If True, days already fetched are read from the local cache and only missing days are requested. Default is True.
     
     Returns:
     - pd.DataFrame: DataFrame with electricity prices for different areas in Denmark (DK1, DK2).
     """
 
-    # Define the API URL for electricity prices data and make a request to the API
-    API_URL = 'https://api.energidataservice.dk/dataset/Elspotprices'
-    r = requests.get(API_URL , params={
-                'offset': 0,
-                'start': start+'T00:00',
-                'end': end+'T23:59',
-                'filter': '{"PriceArea":["DK1", "DK2"]}',
-                'sort': 'HourUTC DESC'
-            })
-
-    # Extract JSON data from the response and make a DataFrame
-    data = r.json()['records']
-    df = pd.DataFrame(data)
+    # Fetch the raw records, served from the local cache when enabled so only missing days go to the API
+    fetch = lambda fetch_start, fetch_end: _fetch_elspotprices(fetch_start, fetch_end, backfill, window_days, max_workers)
+    if cache:
+        df = cached_fetch('Elspotprices', {'filter': '{"PriceArea":["DK1", "DK2"]}'}, start, end, fetch, date_column='HourDK')
+    else:
+        df = fetch(start, end)
 
-    # Format date and time
-    df["date"] = df["HourDK"].map(lambda x: datetime.strptime(x, '%Y-%m-%dT%H:%M:%S').strftime("%Y-%m-%d"))
-    df['datetime'] = pd.to_datetime(df['HourDK'])
-    df['hour'] = pd.to_datetime(df['datetime']).dt.hour
+    # Format date and time and add the timestamp in milliseconds
+    df = normalise_time(df, 'HourDK', '%Y-%m-%dT%H:%M:%S')
 
     # Divide the price to KWH
     df['SpotPriceDKK_KWH'] = df['SpotPriceDKK'] / 1000
@@ -53,9 +97,7 @@ def electricity_prices(historical: bool = False, area: list = None, start: str =
         filtered_df = filtered_df[filtered_df.date != today]
     else:
         filtered_df = filtered_df[filtered_df.date == today]
-
-    # Convert datetime to timestamp in milliseconds and add it as a new column
-    filtered_df["timestamp"] = filtered_df["datetime"].apply(lambda x: int(x.timestamp() * 1000))
+    count(rows_fetched=len(df), rows_filtered=len(df) - len(filtered_df))
 
     # Reset the index to avoid duplicate entries
     filtered_df.reset_index(drop=True, inplace=True)
@@ -63,29 +105,14 @@ def electricity_prices(historical: bool = False, area: list = None, start: str =
     # Select relevant columns for electricity prices data and reorder them
     reordered_df = filtered_df[['timestamp', 'datetime', 'date', 'hour', 'PriceArea', 'SpotPriceDKK_KWH']]
 
-    # Unpivot DataFrame
-    reordered_df = reordered_df.melt(id_vars=['timestamp', 'datetime', 'date', 'hour', "PriceArea"], var_name="attribute", value_name="value")
+    # Build the wide DataFrame with one price column per area, e.g. 'dk1_spotpricedkk_kwh'
+    electricity_prices = wide_frame(reordered_df, index=['timestamp', 'datetime', 'date', 'hour'], columns=['PriceArea'], value='SpotPriceDKK_KWH', duplicates='first')
 
-    # Combine columns into a single "heading" column
-    reordered_df["heading"] = reordered_df["PriceArea"] + "_" + reordered_df["attribute"]
+    # Return the DataFrame with electricity prices data in the compact dtypes of the schema
+    return enforce_schema(electricity_prices, ELECTRICITY_SCHEMA)
 
-    # Drop the columns that are no longer needed
-    reordered_df.drop(columns=["PriceArea"], inplace=True)
-    reordered_df.drop(columns=["attribute"], inplace=True)
-
-    # Pivot DataFrame
-    electricity_prices = reordered_df.pivot_table(index=['timestamp', 'datetime', 'date', 'hour'], columns="heading", values="value").reset_index()
-
-    # Converting column names to lowercase for consistency
-    electricity_prices.columns = list(map(str.lower, electricity_prices.columns))
-
-    # Replace spaces in column names with underscores
-    electricity_prices.columns = electricity_prices.columns.str.replace(' ', '_')
-
-    # Return the DataFrame with electricity prices data
-    return electricity_prices
-
-def forecast_renewable_energy(historical: bool = False, area: str = None, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d")) -> pd.DataFrame:
+@instrument()
+def forecast_renewable_energy(historical: bool = False, area: str = None, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d"), backfill: bool = False, window_days: int = 31, max_workers: int = 4, cache: bool = True) -> pd.DataFrame:
     """
     Fetches electricity prices from Energinet (Dataservice API).
 
@@ -93,27 +120,24 @@ def forecast_renewable_energy(historical: bool = False, area: str = None, start:
     - historical (bool): If True, fetches historical data from start date to end date. If False, fetches data for the current day. Default is False.
     - start (str): Define a start date for the API call. Defaul is 'Yesterday'.
     - end (str): Define a end date for the API call. Default is 'Today'.
+    - backfill (bool): If True, the range is split into date windows that are paged through and fetched concurrently. Use this for long ranges. Default is False.
+    - window_days (int): Number of days fetched per window in backfill mode. Default is 31 days.
+    - max_workers (int): Number of windows fetched at the same time in backfill mode. Default is 4.
+    - cache (bool): If True, days already fetched are read from the local cache and only missing days are requested. Default is True.
     
     Returns:
     - pd.DataFrame: DataFrame with electricity prices for different areas in Denmark (DK1, DK2).
     """
 
-    # Define the API URL for forecasted renewable energy data and make a request to the API
-    API_URL = 'https://api.energidataservice.dk/dataset/Forecasts_Hour'
-    r = requests.get(API_URL , params={
-                'offset': 0,
-                'start': start+'T00:00',
-                'end': end+'T23:59',
-            })
-
-    # Extract JSON data from the response and make a DataFrame
-    data = r.json()['records']
-    df = pd.DataFrame(data)
+    # Fetch the raw records, served from the local cache when enabled so only missing days go to the API
+    fetch = lambda fetch_start, fetch_end: _fetch_forecasts_hour(fetch_start, fetch_end, backfill, window_days, max_workers)
+    if cache:
+        df = cached_fetch('Forecasts_Hour', {}, start, end, fetch, date_column='HourDK', settle_days=1)
+    else:
+        df = fetch(start, end)
 
-    # Format date and time
-    df["date"] = df["HourDK"].map(lambda x: datetime.strptime(x, '%Y-%m-%dT%H:%M:%S').strftime("%Y-%m-%d"))
-    df['datetime'] = pd.to_datetime(df['HourDK'])
-    df['hour'] = pd.to_datetime(df['datetime']).dt.hour
+    # Format date and time and add the timestamp in milliseconds
+    df = normalise_time(df, 'HourDK', '%Y-%m-%dT%H:%M:%S')
 
     # Drop unnecessary columns
     df.drop('Forecast5Hour', axis=1, inplace=True)
@@ -137,9 +161,7 @@ def forecast_renewable_energy(historical: bool = False, area: str = None, start:
         filtered_df = filtered_df[df.date != today]
     else:
         filtered_df = filtered_df[df.date == today]
-
-    # Convert datetime to timestamp in milliseconds and add it as a new column
-    filtered_df["timestamp"] = filtered_df["datetime"].apply(lambda x: int(x.timestamp() * 1000))
+    count(rows_fetched=len(df), rows_filtered=len(df) - len(filtered_df))
 
     # Multiply specified columns by 1000
     filtered_df["ForecastIntraday_KWH"] = filtered_df["ForecastIntraday"] * 1000
@@ -153,25 +175,8 @@ def forecast_renewable_energy(historical: bool = False, area: str = None, start:
     # Select relevant columns for forecasted renewable energy data and reorder them
     reordered_df = filtered_df[['timestamp', 'datetime', 'date', 'hour', 'PriceArea', 'ForecastType', 'ForecastIntraday_KWH']]
 
-    # Unpivot DataFrame
-    reordered_df = reordered_df.melt(id_vars=["timestamp", 'datetime', "date", "hour", "PriceArea", "ForecastType"], var_name="attribute", value_name="value")
-
-    # Combine columns into a single "heading" column
-    reordered_df["heading"] = reordered_df["PriceArea"] + "_" + reordered_df["ForecastType"] + "_" + reordered_df["attribute"]
-    
-    # Drop the columns that are no longer needed
-    reordered_df.drop(columns=["PriceArea"], inplace=True)
-    reordered_df.drop(columns=["ForecastType"], inplace=True)
-    reordered_df.drop(columns=["attribute"], inplace=True)
-
-    # Pivot DataFrame
-    forecast_renewable_energy = reordered_df.pivot_table(index=["timestamp", "datetime", "date", "hour"], columns="heading", values="value").reset_index()
-
-    # Converting column names to lowercase for consistency
-    forecast_renewable_energy.columns = list(map(str.lower, forecast_renewable_energy.columns))
-
-    # Replace spaces in column names with underscores
-    forecast_renewable_energy.columns = forecast_renewable_energy.columns.str.replace(' ', '_')
+    # Build the wide DataFrame with one forecast column per area and forecast type, e.g. 'dk1_solar_forecastintraday_kwh'
+    forecast_renewable_energy = wide_frame(reordered_df, index=['timestamp', 'datetime', 'date', 'hour'], columns=['PriceArea', 'ForecastType'], value='ForecastIntraday_KWH', duplicates='first')
 
-    # Return the DataFrame with forecast renewable energy data
-    return forecast_renewable_energy
\ No newline at end of file
+    # Return the DataFrame with forecast renewable energy data in the compact dtypes of the schema
+    return enforce_schema(forecast_renewable_energy, RENEWABLE_FORECAST_SCHEMA)
\ No newline at end of file
@@ -0,0 +1,383 @@
+"""
+Lightweight instrumentation of the fetchers, reshapes, merges, inserts and predictions.
+
+Every instrumented step writes one JSON line with its wall time, rows in and out, bytes received,
+resident memory and, when tracemalloc is enabled, the Python allocations of the step. Nothing is
+measured or written until a metrics file is configured, so the instrumented functions cost one
+attribute lookup in normal runs.
+
+Summarise the recorded runs from the repository root:
+
+    python -m features.instrumentation summary --runs 10
+"""
+
+import argparse
+import contextvars
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+
+# Metrics file, instrumentation is disabled while it is None
+METRICS_PATH = os.environ.get('PIPELINE_METRICS')
+DEFAULT_METRICS_PATH = Path(__file__).resolve().parent.parent / 'data' / 'metrics' / 'pipeline_metrics.jsonl'
+
+# Optional profiler of the top level stages ('cprofile' or 'pyinstrument') and where the profiles are written
+PROFILER = os.environ.get('PIPELINE_PROFILER')
+PROFILE_DIR = Path(os.environ.get('PIPELINE_PROFILE_DIR', Path(__file__).resolve().parent.parent / 'data' / 'profiles'))
+
+# Identifies the records of one process, so the summary can compare runs
+RUN_ID = f"{datetime.now().strftime('%Y%m%dT%H%M%S')}-{os.getpid()}"
+
+# Records of the stages that are open in the current context, innermost last
+_ACTIVE = contextvars.ContextVar('instrumentation_active', default=())
+_LOCK = threading.Lock()
+
+
+def configure(path=DEFAULT_METRICS_PATH, trace_memory: bool = False, profiler: str = None) -> None:
+    """
+    Enables the instrumentation for the rest of the process.
+
+    Parameters:
+    - path: JSONL file the metrics are appended to, None disables the instrumentation. Default is DEFAULT_METRICS_PATH.
+    - trace_memory (bool): If True, starts tracemalloc so every step records its Python allocations. This slows the run down. Default is False.
+    - profiler (str): 'cprofile' or 'pyinstrument' to profile the top level stages. Default is no profiling.
+    """
+
+    global METRICS_PATH, PROFILER
+
+    METRICS_PATH = None if path is None else str(path)
+    PROFILER = profiler
+
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def current_rss_mb() -> float:
+    """
+    Returns the resident memory of the process in MB.
+
+    Returns:
+    - float: Resident set size in MB, or None when it cannot be read from /proc.
+    """
+
+    try:
+        with open('/proc/self/statm') as file:
+            pages = int(file.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return pages * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+
+
+def peak_rss_mb() -> float:
+    """
+    Returns the peak resident memory of the process in MB.
+
+    Returns:
+    - float: Peak resident set size in MB.
+    """
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 ** 2 if sys.platform == 'darwin' else maxrss / 1024
+
+
+def count(**counts) -> None:
+    """
+    Adds counts, e.g. bytes_received or rows_filtered, to every open stage of the current context.
+
+    Parameters:
+    - counts: Numbers to add per metric name.
+    """
+
+    records = _ACTIVE.get()
+    if not records:
+        return
+
+    with _LOCK:
+        for record in records:
+            for name, value in counts.items():
+                record[name] = record.get(name, 0) + value
+
+
+def record_response(response, *args, **kwargs) -> None:
+    """
+    Response hook of the shared requests session, counts the requests and the bytes received by the open stages.
+
+    Parameters:
+    - response (requests.Response): The received response.
+    """
+
+    if _ACTIVE.get():
+        count(requests=1, bytes_received=len(response.content))
+
+
+def bind(func):
+    """
+    Wraps a function so it runs in the instrumentation context of the caller, e.g. in the threads of an executor.
+
+    Parameters:
+    - func: The function to wrap.
+
+    Returns:
+    - function: The wrapped function, every call runs in its own copy of the caller's context.
+    """
+
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(func, *args, **kwargs)
+
+
+def _rows(value) -> int:
+    # Rows of a DataFrame, array or Arrow table, and of the first item of a tuple returned by a step
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    if hasattr(value, 'shape') and len(getattr(value, 'shape')) > 0:
+        return int(value.shape[0])
+    if hasattr(value, 'num_rows'):
+        return int(value.num_rows)
+    return None
+
+
+def _write(record: dict) -> None:
+    # Append one line per record, the lock keeps the lines of concurrent stages apart
+    path = Path(METRICS_PATH)
+    line = json.dumps(record, default=str)
+    with _LOCK:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'a') as file:
+            file.write(line + '\n')
+
+
+@contextmanager
+def stage(name: str, **fields):
+    """
+    Measures a block of code and writes its metrics when the block ends.
+
+    The yielded record can be extended with counts, e.g. record['rows_out'] = len(df). Stages can be
+    nested, counts added with count() go to every open stage.
+
+    Parameters:
+    - name (str): Name of the stage, e.g. 'electricity_prices'.
+    - fields: Extra fields written with the record.
+
+    Yields:
+    - dict: The record of the stage.
+    """
+
+    if METRICS_PATH is None:
+        yield {}
+        return
+
+    parents = _ACTIVE.get()
+    record = {'stage': name, 'path': '/'.join([parent['stage'] for parent in parents] + [name]), **fields}
+    token = _ACTIVE.set(parents + (record,))
+
+    # tracemalloc only keeps one peak, so the peak so far is handed to the open stages before it is reset
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        traced_start, traced_peak = tracemalloc.get_traced_memory()
+        for parent in parents:
+            parent['_traced_peak'] = max(parent.get('_traced_peak', 0), traced_peak)
+        tracemalloc.reset_peak()
+
+    rss_start = current_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as error:
+        record['error'] = type(error).__name__
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _ACTIVE.reset(token)
+
+        rss_end = current_rss_mb()
+        record['rss_mb'] = rss_end
+        record['rss_delta_mb'] = None if rss_start is None or rss_end is None else rss_end - rss_start
+        record['peak_rss_mb'] = peak_rss_mb()
+
+        if tracing:
+            traced_end, traced_peak = tracemalloc.get_traced_memory()
+            traced_peak = max(record.pop('_traced_peak', 0), traced_peak)
+            record['traced_delta_mb'] = (traced_end - traced_start) / 1024 ** 2
+            record['traced_peak_mb'] = (traced_peak - traced_start) / 1024 ** 2
+
+        record.update({'run': RUN_ID, 'time': datetime.now().isoformat(timespec='seconds')})
+        _write(record)
+
+
+def instrument(name: str = None):
+    """
+    Decorator that measures every call of a function as a stage with the rows of its DataFrame arguments and result.
+
+    Parameters:
+    - name (str): Name of the stage. Default is the name of the function.
+
+    Returns:
+    - function: The decorator.
+    """
+
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if METRICS_PATH is None:
+                return func(*args, **kwargs)
+
+            rows_in = [_rows(value) for value in list(args) + list(kwargs.values())]
+            rows_in = [rows for rows in rows_in if rows is not None]
+
+            with stage(stage_name) as record:
+                if rows_in:
+                    record['rows_in'] = sum(rows_in)
+                result = func(*args, **kwargs)
+                record['rows_out'] = _rows(result)
+
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def profiled(name: str):
+    """
+    Profiles a block of code with the configured profiler and writes the profile to PROFILE_DIR.
+
+    cProfile writes a '.prof' file for pstats or snakeviz, pyinstrument an '.html' file. pyinstrument
+    is an optional dependency and only imported when it is selected.
+
+    Parameters:
+    - name (str): Name of the block, used in the file name of the profile.
+    """
+
+    if PROFILER is None:
+        yield
+        return
+
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / f"{name}-{RUN_ID}"
+
+    if PROFILER == 'cprofile':
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path.with_suffix('.prof'))
+    elif PROFILER == 'pyinstrument':
+        from pyinstrument import Profiler
+
+        profiler = Profiler()
+        profiler.start()
+        try:
+            yield
+        finally:
+            profiler.stop()
+            path.with_suffix('.html').write_text(profiler.output_html())
+    else:
+        raise ValueError(f"Unknown profiler '{PROFILER}', use 'cprofile' or 'pyinstrument'")
+
+
+def read_metrics(path=None):
+    """
+    Reads the recorded metrics.
+
+    Parameters:
+    - path: JSONL file with the metrics. Default is METRICS_PATH or DEFAULT_METRICS_PATH.
+
+    Returns:
+    - pd.DataFrame: One row per recorded stage.
+    """
+
+    import pandas as pd
+
+    path = Path(path or METRICS_PATH or DEFAULT_METRICS_PATH)
+    with open(path) as file:
+        return pd.DataFrame([json.loads(line) for line in file if line.strip()])
+
+
+def summary(metrics, runs: int = 10, threshold: float = 1.5):
+    """
+    Summarises the last runs per stage and flags the stages of the latest run that are slower than usual.
+
+    Parameters:
+    - metrics (pd.DataFrame): Metrics from read_metrics.
+    - runs (int): Number of most recent runs to summarise. Default is 10.
+    - threshold (float): A stage is flagged when the latest run takes more than 'threshold' times the median of the earlier runs. Default is 1.5.
+
+    Returns:
+    - pd.DataFrame: One row per stage path with the calls, time, rows, bytes and memory statistics.
+    """
+
+    import pandas as pd
+
+    # Keep the records of the most recent runs in the order they were written
+    recent = metrics['run'].drop_duplicates().tail(runs)
+    metrics = metrics[metrics['run'].isin(recent)].copy()
+    latest = recent.iloc[-1]
+
+    for column in ['rows_in', 'rows_out', 'bytes_received', 'requests', 'rows_filtered', 'inserted', 'updated', 'traced_peak_mb']:
+        if column not in metrics:
+            metrics[column] = float('nan')
+
+    # Seconds per stage and run, summed over the calls of the run
+    per_run = metrics.groupby(['path', 'run'], sort=False)['seconds'].sum().reset_index()
+    earlier = per_run[per_run['run'] != latest].groupby('path')['seconds'].median()
+    current = per_run[per_run['run'] == latest].set_index('path')['seconds']
+
+    grouped = metrics.groupby('path', sort=False)
+    report = pd.DataFrame({
+        'calls': grouped.size(),
+        'median_s': grouped['seconds'].median(),
+        'p95_s': grouped['seconds'].quantile(0.95),
+        'rows_out': grouped['rows_out'].median(),
+        'rows_filtered': grouped['rows_filtered'].median(),
+        'inserted': grouped['inserted'].median(),
+        'updated': grouped['updated'].median(),
+        'kb_received': grouped['bytes_received'].median() / 1024,
+        'peak_rss_mb': grouped['peak_rss_mb'].max(),
+        'traced_peak_mb': grouped['traced_peak_mb'].max(),
+        'latest_s': current,
+        'earlier_median_s': earlier,
+    })
+    report['regression'] = report['latest_s'] > threshold * report['earlier_median_s']
+
+    return report
+
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(prog='python -m features.instrumentation', description='Reports the recorded pipeline metrics.')
+    parser.add_argument('command', choices=['summary'], help='Report to print')
+    parser.add_argument('--path', help='Metrics file. Default is PIPELINE_METRICS or data/metrics/pipeline_metrics.jsonl')
+    parser.add_argument('--runs', type=int, default=10, help='Number of most recent runs to summarise')
+    parser.add_argument('--threshold', type=float, default=1.5, help='Slowdown of the latest run against the earlier runs that is flagged')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    report = summary(read_metrics(args.path), args.runs, args.threshold)
+    with pd.option_context('display.max_rows', None, 'display.max_columns', None, 'display.width', 250, 'display.float_format', '{:.3f}'.format):
+        print(report.dropna(axis=1, how='all'))
+
+    regressions = report.index[report['regression']].tolist()
+    if regressions:
+        print(f"\nSlower than {args.threshold}x the earlier median in the latest run: {', '.join(regressions)}")
+
+
+if __name__ == '__main__':
+    main()
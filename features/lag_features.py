@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+
+
+# Lags and rolling windows in hours
+LAGS = [1, 24, 168]
+WINDOWS = [24, 168]
+
+# Number of milliseconds in an hour, the unit of the 'timestamp' column
+MS_PER_HOUR = 3_600_000
+
+
+def lag_columns(df: pd.DataFrame) -> list:
+    """
+    Finds the columns that get lag and rolling features: the spot prices and the renewable energy forecasts.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame with the features.
+
+    Returns:
+    - list: Names of the spot price columns, e.g. 'dk1_spotpricedkk_kwh', and the renewable forecast columns, e.g. 'dk1_solar_forecastintraday_kwh'.
+    """
+
+    return [column for column in df.columns if column.endswith('_spotpricedkk_kwh') or column.endswith('_forecastintraday_kwh')]
+
+
+def feature_names(columns: list, lags: list = LAGS, windows: list = WINDOWS) -> list:
+    """
+    Names of the lag and rolling features of the columns, in the order they are computed.
+
+    Parameters:
+    - columns (list): Columns with lag and rolling features.
+    - lags (list): Lags in hours. Default is LAGS.
+    - windows (list): Rolling windows in hours. Default is WINDOWS.
+
+    Returns:
+    - list: Feature names, e.g. 'dk1_spotpricedkk_kwh_lag_24h' and 'dk1_spotpricedkk_kwh_rolling_mean_168h'.
+    """
+
+    names = []
+    for column in columns:
+        names += [f'{column}_lag_{lag}h' for lag in lags]
+        for window in windows:
+            names += [f'{column}_rolling_mean_{window}h', f'{column}_rolling_std_{window}h']
+
+    return names
+
+
+def window_features(values: np.ndarray, n_history: int, lags: list = LAGS, windows: list = WINDOWS) -> np.ndarray:
+    """
+    Computes lag and rolling features of hourly values with vectorized array operations.
+
+    Every row is one hour and missing hours are NaN. The features of an hour only use earlier hours,
+    so the value of the hour itself never leaks into its features. The rolling windows are computed
+    from cumulative sums, so every window costs the same regardless of its length.
+
+    Parameters:
+    - values (np.ndarray): Array of shape (hours, columns), the first 'n_history' rows are the hours before the new hours.
+    - n_history (int): Number of history rows.
+    - lags (list): Lags in hours. Default is LAGS.
+    - windows (list): Rolling windows in hours. Default is WINDOWS.
+
+    Returns:
+    - np.ndarray: Array of shape (new hours, columns * features per column) in the order of feature_names.
+    """
+
+    values = values.astype(np.float64)
+    rows = np.arange(n_history, len(values))
+
+    # Cumulative sums with a leading zero row, so the sum of values[a:b] is csum[b] - csum[a]
+    valid = ~np.isnan(values)
+    filled = np.where(valid, values, 0.0)
+    zeros = np.zeros((1, values.shape[1]))
+    csum = np.vstack([zeros, np.cumsum(filled, axis=0)])
+    csquares = np.vstack([zeros, np.cumsum(filled ** 2, axis=0)])
+    ccount = np.vstack([zeros, np.cumsum(valid, axis=0)])
+
+    features = []
+    for lag in lags:
+        positions = rows - lag
+        lagged = values[np.maximum(positions, 0)]
+        lagged[positions < 0] = np.nan
+        features.append(lagged)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        for window in windows:
+            # The window of an hour are the 'window' hours before it
+            start, end = np.maximum(rows - window, 0), rows
+            count = ccount[end] - ccount[start]
+            total = csum[end] - csum[start]
+            squares = csquares[end] - csquares[start]
+
+            mean = np.where(count > 0, total / count, np.nan)
+            variance = np.where(count > 1, (squares - total * mean) / (count - 1), np.nan)
+            features += [mean, np.sqrt(np.maximum(variance, 0))]
+
+    # Group the features per column: all features of the first column, then the second column, ...
+    n_features = len(features)
+    stacked = np.stack(features, axis=2)
+    return stacked.reshape(len(rows), values.shape[1] * n_features)
+
+
+class LagState:
+    """
+    Ring buffer with the last hours of the lagged columns, so the features of new hours can be computed without the full history.
+    """
+
+    def __init__(self, columns: list, lags: list = LAGS, windows: list = WINDOWS):
+        self.columns = list(columns)
+        self.lags = list(lags)
+        self.windows = list(windows)
+        self.capacity = max(self.lags + self.windows)
+
+        # The buffer is filled with NaN until enough hours have been pushed
+        self.buffer = np.full((self.capacity, len(self.columns)), np.nan)
+        self.position = 0
+        self.last_timestamp = None
+
+    def history(self) -> np.ndarray:
+        """
+        Returns the buffered hours with the oldest hour first.
+
+        Returns:
+        - np.ndarray: Array of shape (capacity, columns).
+        """
+
+        return np.roll(self.buffer, -self.position, axis=0)
+
+    def _grid(self, df: pd.DataFrame) -> tuple:
+        # Place the rows on a complete hourly grid after the last buffered hour, missing hours become NaN
+        timestamps = df['timestamp'].values.astype(np.int64)
+        first = timestamps.min() if self.last_timestamp is None else self.last_timestamp + MS_PER_HOUR
+        if timestamps.min() < first:
+            raise ValueError("Hours must come after the last hour in the state")
+
+        hours = (timestamps - first) // MS_PER_HOUR
+        grid = np.full((hours.max() + 1, len(self.columns)), np.nan)
+        grid[hours] = df[self.columns].values
+
+        return grid, hours, first
+
+    def transform(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Computes the lag and rolling features of new hours without changing the state.
+
+        Parameters:
+        - df (pd.DataFrame): New hours with a 'timestamp' column in milliseconds and the lagged columns. The values of the lagged columns may be NaN.
+
+        Returns:
+        - pd.DataFrame: The features of the new hours with the index of df.
+        """
+
+        grid, hours, _ = self._grid(df)
+        values = np.vstack([self.history(), grid])
+        features = window_features(values, self.capacity, self.lags, self.windows)[hours]
+
+        return pd.DataFrame(features.astype(np.float32), index=df.index, columns=feature_names(self.columns, self.lags, self.windows))
+
+    def push(self, df: pd.DataFrame) -> None:
+        """
+        Adds new hours to the ring buffer, dropping the oldest hours.
+
+        Parameters:
+        - df (pd.DataFrame): New hours with a 'timestamp' column in milliseconds and the lagged columns.
+        """
+
+        grid, _, first = self._grid(df)
+
+        # Only the last 'capacity' hours are kept
+        for row in grid[-self.capacity:]:
+            self.buffer[self.position] = row
+            self.position = (self.position + 1) % self.capacity
+        self.last_timestamp = first + (len(grid) - 1) * MS_PER_HOUR
+
+    def update(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Computes the lag and rolling features of new hours and adds the hours to the state.
+
+        Parameters:
+        - df (pd.DataFrame): New hours with a 'timestamp' column in milliseconds and the lagged columns.
+
+        Returns:
+        - pd.DataFrame: The features of the new hours with the index of df.
+        """
+
+        features = self.transform(df)
+        self.push(df)
+
+        return features
+
+    def save(self, path) -> None:
+        """
+        Saves the state to a NumPy file.
+
+        Parameters:
+        - path: Path of the '.npz' file.
+        """
+
+        np.savez(path, buffer=self.history(), columns=np.array(self.columns), lags=np.array(self.lags), windows=np.array(self.windows), last_timestamp=np.array(-1 if self.last_timestamp is None else self.last_timestamp))
+
+    @classmethod
+    def load(cls, path) -> 'LagState':
+        """
+        Loads a state saved with save().
+
+        Parameters:
+        - path: Path of the '.npz' file.
+
+        Returns:
+        - LagState: The loaded state.
+        """
+
+        data = np.load(path)
+        state = cls(data['columns'].tolist(), data['lags'].tolist(), data['windows'].tolist())
+        state.buffer = data['buffer'].copy()
+        state.last_timestamp = None if int(data['last_timestamp']) < 0 else int(data['last_timestamp'])
+
+        return state
+
+
+def add_lag_features(df: pd.DataFrame, columns: list = None, state: LagState = None) -> tuple:
+    """
+    Adds lag and rolling features to hourly data, sorted by time.
+
+    The features are computed with the same LagState that is used for the daily updates, so the full
+    history and the incremental updates give the same features.
+
+    Parameters:
+    - df (pd.DataFrame): Hourly data with a 'timestamp' column in milliseconds.
+    - columns (list): Columns with lag and rolling features. Default is the columns found by lag_columns.
+    - state (LagState): State with the hours before df. Default is an empty state.
+
+    Returns:
+    - tuple: The DataFrame with the features added and the state after the last hour.
+    """
+
+    df = df.sort_values('timestamp').reset_index(drop=True)
+    state = state or LagState(columns or lag_columns(df))
+
+    features = state.update(df)
+
+    return pd.concat([df, features], axis=1), state
@@ -0,0 +1,53 @@
+import warnings
+import pandas as pd
+from features.instrumentation import instrument
+
+
+@instrument()
+def wide_frame(df: pd.DataFrame, index: list, columns: list, value: str, duplicates: str = 'raise') -> pd.DataFrame:
+    """
+    Reshapes long API records into one wide column per combination of the 'columns' values.
+
+    The first 'index' column must identify the hour on its own (e.g. 'timestamp'); the other index
+    columns are carried along. The wide columns are named like '<column values>_<value>' in lowercase
+    with spaces replaced by underscores, e.g. 'dk1_spotpricedkk_kwh'.
+
+    Parameters:
+    - df (pd.DataFrame): Long DataFrame with one row per hour and combination of the 'columns' values.
+    - index (list): Columns identifying a row of the wide frame, the first one being the unique key.
+    - columns (list): Columns whose values become the wide columns, e.g. ['PriceArea'].
+    - value (str): Column with the values to spread out.
+    - duplicates (str): What to do with more than one value per hour and column: 'raise', 'first' or 'last'. Default is 'raise'.
+
+    Returns:
+    - pd.DataFrame: Wide DataFrame sorted by the index columns.
+    """
+
+    key = index[0]
+
+    # Categorical codes make the unstack work on small integers instead of strings
+    long = df[[key] + columns + [value]].astype({column: 'category' for column in columns})
+    values = long.set_index([key] + columns)[value]
+
+    # Detect duplicate hours instead of silently averaging them
+    duplicated = values.index.duplicated(keep=duplicates if duplicates != 'raise' else 'first')
+    if duplicated.any():
+        message = f"{duplicated.sum()} duplicate values of '{value}' for the same '{key}' and {columns}"
+        if duplicates == 'raise':
+            raise ValueError(message)
+        warnings.warn(message + f", keeping the {duplicates} one")
+        values = values[~duplicated]
+
+    wide = values.unstack(columns)
+
+    # Name the columns after the combined values and the value column, in the order of the names
+    names = ['_'.join([str(level) for level in (heading if isinstance(heading, tuple) else (heading,))] + [value]) for heading in wide.columns]
+    wide.columns = names
+    wide = wide[sorted(names)].dropna(how='all').dropna(axis=1, how='all')
+    wide.columns = [name.lower().replace(' ', '_') for name in wide.columns]
+
+    # Add the other index columns back, one row per key
+    ids = df[index].drop_duplicates(key).set_index(key)
+    result = ids.join(wide, how='inner').sort_index().reset_index()
+
+    return result
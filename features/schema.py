@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+
+
+# Time columns shared by the hourly feature groups. Dates repeat 24 times per day, so they are stored as categoricals
+TIME_SCHEMA = {
+    'timestamp': 'int64',
+    'datetime': 'datetime64[ns]',
+    'date': 'category',
+    'hour': 'int8',
+}
+
+# Electricity prices and renewable energy forecasts: every other column is a price or forecast per area ('*')
+ELECTRICITY_SCHEMA = {**TIME_SCHEMA, '*': 'float32'}
+RENEWABLE_FORECAST_SCHEMA = {**TIME_SCHEMA, '*': 'float32'}
+
+WEATHER_SCHEMA = {
+    **TIME_SCHEMA,
+    'temperature_2m': 'float32',
+    'relative_humidity_2m': 'float32',
+    'precipitation': 'float32',
+    'rain': 'float32',
+    'snowfall': 'float32',
+    'weather_code': 'int8',
+    'cloud_cover': 'float32',
+    'wind_speed_10m': 'float32',
+    'wind_gusts_10m': 'float32',
+}
+
+# Weather per location of the multi-location fetcher
+LOCATION_WEATHER_SCHEMA = {
+    **WEATHER_SCHEMA,
+    'latitude': 'float32',
+    'longitude': 'float32',
+    'weight': 'float32',
+}
+
+CALENDAR_SCHEMA = {
+    'date': 'category',
+    'dayofweek': 'int8',
+    'day': 'int8',
+    'month': 'int8',
+    'year': 'int16',
+    'workday': 'int8',
+}
+
+
+def enforce_schema(df: pd.DataFrame, schema: dict) -> pd.DataFrame:
+    """
+    Validates a DataFrame against a schema and casts all columns to the schema dtypes in one pass.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame to validate.
+    - schema (dict): Mapping of column names to dtypes. The key '*' gives the dtype of columns that are not listed.
+
+    Returns:
+    - pd.DataFrame: DataFrame with the schema dtypes and the same column order.
+    """
+
+    # Every listed column must be present and every other column needs the '*' dtype
+    missing = [column for column in schema if column != '*' and column not in df.columns]
+    unknown = [column for column in df.columns if column not in schema and '*' not in schema]
+    if missing or unknown:
+        raise ValueError(f"DataFrame does not match the schema, missing columns: {missing}, unknown columns: {unknown}")
+
+    dtypes = {column: schema.get(column, schema.get('*')) for column in df.columns}
+
+    # Integer values must fit in the smaller integer types, as the cast would silently wrap around
+    for column, dtype in dtypes.items():
+        if dtype == 'category' or not np.issubdtype(np.dtype(dtype), np.integer) or df.empty:
+            continue
+
+        values = df[column]
+        if values.isna().any():
+            raise ValueError(f"Column '{column}' has missing values and cannot be stored as {dtype}")
+        if values.min() < np.iinfo(dtype).min or values.max() > np.iinfo(dtype).max:
+            raise ValueError(f"Column '{column}' has values outside the range of {dtype}")
+
+    return df.astype(dtypes)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+
+
+# Number of nanoseconds in the units derived from the datetime64 values
+NS_PER_MS = 1_000_000
+NS_PER_HOUR = 3_600_000_000_000
+
+
+def normalise_time(df: pd.DataFrame, column: str, format: str) -> pd.DataFrame:
+    """
+    Adds 'date', 'datetime', 'hour' and 'timestamp' columns derived from a column of time strings.
+
+    The time strings are parsed once with an explicit format and the other columns are derived with
+    vectorized integer arithmetic on the datetime64 values instead of per-row Python functions.
+
+    Parameters:
+    - df (pd.DataFrame): DataFrame with the time strings.
+    - column (str): Name of the column with the time strings, e.g. 'HourDK' or 'time'.
+    - format (str): Format of the time strings, e.g. '%Y-%m-%dT%H:%M:%S'.
+
+    Returns:
+    - pd.DataFrame: The same DataFrame with the added columns.
+    """
+
+    # Parse the time strings once and work on the nanoseconds since epoch
+    datetimes = pd.to_datetime(df[column], format=format)
+    ns = datetimes.values.astype('datetime64[ns]').view('int64')
+
+    # Date as 'YYYY-MM-DD' string, hour of the day and timestamp in milliseconds
+    df['date'] = np.datetime_as_string(datetimes.values.astype('datetime64[D]')).astype(object)
+    df['datetime'] = datetimes
+    df['hour'] = (ns // NS_PER_HOUR) % 24
+    df['timestamp'] = ns // NS_PER_MS
+
+    return df
+
+
+def date_parts(dates: np.ndarray) -> dict:
+    """
+    Derives calendar parts from an array of dates with vectorized datetime64 arithmetic.
+
+    Parameters:
+    - dates (np.ndarray): Array of datetime64 values.
+
+    Returns:
+    - dict: Arrays for 'date' ('YYYY-MM-DD' strings), 'dayofweek' (Monday is 0), 'day', 'month' and 'year'.
+    """
+
+    days = dates.astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = days.astype('datetime64[Y]')
+
+    return {
+        'date': np.datetime_as_string(days).astype(object),
+        # 1970-01-01 was a Thursday, so shift by 3 to make Monday 0
+        'dayofweek': (days.view('int64') + 3) % 7,
+        'day': (days - months).astype('int64') + 1,
+        'month': (months - years).astype('int64') + 1,
+        'year': years.astype('int64') + 1970,
+    }
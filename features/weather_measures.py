@@ -1,9 +1,62 @@
-import requests
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 import pandas as pd
+from features.api_client import REQUEST_TIMEOUT, get_session
+from features.cache import cached_fetch
+from features.instrumentation import instrument, count, bind
+from features.time_utils import normalise_time
+from features.schema import enforce_schema, WEATHER_SCHEMA, LOCATION_WEATHER_SCHEMA
 
 
-def historical_weather_measures(historical: bool = False, lat: float = 57.048, lon: float = 9.9187, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d")) -> pd.DataFrame:
+HOURLY_MEASURES = 'temperature_2m,relative_humidity_2m,precipitation,rain,snowfall,weather_code,cloud_cover,wind_speed_10m,wind_gusts_10m'
+
+# Preset grids of (latitude, longitude, weight) covering the price areas, weighted by the approximate city population
+LOCATION_GRIDS = {
+    'DK1': [
+        (56.1629, 10.2039, 285000),  # Aarhus
+        (55.4038, 10.4024, 180000),  # Odense
+        (57.0480, 9.9187, 120000),   # Aalborg
+        (55.4765, 8.4594, 72000),    # Esbjerg
+        (56.4607, 10.0364, 63000),   # Randers
+        (55.4904, 9.4722, 62000),    # Kolding
+        (55.7093, 9.5357, 60000),    # Vejle
+        (55.8607, 9.8503, 60000),    # Horsens
+        (56.1393, 8.9738, 50000),    # Herning
+        (56.1697, 9.5451, 50000),    # Silkeborg
+        (56.4532, 9.4020, 41000),    # Viborg
+        (55.5657, 9.7527, 41000),    # Fredericia
+        (56.3601, 8.6161, 37000),    # Holstebro
+        (54.9138, 9.7922, 28000),    # Sønderborg
+        (55.0598, 10.6068, 27000),   # Svendborg
+        (57.4642, 9.9823, 26000),    # Hjørring
+        (57.4407, 10.5366, 23000),   # Frederikshavn
+        (55.2538, 9.4892, 22000),    # Haderslev
+    ],
+    'DK2': [
+        (55.6761, 12.5683, 750000),  # Copenhagen and Frederiksberg
+        (55.6415, 12.0803, 52000),   # Roskilde
+        (56.0361, 12.6136, 47000),   # Helsingør
+        (55.2299, 11.7609, 44000),   # Næstved
+        (55.4580, 12.1821, 38000),   # Køge
+        (55.9267, 12.3109, 36000),   # Hillerød
+        (55.4028, 11.3546, 33000),   # Slagelse
+        (55.7175, 11.7128, 29000),   # Holbæk
+        (54.7691, 11.8743, 16000),   # Nykøbing Falster
+        (55.6795, 11.0886, 16000),   # Kalundborg
+        (55.1009, 14.7066, 13000),   # Rønne
+    ],
+}
+
+
+def _fetch_open_meteo(API_URL: str, params: dict) -> pd.DataFrame:
+    # Make a request to the Open Meteo API and extract the hourly JSON data into a DataFrame
+    r = get_session().get(API_URL , params=params, timeout=REQUEST_TIMEOUT)
+    data = r.json()['hourly']
+    return pd.DataFrame(data)
+
+
+@instrument()
+def historical_weather_measures(historical: bool = False, lat: float = 57.048, lon: float = 9.9187, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d"), cache: bool = True) -> pd.DataFrame:
     """
     Fetches weather measures from Open Meteo API.
 
@@ -12,39 +65,38 @@ def historical_weather_measures(historical: bool = False, lat: float = 57.048, l
     - latitude and longitude: Default to coordinates to Aalborg.
     - start (str): Define a start date for the API call. Defaul is 'Yesterday'.
     - end (str): Define a end date for the API call. Default is 'Today'.
+    - cache (bool): If True, days already fetched are read from the local cache and only missing days are requested. Default is True.
 
     Returns:
     - pd.DataFrame: DataFrame with weather data for defined area.
     """
 
-    # Define the API URL for historical weather data and make a request to the API
+    # Define the API URL for historical weather data and the parameters of the request
     API_URL = 'https://archive-api.open-meteo.com/v1/archive'
-    r = requests.get(API_URL , params={
+    params = {
                 'latitude': lat,
                 'longitude': lon,
-                'start_date': start,
-                'end_date': end,
-                'hourly': 'temperature_2m,relative_humidity_2m,precipitation,rain,snowfall,weather_code,cloud_cover,wind_speed_10m,wind_gusts_10m'
-            })
+                'hourly': HOURLY_MEASURES
+            }
+    fetch = lambda fetch_start, fetch_end: _fetch_open_meteo(API_URL, {**params, 'start_date': fetch_start, 'end_date': fetch_end})
 
-    # Extract JSON data from the response and make a DataFrame
-    data = r.json()['hourly']
-    df = pd.DataFrame(data)
+    # Make the request, served from the local cache when enabled. The archive can revise the last days, so they are kept short-lived
+    if cache:
+        df = cached_fetch(API_URL, params, start, end, fetch, date_column='time', settle_days=7)
+    else:
+        df = fetch(start, end)
 
-    # Extract date from the 'time' column and convert it to datetime format
-    df["date"] = df['time'].str[:10]
-    df['datetime'] = pd.to_datetime(df['time'])
-    df['hour'] = pd.to_datetime(df['datetime']).dt.hour
+    # Extract date, datetime, hour and the timestamp in milliseconds from the 'time' column
+    df = normalise_time(df, 'time', '%Y-%m-%dT%H:%M')
 
     # Filter the DataFrame based on whether historical data is requested or not
     today = (date.today()).strftime("%Y-%m-%d")
+    fetched = len(df)
     if historical:
         df = df[df.date != today]
     else:
         df = df[df.date == today]
-
-    # Convert datetime to timestamp in milliseconds and add it as a new column
-    df["timestamp"] = df["datetime"].apply(lambda x: int(x.timestamp() * 1000))
+    count(rows_fetched=fetched, rows_filtered=fetched - len(df))
 
     # Select relevant columns for weather data and reorder them
     weather = df[['timestamp', 'datetime', 'date', 'hour', 'temperature_2m', 'relative_humidity_2m', 'precipitation', 'rain', 'snowfall', 'weather_code', 'cloud_cover', 'wind_speed_10m', 'wind_gusts_10m']]
@@ -52,51 +104,157 @@ def historical_weather_measures(historical: bool = False, lat: float = 57.048, l
     # Deleting rows with missing values
     weather = weather.dropna()
 
-    # Return the DataFrame with weather data
-    return weather
+    # Return the DataFrame with weather data in the compact dtypes of the schema
+    return enforce_schema(weather, WEATHER_SCHEMA)
 
-def forecast_weather_measures(lat: float = 57.048, lon: float = 9.9187, forecast_length : int = 1) -> pd.DataFrame:
+@instrument()
+def forecast_weather_measures(lat: float = 57.048, lon: float = 9.9187, forecast_length : int = 1, cache: bool = True) -> pd.DataFrame:
     """
     Fetches weather forecast from Open Meteo API.
 
     Parameters:
     - latitude and longitude: Default to coordinates to Aalborg.
     - forecast_length: Defining the length of the weather forecast. Default is 1 day.
+    - cache (bool): If True, forecast days fetched within the last hour are read from the local cache. Default is True.
 
     Returns:
     - pd.DataFrame: DataFrame with weather forecast for defined area.
     """
 
     API_URL = 'https://api.open-meteo.com/v1/forecast'
-    r = requests.get(API_URL , params={
+    params = {
                 'latitude': lat,
                 'longitude': lon,
-                'hourly': 'temperature_2m,relative_humidity_2m,precipitation,rain,snowfall,weather_code,cloud_cover,wind_speed_10m,wind_gusts_10m',
-                "forecast_days": forecast_length
-            })
-
-    # Extract JSON data from the response and make a DataFrame
-    data = r.json()['hourly']
-    df = pd.DataFrame(data)
+                'hourly': HOURLY_MEASURES
+            }
 
-    # Extract date from the 'time' column and convert it to datetime format
-    df["date"] = df['time'].str[:10]
-    df['datetime'] = pd.to_datetime(df['time'])
-    df['hour'] = pd.to_datetime(df['datetime']).dt.hour
+    # Make the request, served from the local cache when enabled. Forecast days are never final and expire after the cache TTL
+    if cache:
+        start = date.today().strftime("%Y-%m-%d")
+        end = (date.today() + timedelta(days=forecast_length - 1)).strftime("%Y-%m-%d")
+        fetch = lambda fetch_start, fetch_end: _fetch_open_meteo(API_URL, {**params, 'start_date': fetch_start, 'end_date': fetch_end})
+        df = cached_fetch(API_URL, params, start, end, fetch, date_column='time')
+    else:
+        df = _fetch_open_meteo(API_URL, {**params, "forecast_days": forecast_length})
 
-    # Convert datetime to timestamp in milliseconds and add it as a new column
-    df["timestamp"] = df["datetime"].apply(lambda x: int(x.timestamp() * 1000))
+    # Extract date, datetime, hour and the timestamp in milliseconds from the 'time' column
+    df = normalise_time(df, 'time', '%Y-%m-%dT%H:%M')
 
     # Select relevant columns for forecast weather data and reorder them
     forecast_weather = df[['timestamp', 'datetime', 'date', 'hour', 'temperature_2m', 'relative_humidity_2m', 'precipitation', 'rain', 'snowfall', 'weather_code', 'cloud_cover', 'wind_speed_10m', 'wind_gusts_10m']]
 
-    # Convert columns to float
-    forecast_weather['relative_humidity_2m'] = forecast_weather['relative_humidity_2m'].astype(float)
-    forecast_weather['weather_code'] = forecast_weather['weather_code'].astype(float)
-    forecast_weather['cloud_cover'] = forecast_weather['cloud_cover'].astype(float)
-
     # Deleting rows with missing values
     forecast_weather = forecast_weather.dropna()
 
-    # Return the DataFrame with forecast weather data
-    return forecast_weather
\ No newline at end of file
+    # Return the DataFrame with forecast weather data in the compact dtypes of the schema
+    return enforce_schema(forecast_weather, WEATHER_SCHEMA)
+
+def _fetch_open_meteo_batch(API_URL: str, params: dict, batch: list) -> pd.DataFrame:
+    # Make one request for a batch of locations, Open Meteo returns a list with one entry per location
+    r = get_session().get(API_URL , params={
+                **params,
+                'latitude': ','.join(str(lat) for lat, _ in batch),
+                'longitude': ','.join(str(lon) for _, lon in batch),
+            }, timeout=REQUEST_TIMEOUT)
+    body = r.json()
+    if isinstance(body, dict):
+        body = [body]
+
+    # Stack the hourly data of the locations in one DataFrame with the location index of the batch, also when no hours are returned
+    frames = [pd.DataFrame(entry.get('hourly', {})).assign(location=i) for i, entry in enumerate(body)]
+    return pd.concat(frames, ignore_index=True).reindex(columns=['time'] + HOURLY_MEASURES.split(',') + ['location'])
+
+
+@instrument()
+def multi_location_weather_measures(locations = 'DK1', forecast: bool = False, historical: bool = False, start: str = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"), end: str = (date.today()).strftime("%Y-%m-%d"), forecast_length: int = 1, aggregate: bool = False, batch_size: int = 50, max_workers: int = 4, cache: bool = True) -> pd.DataFrame:
+    """
+    Fetches weather measures or forecasts for many locations from Open Meteo API in batched, concurrent requests.
+
+    Parameters:
+    - locations: Name of a preset grid in LOCATION_GRIDS ('DK1' or 'DK2') or a list of (latitude, longitude) or (latitude, longitude, weight) tuples. Default is 'DK1'.
+    - forecast (bool): If True, fetches the weather forecast instead of historical measures. Default is False.
+    - historical (bool): If True, fetches historical data from start date to end date. If False, fetches data for the current day. Ignored for forecasts. Default is False.
+    - start (str): Define a start date for historical measures. Default is 'Yesterday'.
+    - end (str): Define a end date for historical measures. Default is 'Today'.
+    - forecast_length: Defining the length of the weather forecast. Default is 1 day.
+    - aggregate (bool): If True, returns the weighted average over the locations per hour instead of one row per location and hour. Default is False.
+    - batch_size (int): Number of locations per request. Default is 50.
+    - max_workers (int): Number of batches fetched at the same time. Default is 4.
+    - cache (bool): If True, days already fetched are read from the local cache and only missing days are requested. Default is True.
+
+    Returns:
+    - pd.DataFrame: DataFrame with weather data per location (with 'latitude', 'longitude' and 'weight' columns) or aggregated over the locations.
+    """
+
+    # Resolve the locations to latitude, longitude and weight, locations without a weight count equally
+    if isinstance(locations, str):
+        locations = LOCATION_GRIDS[locations]
+    grid = pd.DataFrame([tuple(location) + (1.0,) * (3 - len(location)) for location in locations], columns=['latitude', 'longitude', 'weight'])
+
+    # Define the API URL and the date range of the requests
+    if forecast:
+        API_URL = 'https://api.open-meteo.com/v1/forecast'
+        start = date.today().strftime("%Y-%m-%d")
+        end = (date.today() + timedelta(days=forecast_length - 1)).strftime("%Y-%m-%d")
+        settle_days = 0
+    else:
+        API_URL = 'https://archive-api.open-meteo.com/v1/archive'
+        settle_days = 7
+
+    # Fetch every batch of locations with one request, the batches are fetched concurrently
+    def fetch_batch(offset):
+        batch = list(zip(grid['latitude'][offset:offset + batch_size], grid['longitude'][offset:offset + batch_size]))
+        params = {'hourly': HOURLY_MEASURES, 'locations': batch}
+        fetch = lambda fetch_start, fetch_end: _fetch_open_meteo_batch(API_URL, {'hourly': HOURLY_MEASURES, 'start_date': fetch_start, 'end_date': fetch_end}, batch)
+        if cache:
+            df = cached_fetch(API_URL, params, start, end, fetch, date_column='time', settle_days=settle_days)
+        else:
+            df = fetch(start, end)
+
+        # Days without any rows can come back from the cache as a frame without columns
+        if df.empty:
+            return pd.DataFrame({'time': pd.Series(dtype=object), **{measure: pd.Series(dtype='float64') for measure in HOURLY_MEASURES.split(',')}, 'location': pd.Series(dtype='int64')})
+        df['location'] += offset
+        return df
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        frames = list(executor.map(bind(fetch_batch), range(0, len(grid), batch_size)))
+    df = pd.concat(frames, ignore_index=True)
+
+    # Extract date, datetime, hour and the timestamp in milliseconds from the 'time' column
+    df = normalise_time(df, 'time', '%Y-%m-%dT%H:%M')
+
+    # Filter the DataFrame based on whether historical data is requested or not
+    if not forecast:
+        today = (date.today()).strftime("%Y-%m-%d")
+        fetched = len(df)
+        if historical:
+            df = df[df.date != today]
+        else:
+            df = df[df.date == today]
+        count(rows_fetched=fetched, rows_filtered=fetched - len(df))
+
+    # Add the coordinates and weight of every location
+    df = df.join(grid, on='location')
+
+    # Select relevant columns for weather data and delete rows with missing values
+    measures = HOURLY_MEASURES.split(',')
+    weather = df[['timestamp', 'datetime', 'date', 'hour', 'latitude', 'longitude', 'weight'] + measures].dropna()
+
+    if not aggregate:
+        weather = weather.sort_values(['timestamp', 'latitude', 'longitude']).reset_index(drop=True)
+        return enforce_schema(weather, LOCATION_WEATHER_SCHEMA)
+
+    # Weighted average of the measures per hour, the weather code is the most severe code of the locations
+    averaged = [measure for measure in measures if measure != 'weather_code']
+    weighted = weather[averaged].mul(weather['weight'], axis=0)
+    weighted[['timestamp', 'weight']] = weather[['timestamp', 'weight']]
+    sums = weighted.groupby('timestamp').sum()
+
+    aggregated = sums[averaged].div(sums['weight'], axis=0)
+    aggregated['weather_code'] = weather.groupby('timestamp')['weather_code'].max()
+    ids = weather[['timestamp', 'datetime', 'date', 'hour']].drop_duplicates('timestamp').set_index('timestamp')
+
+    # Return the DataFrame with the same columns and dtypes as the single location fetchers
+    weather = ids.join(aggregated, how='inner')[['datetime', 'date', 'hour'] + measures].reset_index()
+    return enforce_schema(weather, WEATHER_SCHEMA)
@@ -0,0 +1,120 @@
+"""
+Command line entry point of the pipelines, run from the repository root:
+
+    python -m pipelines feature|inference|training|backfill|backtest|area-training|area-inference
+
+Each stage only imports the modules it needs, so the daily feature and inference runs do not pay
+for Jupyter, the plotting libraries or the training dependencies.
+
+The metrics of every run are appended to data/metrics/pipeline_metrics.jsonl, summarise them with
+
+    python -m features.instrumentation summary
+"""
+
+import argparse
+import importlib
+import os
+import time
+from features import instrumentation
+
+
+# Module and function of every stage, the module is imported only when the stage is run
+STAGES = {
+    'feature': ('pipelines.feature_pipeline', 'run'),
+    'inference': ('pipelines.batch_inference', 'run'),
+    'training': ('pipelines.training_pipeline', 'run'),
+    'backfill': ('pipelines.backfill', 'run'),
+    'backtest': ('pipelines.backtest', 'run'),
+    'area-training': ('pipelines.multi_area', 'run_training'),
+    'area-inference': ('pipelines.multi_area', 'run'),
+}
+
+
+def process_age() -> float:
+    """
+    Returns the seconds since the Python process started, which includes the interpreter startup.
+
+    Returns:
+    - float: Age of the process in seconds, or None when it cannot be read from /proc.
+    """
+
+    try:
+        with open('/proc/self/stat') as file:
+            start_ticks = int(file.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as file:
+            uptime = float(file.read().split()[0])
+    except (OSError, IndexError, ValueError):
+        return None
+
+    return uptime - start_ticks / os.sysconf('SC_CLK_TCK')
+
+
+def main(argv: list = None) -> dict:
+    """
+    Parses the command line, runs the selected stages and prints their timings.
+
+    Parameters:
+    - argv (list): Command line arguments. Default is sys.argv.
+
+    Returns:
+    - dict: Timings in seconds of the startup and of the import and run of every stage.
+    """
+
+    parser = argparse.ArgumentParser(prog='python -m pipelines', description='Runs the electricity price pipelines.')
+    parser.add_argument('stages', nargs='+', choices=list(STAGES), help='Stages to run in the given order')
+    parser.add_argument('--forecast-length', type=int, default=5, help='Length of the weather forecast in days (feature, inference, area-inference)')
+    parser.add_argument('--start', default='2022-01-01', help='First date of the backfill and the multi-area training data (backfill, area-training)')
+    parser.add_argument('--trials', type=int, default=20, help='Number of hyperparameter configurations to backtest (backtest)')
+    parser.add_argument('--time-budget', type=float, help='Seconds after which no new trials are started (backtest)')
+    parser.add_argument('--store', choices=['hopsworks', 'local'], help='Feature store backend. Default is FEATURE_STORE_BACKEND')
+    parser.add_argument('--training-data', choices=['feature_store', 'archive'], default='feature_store', help='Source of the training data, the feature store or the history archive (training, backtest)')
+    parser.add_argument('--metrics', default=instrumentation.METRICS_PATH or instrumentation.DEFAULT_METRICS_PATH, help='JSONL file the metrics are appended to. Default is PIPELINE_METRICS or data/metrics/pipeline_metrics.jsonl')
+    parser.add_argument('--no-metrics', action='store_true', help='Do not record metrics')
+    parser.add_argument('--trace-memory', action='store_true', help='Record the Python allocations of every step with tracemalloc, slows the run down')
+    parser.add_argument('--profile', choices=['cprofile', 'pyinstrument'], default=instrumentation.PROFILER, help='Profile every stage and write the profiles to data/profiles')
+    args = parser.parse_args(argv)
+
+    instrumentation.configure(None if args.no_metrics else args.metrics, args.trace_memory, args.profile)
+
+    if args.store:
+        from pipelines import feature_store
+        feature_store.FEATURE_STORE_BACKEND = args.store
+
+    # Time from the start of the process until the command line is parsed
+    timings = {'startup': process_age()}
+
+    stage_args = {
+        'feature': {'forecast_length': args.forecast_length},
+        'inference': {'forecast_length': args.forecast_length},
+        'training': {'source': args.training_data},
+        'backfill': {'start': args.start},
+        'backtest': {'source': args.training_data, 'n_trials': args.trials, 'time_budget': args.time_budget},
+        'area-training': {'start': args.start},
+        'area-inference': {'forecast_length': args.forecast_length},
+    }
+
+    for stage in args.stages:
+        # Import the stage module only when the stage is run
+        start = time.perf_counter()
+        module_name, function_name = STAGES[stage]
+        module = importlib.import_module(module_name)
+        timings[f'{stage} import'] = time.perf_counter() - start
+
+        # Every stage is one top level record of the metrics, the steps of the stage are nested in it
+        start = time.perf_counter()
+        with instrumentation.stage(stage, startup_seconds=timings['startup'], import_seconds=timings[f'{stage} import']), instrumentation.profiled(stage):
+            result = getattr(module, function_name)(**stage_args[stage])
+        timings[f'{stage} run'] = time.perf_counter() - start
+
+        print(f"{stage}: {result}")
+
+    # Report the timings and the peak memory of the whole run
+    for name, seconds in timings.items():
+        print(f"{name:<24} {'n/a' if seconds is None else f'{seconds:.2f} s'}")
+    print(f"{'peak memory':<24} {instrumentation.peak_rss_mb():.0f} MB")
+
+    return timings
+
+
+if __name__ == '__main__':
+    main()
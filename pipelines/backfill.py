@@ -0,0 +1,111 @@
+# Descriptions of the features in the feature groups
+ELECTRICITY_FEATURE_DESCRIPTIONS = [
+    {"name": "timestamp", "description": "Timestamp of the event time"},
+    {"name": "date", "description": "Date of the electricity measurement"},
+    {"name": "datetime", "description": "Date and time of the electricity measurement"},
+    {"name": "hour", "description": "Hour of the day"},
+    {"name": "dk1_spotpricedkk_kwh", "description": "Spot price in DKK per KWH"},
+]
+
+WEATHER_FEATURE_DESCRIPTIONS = [
+    {"name": "timestamp", "description": "Timestamp for the weather measurement"},
+    {"name": "date", "description": "Date of the weather measurement"},
+    {"name": "datetime", "description": "Date and time of the weather measurement"},
+    {"name": "hour", "description": "Hour of the day"},
+    {"name": "temperature_2m", "description": "Temperature at 2m above ground"},
+    {"name": "relative_humidity_2m", "description": "Relative humidity at 2m above ground"},
+    {"name": "precipitation", "description": "Precipitation"},
+    {"name": "rain", "description": "Rain"},
+    {"name": "snowfall", "description": "Snowfall"},
+    {"name": "weather_code", "description": "Weather code"},
+    {"name": "cloud_cover", "description": "Cloud cover"},
+    {"name": "wind_speed_10m", "description": "Wind speed at 10m above ground"},
+    {"name": "wind_gusts_10m", "description": "Wind gusts at 10m above ground"},
+]
+
+RENEWABLE_FEATURE_DESCRIPTIONS = [
+    {"name": "timestamp", "description": "Timestamp of the forecasted hour"},
+    {"name": "date", "description": "Date of the forecasted hour"},
+    {"name": "datetime", "description": "Date and time of the forecasted hour"},
+    {"name": "hour", "description": "Hour of the day"},
+    {"name": "dk1_offshore_wind_forecastintraday_kwh", "description": "Intraday forecast of offshore wind power in KWH"},
+    {"name": "dk1_onshore_wind_forecastintraday_kwh", "description": "Intraday forecast of onshore wind power in KWH"},
+    {"name": "dk1_solar_forecastintraday_kwh", "description": "Intraday forecast of solar power in KWH"},
+]
+
+CALENDAR_FEATURE_DESCRIPTIONS = [
+    {"name": "date", "description": "Date in the calendar"},
+    {"name": "day", "description": "Day number of the week. Monday is 0 and Sunday is 6"},
+    {"name": "month", "description": "Month number of the year"},
+    {"name": "workday", "description": "Workday or not a workday. Workday is 1 and not a workday is 0"},
+]
+
+
+def fetch(start: str = '2022-01-01') -> dict:
+    """
+    Fetches the historical electricity prices of DK1 and DK2, the renewable energy forecasts of DK1, the weather measures and the danish calendar concurrently.
+
+    Parameters:
+    - start (str): First date of the backfill. Default is '2022-01-01'.
+
+    Returns:
+    - dict: DataFrames for 'electricity', 'renewable_energy', 'weather' and 'calendar' and the latency of each source in 'timings'.
+    """
+
+    from features import electricity_prices, weather_measures, calendar
+    from pipelines.concurrent_fetch import fetch_sources
+
+    # Today is not included in the data as it is not historical data
+    frames, timings = fetch_sources({
+        'electricity': lambda: electricity_prices.electricity_prices(historical=True, area=["DK1", "DK2"], start=start, backfill=True),
+        'renewable_energy': lambda: electricity_prices.forecast_renewable_energy(historical=True, area=["DK1"], start=start, backfill=True),
+        'weather': lambda: weather_measures.historical_weather_measures(historical=True, start=start),
+        'calendar': lambda: calendar.dk_calendar(start=start),
+    }, timeouts={'electricity': 1800, 'renewable_energy': 1800, 'weather': 600})
+
+    return {**frames, 'timings': timings}
+
+
+def run(start: str = '2022-01-01', store=None, archive=None) -> dict:
+    """
+    Runs the feature backfill: fetches the history, appends it to the history archive and creates and fills the feature groups.
+
+    Parameters:
+    - start (str): First date of the backfill. Default is '2022-01-01'.
+    - store (FeatureStore): Feature store to fill. Default is the store of the configured backend.
+    - archive (HistoryArchive): History archive to append to. Default is the archive in data/archive.
+
+    Returns:
+    - dict: Number of rows inserted per feature group and appended per archive dataset in 'history_archive'.
+    """
+
+    from pipelines.feature_store import get_feature_store
+    from pipelines.history_archive import get_archive
+
+    data = fetch(start)
+    store = store or get_feature_store()
+    archive = archive or get_archive()
+
+    # The archive keeps the prices of both areas, hours that are already archived are skipped
+    archived = {
+        'electricity_prices': archive.append('electricity_prices', data['electricity']),
+        'weather_measurements': archive.append('weather_measurements', data['weather']),
+        'renewable_energy_forecasts': archive.append('renewable_energy_forecasts', data['renewable_energy']),
+    }
+
+    # The feature group keeps the DK1 prices only
+    feature_groups = [
+        ('electricity_prices', data['electricity'].drop(columns=['dk2_spotpricedkk_kwh']), ELECTRICITY_FEATURE_DESCRIPTIONS),
+        ('weather_measurements', data['weather'], WEATHER_FEATURE_DESCRIPTIONS),
+        ('renewable_energy_forecasts', data['renewable_energy'], RENEWABLE_FEATURE_DESCRIPTIONS),
+        ('dk_calendar', data['calendar'], CALENDAR_FEATURE_DESCRIPTIONS),
+    ]
+
+    # Creating the feature groups, inserting the data and updating the feature descriptions
+    rows = {}
+    for name, df, descriptions in feature_groups:
+        store.create_feature_group(name)
+        rows[name] = store.insert(name, df)
+        store.update_feature_descriptions(name, descriptions)
+
+    return {**rows, 'history_archive': archived}
@@ -0,0 +1,254 @@
+import itertools
+import os
+import random
+import tempfile
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor, wait
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from features.instrumentation import instrument
+
+
+# Hyperparameters searched for the XGBoost Regressor
+SEARCH_SPACE = {
+    'max_depth': [3, 5, 7, 9],
+    'learning_rate': [0.03, 0.1, 0.3],
+    'min_child_weight': [1, 5, 10],
+    'subsample': [0.7, 1.0],
+    'colsample_bytree': [0.7, 1.0],
+}
+
+# Boosting rounds are stopped early when the validation error has not improved for EARLY_STOPPING_ROUNDS rounds
+NUM_BOOST_ROUND = 1000
+EARLY_STOPPING_ROUNDS = 50
+
+# Where the leaderboard of the search is written, in the model directory of the repository
+LEADERBOARD_PATH = os.path.join(Path(__file__).resolve().parent.parent, 'model', 'leaderboard.csv')
+
+
+def walk_forward_folds(n_rows: int, n_folds: int = 4, test_rows: int = 24 * 14, valid_share: float = 0.1) -> list:
+    """
+    Splits hourly rows in time order into walk-forward folds with a growing training window.
+
+    Every fold tests on the 'test_rows' hours after its training window, the last fold tests on the
+    last hours. The last part of every training window is used for early stopping.
+
+    Parameters:
+    - n_rows (int): Number of rows sorted by time.
+    - n_folds (int): Number of folds. Default is 4.
+    - test_rows (int): Number of test hours per fold. Default is 14 days.
+    - valid_share (float): Share of the training window used for early stopping. Default is 0.1.
+
+    Returns:
+    - list: One dictionary per fold with the (start, end) rows of 'train', 'valid' and 'test'.
+    """
+
+    first_test = n_rows - n_folds * test_rows
+    if first_test < test_rows:
+        raise ValueError(f"{n_rows} rows are too few for {n_folds} folds of {test_rows} test rows")
+
+    folds = []
+    for k in range(n_folds):
+        test_start = first_test + k * test_rows
+        valid_start = int(test_start * (1 - valid_share))
+        folds.append({
+            'train': (0, valid_start),
+            'valid': (valid_start, test_start),
+            'test': (test_start, test_start + test_rows),
+        })
+
+    return folds
+
+
+def sample_configs(search_space: dict = SEARCH_SPACE, n_trials: int = None, seed: int = 42) -> list:
+    """
+    Samples hyperparameter configurations from the grid of the search space.
+
+    Parameters:
+    - search_space (dict): Lists of values per hyperparameter. Default is SEARCH_SPACE.
+    - n_trials (int): Number of configurations. Default is the full grid.
+    - seed (int): Seed of the sampling. Default is 42.
+
+    Returns:
+    - list: Dictionaries of hyperparameters.
+    """
+
+    names = list(search_space)
+    grid = [dict(zip(names, values)) for values in itertools.product(*search_space.values())]
+
+    if n_trials is None or n_trials >= len(grid):
+        return grid
+    return random.Random(seed).sample(grid, n_trials)
+
+
+# Data of a worker process: the memory mapped arrays, the folds and the matrices built per fold
+_WORKER = {}
+
+
+def _init_worker(directory: str, folds: list) -> None:
+    # The arrays are memory mapped, so the worker processes share the pages of the same files
+    _WORKER['X'] = np.load(os.path.join(directory, 'X.npy'), mmap_mode='r')
+    _WORKER['y'] = np.load(os.path.join(directory, 'y.npy'), mmap_mode='r')
+    _WORKER['folds'] = folds
+    _WORKER['matrices'] = {}
+
+
+def _fold_matrices(i: int) -> tuple:
+    # Build the matrices of a fold on first use and reuse them for every next trial in this worker
+    import xgboost as xgb
+
+    if i not in _WORKER['matrices']:
+        X, y, fold = _WORKER['X'], _WORKER['y'], _WORKER['folds'][i]
+        (train_start, train_end), (valid_start, valid_end), (test_start, test_end) = fold['train'], fold['valid'], fold['test']
+        _WORKER['matrices'][i] = (
+            xgb.DMatrix(X[train_start:train_end], label=y[train_start:train_end], nthread=1),
+            xgb.DMatrix(X[valid_start:valid_end], label=y[valid_start:valid_end], nthread=1),
+            np.ascontiguousarray(X[test_start:test_end]),
+            np.asarray(y[test_start:test_end]),
+        )
+
+    return _WORKER['matrices'][i]
+
+
+def evaluate(params: dict) -> dict:
+    """
+    Backtests one hyperparameter configuration over all walk-forward folds in a worker process.
+
+    Parameters:
+    - params (dict): Hyperparameters of the XGBoost Regressor.
+
+    Returns:
+    - dict: The hyperparameters with the mean metrics over the folds, the mean best iteration, the total training time and the prediction time per 1000 rows.
+    """
+
+    import xgboost as xgb
+    from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+
+    # One thread per trial, the trials run in parallel over the cores
+    booster_params = {'objective': 'reg:squarederror', 'tree_method': 'hist', 'nthread': 1, **params}
+    scores = []
+    train_seconds, predict_seconds, predicted_rows = 0.0, 0.0, 0
+
+    for i in range(len(_WORKER['folds'])):
+        dtrain, dvalid, X_test, y_test = _fold_matrices(i)
+
+        start = time.perf_counter()
+        booster = xgb.train(booster_params, dtrain, NUM_BOOST_ROUND, evals=[(dvalid, 'valid')], early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        train_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = booster.inplace_predict(X_test, iteration_range=(0, booster.best_iteration + 1))
+        predict_seconds += time.perf_counter() - start
+        predicted_rows += len(X_test)
+
+        scores.append({
+            'MSE': mean_squared_error(y_test, y_pred),
+            'R squared': r2_score(y_test, y_pred),
+            'MAE': mean_absolute_error(y_test, y_pred),
+            'best_iteration': booster.best_iteration + 1,
+        })
+
+    return {
+        **params,
+        **pd.DataFrame(scores).mean().to_dict(),
+        'train_seconds': train_seconds,
+        'predict_ms_per_1000_rows': 1000 * 1000 * predict_seconds / predicted_rows,
+    }
+
+
+@instrument()
+def search(X: np.ndarray, y: np.ndarray, configs: list, folds: list, max_workers: int = None, time_budget: float = None) -> pd.DataFrame:
+    """
+    Backtests the hyperparameter configurations in parallel over a process pool.
+
+    Parameters:
+    - X (np.ndarray): Features sorted by time.
+    - y (np.ndarray): Dependent variable sorted by time.
+    - configs (list): Hyperparameter configurations to try.
+    - folds (list): Walk-forward folds from walk_forward_folds.
+    - max_workers (int): Number of worker processes. Default is the number of cores.
+    - time_budget (float): Seconds after which no new trials are started, the running trials are finished. Default is no limit.
+
+    Returns:
+    - pd.DataFrame: Leaderboard with one row per finished configuration, the lowest mean MAE first. Failed configurations are last with their 'error'.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        # Write the arrays once, the workers memory map them instead of receiving a copy per trial
+        np.save(os.path.join(directory, 'X.npy'), np.ascontiguousarray(X, dtype=np.float32))
+        np.save(os.path.join(directory, 'y.npy'), np.ascontiguousarray(y, dtype=np.float32))
+
+        executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count(), initializer=_init_worker, initargs=(directory, folds))
+        futures = [executor.submit(evaluate, params) for params in configs]
+
+        # When the time budget is used, the trials that have not started are cancelled and the running trials are finished
+        wait(futures, timeout=time_budget)
+        executor.shutdown(wait=True, cancel_futures=True)
+
+    # A failing configuration is recorded as a failed trial, so it does not discard the other trials
+    results = []
+    for params, future in zip(configs, futures):
+        if future.cancelled():
+            continue
+        try:
+            results.append(future.result())
+        except Exception as error:
+            warnings.warn(f"Trial {params} failed: {error!r}")
+            results.append({**params, 'error': repr(error)})
+
+    leaderboard = pd.DataFrame(results)
+    if 'MAE' not in leaderboard:
+        return leaderboard
+    return leaderboard.sort_values('MAE').reset_index(drop=True)
+
+
+def prepare_data(X: pd.DataFrame) -> tuple:
+    """
+    Adds the lag and rolling features and splits the data into time ordered arrays of features and the dependent variable.
+
+    Parameters:
+    - X (pd.DataFrame): Training data including 'dk1_spotpricedkk_kwh'.
+
+    Returns:
+    - tuple: Features as float32 array, the dependent variable as float32 array and the feature names.
+    """
+
+    from features.lag_features import add_lag_features
+    from pipelines.training_pipeline import split_target
+
+    X, _ = add_lag_features(X)
+    X, y = split_target(X)
+
+    return X.values.astype(np.float32), y.values.astype(np.float32), list(X.columns)
+
+
+def run(store=None, n_trials: int = 20, n_folds: int = 4, max_workers: int = None, time_budget: float = None, output: str = LEADERBOARD_PATH, source: str = 'feature_store') -> pd.DataFrame:
+    """
+    Runs the hyperparameter search with walk-forward backtests on the training data of the feature store or the history archive and writes the leaderboard.
+
+    Parameters:
+    - store (FeatureStore): Feature store with the training data. Default is the store of the configured backend.
+    - n_trials (int): Number of configurations sampled from SEARCH_SPACE. Default is 20.
+    - n_folds (int): Number of walk-forward folds. Default is 4.
+    - max_workers (int): Number of worker processes. Default is the number of cores.
+    - time_budget (float): Seconds after which no new trials are started. Default is no limit.
+    - output (str): CSV file of the leaderboard. Default is LEADERBOARD_PATH.
+    - source (str): Source of the training data, 'feature_store' or 'archive'. Default is 'feature_store'.
+
+    Returns:
+    - pd.DataFrame: The leaderboard, the lowest mean MAE first.
+    """
+
+    from pipelines.training_pipeline import load_training_data
+
+    # Retrieve the training data by joining the feature groups or from the history archive
+    X, y, _ = prepare_data(load_training_data(store, source))
+
+    leaderboard = search(X, y, sample_configs(n_trials=n_trials), walk_forward_folds(len(X), n_folds), max_workers, time_budget)
+
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    leaderboard.to_csv(output, index=False)
+
+    return leaderboard
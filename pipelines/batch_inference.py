@@ -0,0 +1,334 @@
+import json
+import os
+from datetime import date, datetime, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from features.instrumentation import instrument
+
+
+# Location of the precomputed predictions and the version of their file layout
+PREDICTIONS_DIR = Path(__file__).resolve().parent.parent / 'data' / 'predictions'
+SCHEMA_VERSION = 2
+
+
+def load_model(project=None, nthread: int = 1):
+    """
+    Retrieves the latest version of the XGBoost Regressor model from the Hopsworks Model Registry as an inference engine.
+
+    With the local feature store backend and no project, the model exported by the training pipeline to
+    its local model directory is loaded instead. The native booster is loaded when the model directory has
+    one, otherwise the joblib file.
+
+    Parameters:
+    - project: Logged in Hopsworks project. Default is to log in, or no login with the local backend.
+    - nthread (int): Number of threads used for predictions. Default is 1.
+
+    Returns:
+    - InferenceEngine: The engine with the booster of the model.
+    """
+
+    from pipelines import feature_store
+    from pipelines.inference_engine import InferenceEngine, SCHEMA_FILE
+    from pipelines.training_pipeline import MODEL_DIR, MODEL_NAME
+
+    if project is None and feature_store.FEATURE_STORE_BACKEND == 'local':
+        # The local backend has no Model Registry, the training pipeline saves the model locally
+        saved_model_dir = MODEL_DIR
+    else:
+        import hopsworks
+
+        if project is None:
+            project = hopsworks.login()
+
+        # Retrieving the latest model version from the Model Registry, each training run uploads a new version
+        mr = project.get_model_registry()
+        models = mr.get_models(name=MODEL_NAME)
+        if not models:
+            raise ValueError(f"No versions of the model '{MODEL_NAME}' in the Model Registry, run the training pipeline first")
+        retrieved_model = max(models, key=lambda model: model.version)
+
+        # Downloading the model to a local directory
+        saved_model_dir = retrieved_model.download()
+
+    # Loading the native booster, models saved before it was exported are loaded with joblib
+    if os.path.exists(os.path.join(saved_model_dir, SCHEMA_FILE)):
+        return InferenceEngine.load(saved_model_dir, nthread)
+
+    import joblib
+    return InferenceEngine.from_model(joblib.load(saved_model_dir + "/dk_electricity_model.pkl"), nthread)
+
+
+def load_new_data(forecast_length: int = 5) -> pd.DataFrame:
+    """
+    Fetches the weather forecast and today's renewable energy forecasts of DK1 and merges them with the danish calendar.
+
+    Parameters:
+    - forecast_length (int): Length of the weather forecast in days. Default is 5 days.
+
+    Returns:
+    - pd.DataFrame: DataFrame with the features of the forecast hours, the renewable forecasts are NaN after today.
+    """
+
+    from features import electricity_prices, weather_measures, calendar
+
+    # Fetching weather forecast measures
+    weather_forecast_df = weather_measures.forecast_weather_measures(
+        forecast_length=forecast_length
+    )
+
+    # Adding the renewable energy forecasts, which are only published for the current day
+    renewable_df = electricity_prices.forecast_renewable_energy(historical=False, area=["DK1"])
+    new_data = weather_forecast_df.merge(renewable_df.drop(columns=['datetime', 'date', 'hour']), on='timestamp', how='left')
+
+    # Adding the danish calendar features by looking up the dates
+    return calendar.join_calendar(new_data)
+
+
+def uses_lag_features(model) -> bool:
+    """
+    Tells if the model was trained with lag and rolling features of the previous prices.
+
+    Parameters:
+    - model: The trained XGBoost Regressor model or its InferenceEngine.
+
+    Returns:
+    - bool: True if any feature of the model is a lag or rolling feature.
+    """
+
+    feature_names = model.feature_names if hasattr(model, 'feature_names') else model.get_booster().feature_names
+    return any('_lag_' in name or '_rolling_' in name for name in feature_names or [])
+
+
+def load_price_state(first_timestamp: int, days: int = 8):
+    """
+    Builds the lag state from the DK1 prices and renewable energy forecasts of the last days before the first forecast hour.
+
+    Only the hours needed by the longest lag or rolling window are fetched, not the full history.
+
+    Parameters:
+    - first_timestamp (int): Timestamp in milliseconds of the first forecast hour.
+    - days (int): Number of days of prices to fetch. Default is 8 days, enough for the 168 hour lag.
+
+    Returns:
+    - LagState: The state with the prices and renewable forecasts before the first forecast hour.
+    """
+
+    from features import electricity_prices
+    from features.lag_features import LagState, lag_columns
+    from pipelines.training_pipeline import TARGET
+
+    # Fetching the prices of the last days and the prices of today, which are published the day before
+    start = (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
+    prices = pd.concat([
+        electricity_prices.electricity_prices(historical=True, area=["DK1"], start=start),
+        electricity_prices.electricity_prices(historical=False, area=["DK1"]),
+    ], ignore_index=True)
+
+    # Adding the renewable energy forecasts of the same hours
+    renewable = pd.concat([
+        electricity_prices.forecast_renewable_energy(historical=True, area=["DK1"], start=start),
+        electricity_prices.forecast_renewable_energy(historical=False, area=["DK1"]),
+    ], ignore_index=True)
+    history = prices.merge(renewable.drop(columns=['datetime', 'date', 'hour']), on='timestamp', how='left')
+
+    state = LagState([TARGET] + lag_columns(renewable))
+    state.push(history[history['timestamp'] < first_timestamp].sort_values('timestamp'))
+
+    return state
+
+
+@instrument()
+def predict(model, new_data: pd.DataFrame, state=None) -> pd.DataFrame:
+    """
+    Predicts the electricity prices for the forecast hours.
+
+    With a lag state the hours are predicted one after another: every prediction is added to the state,
+    so it becomes the previous price of the next hours.
+
+    Parameters:
+    - model: The trained XGBoost Regressor model or its InferenceEngine.
+    - new_data (pd.DataFrame): DataFrame with the features of the forecast hours.
+    - state (LagState): State with the prices before the first forecast hour, needed by models with lag features. Default is None.
+
+    Returns:
+    - pd.DataFrame: DataFrame with the 'prediction' and 'time' of every forecast hour, sorted by time.
+    """
+
+    from pipelines.inference_engine import InferenceEngine
+
+    engine = model if isinstance(model, InferenceEngine) else InferenceEngine.from_model(model)
+    new_data = new_data.sort_values('timestamp').reset_index(drop=True)
+
+    if state is None:
+        # Select the features of the model as one float32 array and predict all hours at once
+        predictions = engine.predict(engine.to_array(new_data))
+    else:
+        from pipelines.training_pipeline import TARGET
+
+        # The features that do not depend on the previous prices are selected once for all hours
+        lagged = [name for name in engine.feature_names if name not in new_data.columns]
+        columns = [engine.feature_names.index(name) for name in lagged]
+        X = engine.to_array(new_data.reindex(columns=new_data.columns.union(lagged, sort=False)))
+        predictions = np.empty(len(new_data), dtype=np.float32)
+
+        # Predict the hours in time order, the unknown price of an hour is NaN until it is predicted
+        # Columns of the state that are missing in the forecast, e.g. renewable forecasts that were not published, are NaN
+        new_data = new_data.reindex(columns=new_data.columns.union(state.columns, sort=False))
+        for i in range(len(new_data)):
+            hour = new_data.iloc[[i]].assign(**{TARGET: np.nan})
+            X[i, columns] = state.transform(hour)[lagged].values[0]
+            predictions[i] = engine.predict(X[i:i + 1])[0]
+            state.push(hour.assign(**{TARGET: predictions[i]}))
+
+    predictions_df = pd.DataFrame({
+        'prediction': predictions,
+        'time': new_data["datetime"],
+    })
+
+    return predictions_df
+
+
+@instrument()
+def write_predictions(predictions_df: pd.DataFrame, run_date: str = None, directory: Path = PREDICTIONS_DIR, keep: int = 7) -> Path:
+    """
+    Writes the predictions to a versioned Parquet file with one row group per forecast date and updates the index.
+
+    The file is one area x time table, every row group holds all price areas of its date.
+
+    Parameters:
+    - predictions_df (pd.DataFrame): DataFrame with 'prediction' and 'time' columns and optional 'area' and 'horizon' columns. Predictions without an area are for DK1.
+    - run_date (str): Date of the inference run in 'YYYY-MM-DD' format. Default is today.
+    - directory (Path): Directory of the predictions store. Default is PREDICTIONS_DIR.
+    - keep (int): Number of most recent runs to keep. Default is 7.
+
+    Returns:
+    - Path: Path of the written predictions file.
+    """
+
+    run_date = run_date or date.today().strftime("%Y-%m-%d")
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    # Compact columns: the area as dictionary, float32 prices, the hour as datetime64 and the horizon in hours as int16
+    if 'area' not in predictions_df:
+        predictions_df = predictions_df.assign(area='DK1')
+    if 'horizon' not in predictions_df:
+        predictions_df = predictions_df.assign(horizon=predictions_df.groupby('area')['time'].rank(method='first').astype('int16'))
+    predictions_df = predictions_df.sort_values(by=['time', 'area'])
+    table = pa.table({
+        'area': pa.array(predictions_df['area'].values.astype(str)).dictionary_encode(),
+        'time': pa.array(predictions_df['time'].values.astype('datetime64[s]')),
+        'horizon': pa.array(predictions_df['horizon'].values.astype('int16')),
+        'prediction': pa.array(predictions_df['prediction'].values.astype('float32')),
+    })
+
+    # One row group per forecast date, so a date range can be read without the rest of the file
+    dates = predictions_df['time'].dt.strftime('%Y-%m-%d')
+    path = directory / f'predictions_{run_date}.parquet'
+    with pq.ParquetWriter(path, table.schema) as writer:
+        offset = 0
+        for _, rows in dates.groupby(dates, sort=True).size().items():
+            writer.write_table(table.slice(offset, rows))
+            offset += rows
+
+    # The index points to the latest run and lists its forecast dates in row group order
+    index = {
+        'schema_version': SCHEMA_VERSION,
+        'run_date': run_date,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'file': path.name,
+        'dates': sorted(dates.unique().tolist()),
+        'areas': sorted(predictions_df['area'].unique().tolist()),
+    }
+    tmp_path = directory / 'index.json.tmp'
+    tmp_path.write_text(json.dumps(index, indent=2))
+    tmp_path.replace(directory / 'index.json')
+
+    # Remove the oldest runs
+    for old_path in sorted(directory.glob('predictions_*.parquet'))[:-keep]:
+        old_path.unlink()
+
+    return path
+
+
+def read_index(directory: Path = PREDICTIONS_DIR) -> dict:
+    """
+    Reads the index of the latest predictions run.
+
+    Parameters:
+    - directory (Path): Directory of the predictions store. Default is PREDICTIONS_DIR.
+
+    Returns:
+    - dict: The index with 'run_date', 'file' and 'dates', or None if there are no compatible predictions.
+    """
+
+    index_path = Path(directory) / 'index.json'
+    if not index_path.exists():
+        return None
+
+    index = json.loads(index_path.read_text())
+    if index.get('schema_version') != SCHEMA_VERSION:
+        return None
+
+    return index
+
+
+def read_predictions(days: int = None, directory: Path = PREDICTIONS_DIR, index: dict = None, area: str = None) -> pd.DataFrame:
+    """
+    Reads the predictions of the first forecast dates of the latest run.
+
+    Parameters:
+    - days (int): Number of forecast dates to read. Default is all dates.
+    - directory (Path): Directory of the predictions store. Default is PREDICTIONS_DIR.
+    - index (dict): Index returned by read_index. Default is to read it.
+    - area (str): Price area to read, e.g. 'DK1'. Default is all areas.
+
+    Returns:
+    - pd.DataFrame: DataFrame with 'prediction' and 'time' columns sorted by time, and an 'area' column when all areas are read.
+    """
+
+    index = index or read_index(directory)
+    if index is None:
+        raise FileNotFoundError(f"No predictions found in {directory}")
+
+    # Read only the row groups of the selected dates from the memory mapped file
+    parquet_file = pq.ParquetFile(Path(directory) / index['file'], memory_map=True)
+    row_groups = list(range(parquet_file.num_row_groups))[:days]
+    table = parquet_file.read_row_groups(row_groups, columns=['prediction', 'time', 'area'])
+
+    # Keep the rows of one area
+    if area is not None:
+        table = table.filter(pc.equal(table['area'].cast(pa.string()), area)).drop(['area'])
+
+    predictions_df = table.to_pandas()
+    predictions_df['time'] = predictions_df['time'].astype('datetime64[ns]')
+    if 'area' in predictions_df:
+        predictions_df['area'] = predictions_df['area'].astype(str)
+
+    return predictions_df
+
+
+def run(forecast_length: int = 5, directory: Path = PREDICTIONS_DIR) -> Path:
+    """
+    Runs the batch inference: loads the model, predicts the forecast hours and writes the predictions store.
+
+    Parameters:
+    - forecast_length (int): Length of the weather forecast in days. Default is 5 days.
+    - directory (Path): Directory of the predictions store. Default is PREDICTIONS_DIR.
+
+    Returns:
+    - Path: Path of the written predictions file.
+    """
+
+    model = load_model()
+    new_data = load_new_data(forecast_length)
+
+    # Models with lag features need the prices before the first forecast hour
+    state = load_price_state(new_data['timestamp'].min()) if uses_lag_features(model) else None
+    predictions_df = predict(model, new_data, state)
+
+    return write_predictions(predictions_df, directory=directory)
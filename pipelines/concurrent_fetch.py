@@ -0,0 +1,119 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+import pandas as pd
+from features import instrumentation
+
+
+# Default number of seconds a source may take, including the retries of the shared session
+DEFAULT_TIMEOUT = 120
+
+
+def _timed(func):
+    # Call a source and measure its latency, failed requests are already retried by the shared session
+    start = time.perf_counter()
+    return func(), time.perf_counter() - start
+
+
+def fetch_sources(sources: dict, timeouts: dict = None) -> tuple:
+    """
+    Runs the source fetches concurrently, each with its own timeout.
+
+    Failed requests are retried with backoff by the shared session of features.api_client, and every request
+    has a timeout, so a stuck source ends with an error instead of keeping its worker thread alive.
+
+    Parameters:
+    - sources (dict): Mapping of source names to functions without arguments that return the fetched data.
+    - timeouts (dict): Timeout in seconds per source name. Sources without a timeout get DEFAULT_TIMEOUT.
+
+    Returns:
+    - tuple: Dictionary of the fetched data per source name and dictionary of latencies in seconds per source name.
+    """
+
+    timeouts = timeouts or {}
+    frames, timings = {}, {}
+
+    executor = ThreadPoolExecutor(max_workers=len(sources))
+    try:
+        futures = {name: executor.submit(instrumentation.bind(_timed), func) for name, func in sources.items()}
+        start = time.perf_counter()
+
+        # Wait for every source until its own deadline, counted from the start of all fetches
+        for name, future in futures.items():
+            remaining = timeouts.get(name, DEFAULT_TIMEOUT) - (time.perf_counter() - start)
+            try:
+                frames[name], timings[name] = future.result(timeout=max(remaining, 0))
+            except TimeoutError:
+                raise TimeoutError(f"Source '{name}' did not finish within {timeouts.get(name, DEFAULT_TIMEOUT)} seconds")
+    finally:
+        # Do not wait for sources that timed out or are no longer needed
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return frames, timings
+
+
+def merge_features(frames: dict) -> pd.DataFrame:
+    """
+    Aligns the fetched sources on the hour and adds the calendar features.
+
+    Parameters:
+    - frames (dict): DataFrames of the 'electricity', 'renewable_energy' and 'weather' sources.
+
+    Returns:
+    - pd.DataFrame: One row per hour that is in all sources, the time columns are taken from the electricity prices.
+    """
+
+    from features import calendar
+
+    time_columns = ['datetime', 'date', 'hour']
+    with instrumentation.stage('merge', rows_in=sum(len(frames[name]) for name in ['electricity', 'renewable_energy', 'weather'])) as record:
+        features = frames['electricity'] \
+            .merge(frames['renewable_energy'].drop(columns=time_columns), on='timestamp', how='inner') \
+            .merge(frames['weather'].drop(columns=time_columns), on='timestamp', how='inner')
+        features = calendar.join_calendar(features)
+        record['rows_out'] = len(features)
+
+    return features
+
+
+def fetch_features(historical: bool = False, area: list = None, start: str = None, end: str = None, forecast_length: int = 5, timeouts: dict = None) -> tuple:
+    """
+    Fetches electricity prices, renewable energy forecasts, weather and the danish calendar concurrently and merges them.
+
+    Parameters:
+    - historical (bool): If True, fetches historical prices, forecasts and weather measures from start date to end date. If False, fetches the current day with the weather forecast. Default is False.
+    - area (list): Price areas to fetch. Default is ["DK1"].
+    - start (str): Start date of historical data. Default is the default of the fetchers.
+    - end (str): End date of historical data. Default is the default of the fetchers.
+    - forecast_length (int): Length of the weather forecast in days when historical is False. Default is 5 days.
+    - timeouts (dict): Timeout in seconds per source ('electricity', 'renewable_energy', 'weather', 'calendar').
+
+    Returns:
+    - tuple: The merged DataFrame with one row per hour and dictionary of latencies in seconds per source, 'merge' and 'total'.
+    """
+
+    from features import electricity_prices, weather_measures, calendar
+
+    total_start = time.perf_counter()
+    area = area or ["DK1"]
+
+    # Only pass the dates that are given, so the fetchers keep their own defaults
+    dates = {key: value for key, value in {'start': start, 'end': end}.items() if value is not None}
+
+    if historical:
+        weather = lambda: weather_measures.historical_weather_measures(historical=True, **dates)
+    else:
+        weather = lambda: weather_measures.forecast_weather_measures(forecast_length=forecast_length)
+
+    frames, timings = fetch_sources({
+        'electricity': lambda: electricity_prices.electricity_prices(historical=historical, area=area, **dates),
+        'renewable_energy': lambda: electricity_prices.forecast_renewable_energy(historical=historical, area=area, **dates),
+        'weather': weather,
+        'calendar': calendar.get_calendar,
+    }, timeouts=timeouts)
+
+    merge_start = time.perf_counter()
+    features = merge_features(frames)
+    timings['merge'] = time.perf_counter() - merge_start
+    timings['total'] = time.perf_counter() - total_start
+
+    return features, timings
@@ -0,0 +1,62 @@
+from datetime import date, timedelta
+
+
+# Number of past days of observed weather measures that are fetched again, as the archive fills in with a delay
+OBSERVED_DAYS = 7
+
+
+def run(forecast_length: int = 5, wait_for_job: bool = False, store=None, archive=None) -> dict:
+    """
+    Runs the daily feature pipeline: fetches today's electricity prices and renewable energy forecasts, the observed weather of the last days and the weather forecast and ingests them into the feature groups.
+
+    Only new and changed rows are written. Forecasts go to 'weather_forecasts' with the day they were made in 'forecast_date', observed weather measures go to 'weather_measurements'.
+    The prices of DK1 and DK2 and the settled weather measures are also appended to the history archive.
+
+    Parameters:
+    - forecast_length (int): Length of the weather forecast in days. Default is 5 days.
+    - wait_for_job (bool): If True, waits for the insert jobs to finish. Default is False.
+    - store (FeatureStore): Feature store to insert into. Default is the store of the configured backend.
+    - archive (HistoryArchive): History archive to append to. Default is the archive in data/archive.
+
+    Returns:
+    - dict: Number of rows inserted, updated and skipped per feature group and appended per archive dataset in 'history_archive'.
+    """
+
+    from features import electricity_prices, weather_measures
+    from pipelines.concurrent_fetch import fetch_sources
+    from pipelines.feature_store import get_feature_store
+    from pipelines.history_archive import get_archive
+    from pipelines.ingestion import ingest
+
+    today = date.today()
+    observed_start = (today - timedelta(days=OBSERVED_DAYS)).strftime("%Y-%m-%d")
+    observed_end = (today - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    # Fetching non-historical electricity prices for areas DK1 and DK2, the renewable energy forecasts of DK1, the observed weather and the weather forecast concurrently
+    frames, _ = fetch_sources({
+        'electricity': lambda: electricity_prices.electricity_prices(historical=False, area=["DK1", "DK2"]),
+        'renewable_energy': lambda: electricity_prices.forecast_renewable_energy(historical=False, area=["DK1"]),
+        'weather': lambda: weather_measures.historical_weather_measures(historical=True, start=observed_start, end=observed_end),
+        'weather_forecast': lambda: weather_measures.forecast_weather_measures(forecast_length=forecast_length),
+    })
+
+    # Mark every forecast with the day it was made
+    weather_forecast_df = frames['weather_forecast'].assign(forecast_date=today.strftime("%Y-%m-%d"))
+
+    # Appending the new hours to the history archive, the weather of the last days is appended once it is settled
+    archive = archive or get_archive()
+    archived = {
+        'electricity_prices': archive.append('electricity_prices', frames['electricity']),
+        'weather_measurements': archive.append('weather_measurements', frames['weather']),
+        'renewable_energy_forecasts': archive.append('renewable_energy_forecasts', frames['renewable_energy']),
+    }
+
+    # Ingesting only the new and changed rows into the feature groups, the feature group keeps the DK1 prices only
+    store = store or get_feature_store()
+    return {
+        'electricity_prices': ingest(store, 'electricity_prices', frames['electricity'].drop(columns=['dk2_spotpricedkk_kwh']), wait_for_job=wait_for_job),
+        'weather_measurements': ingest(store, 'weather_measurements', frames['weather'], wait_for_job=wait_for_job),
+        'renewable_energy_forecasts': ingest(store, 'renewable_energy_forecasts', frames['renewable_energy'], wait_for_job=wait_for_job),
+        'weather_forecasts': ingest(store, 'weather_forecasts', weather_forecast_df, ignore=['forecast_date'], wait_for_job=wait_for_job),
+        'history_archive': archived,
+    }
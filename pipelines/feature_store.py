@@ -0,0 +1,441 @@
+import json
+import os
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+import pandas as pd
+from features.instrumentation import instrument
+
+
+# Backend used by the pipelines, 'hopsworks' or 'local', can be overridden with an environment variable
+FEATURE_STORE_BACKEND = os.environ.get('FEATURE_STORE_BACKEND', 'hopsworks')
+
+# Location of the local feature store
+LOCAL_STORE_DIR = Path(os.environ.get('FEATURE_STORE_DIR', Path(__file__).resolve().parent.parent / 'data' / 'feature_store'))
+
+# Definitions of the feature groups, shared by all backends
+FEATURE_GROUPS = {
+    'electricity_prices': {
+        'description': "Electricity prices from Energidata API",
+        'primary_key': ["date", "timestamp"],
+        'event_time': "timestamp",
+    },
+    'weather_measurements': {
+        'description': "Weather measurements from Open Meteo API",
+        'primary_key': ["date", "timestamp"],
+        'event_time': "timestamp",
+    },
+    'renewable_energy_forecasts': {
+        'description': "Intraday forecasts of solar, onshore and offshore wind energy from Energidata API",
+        'primary_key': ["date", "timestamp"],
+        'event_time': "timestamp",
+    },
+    # Forecasts are kept apart from the observed measurements, 'forecast_date' is the day the stored forecast was made
+    'weather_forecasts': {
+        'description': "Weather forecasts from Open Meteo API",
+        'primary_key': ["date", "timestamp"],
+        'event_time': "timestamp",
+    },
+    'dk_calendar': {
+        'description': "Danish calendar",
+        'primary_key': ["date"],
+        'event_time': None,
+    },
+}
+
+# Feature groups of the training data as (name, columns left out), the first one holds the label
+TRAINING_GROUPS = [
+    ('electricity_prices', []),
+    ('weather_measurements', ["timestamp", "datetime", "hour"]),
+    ('renewable_energy_forecasts', ["timestamp", "datetime", "hour"]),
+    ('dk_calendar', []),
+]
+TRAINING_FEATURE_VIEW = 'dk1_electricity_training_feature_view'
+
+# Version 1 of the feature view was created without the renewable energy forecasts
+TRAINING_FEATURE_VIEW_VERSION = 2
+
+
+def stored_types(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Casts the compact dtypes of the fetchers back to the types the Hopsworks feature groups were created with.
+
+    The version 1 feature groups store dates as strings, integers as bigint and floats as double, and an insert
+    with other types is rejected by the schema check of the feature group.
+
+    Parameters:
+    - df (pd.DataFrame): Rows with the dtypes of features.schema.
+
+    Returns:
+    - pd.DataFrame: Rows with string dates, int64 integers and float64 floats.
+    """
+
+    dtypes = {}
+    for column, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtypes[column] = str
+        elif pd.api.types.is_float_dtype(dtype):
+            dtypes[column] = 'float64'
+        elif pd.api.types.is_integer_dtype(dtype):
+            dtypes[column] = 'int64'
+
+    return df.astype(dtypes)
+
+
+class FeatureStore(ABC):
+    """
+    Interface of a feature store backend: feature groups with primary keys and an optional event time.
+    """
+
+    @abstractmethod
+    def create_feature_group(self, name: str, version: int = 1) -> None:
+        """
+        Creates a feature group from its definition in FEATURE_GROUPS if it does not exist yet.
+
+        Parameters:
+        - name (str): Name of the feature group.
+        - version (int): Version of the feature group. Default is 1.
+        """
+
+    @abstractmethod
+    def is_empty(self, name: str, version: int = 1) -> bool:
+        """
+        Tells if a feature group is new or has no rows yet.
+
+        Parameters:
+        - name (str): Name of the feature group.
+        - version (int): Version of the feature group. Default is 1.
+
+        Returns:
+        - bool: True when the feature group has nothing to read.
+        """
+
+    @abstractmethod
+    def update_feature_descriptions(self, name: str, feature_descriptions: list, version: int = 1) -> None:
+        """
+        Updates the descriptions of the features of a feature group.
+
+        Parameters:
+        - name (str): Name of the feature group.
+        - feature_descriptions (list): Dictionaries with the 'name' and 'description' of the features.
+        - version (int): Version of the feature group. Default is 1.
+        """
+
+    @abstractmethod
+    def insert(self, name: str, df: pd.DataFrame, version: int = 1, wait_for_job: bool = False) -> int:
+        """
+        Inserts rows into a feature group, rows with an existing primary key replace the stored rows.
+
+        Parameters:
+        - name (str): Name of the feature group.
+        - df (pd.DataFrame): Rows to insert.
+        - version (int): Version of the feature group. Default is 1.
+        - wait_for_job (bool): If True, waits until the rows are written. Default is False.
+
+        Returns:
+        - int: Number of rows inserted.
+        """
+
+    @abstractmethod
+    def read(self, name: str, version: int = 1, columns: list = None, start: str = None, end: str = None) -> pd.DataFrame:
+        """
+        Reads a feature group from the offline store.
+
+        Parameters:
+        - name (str): Name of the feature group.
+        - version (int): Version of the feature group. Default is 1.
+        - columns (list): Columns to read. Default is all columns.
+        - start (str): First date to read in 'YYYY-MM-DD' format. Default is the first stored date.
+        - end (str): Last date to read in 'YYYY-MM-DD' format. Default is the last stored date.
+
+        Returns:
+        - pd.DataFrame: The stored rows.
+        """
+
+    @abstractmethod
+    def read_online(self, name: str, keys: pd.DataFrame, version: int = 1) -> pd.DataFrame:
+        """
+        Reads the latest rows of the given primary keys.
+
+        Parameters:
+        - name (str): Name of the feature group.
+        - keys (pd.DataFrame): DataFrame with the primary key columns of the rows to read.
+        - version (int): Version of the feature group. Default is 1.
+
+        Returns:
+        - pd.DataFrame: The stored rows of the keys that exist.
+        """
+
+    @abstractmethod
+    def training_data(self, groups: list = TRAINING_GROUPS, version: int = 1) -> pd.DataFrame:
+        """
+        Joins the feature groups point-in-time into the training data.
+
+        Every next group is joined on the primary key columns it shares with the first group. Groups with
+        an event time contribute their latest row at or before the event time of the first group.
+
+        Parameters:
+        - groups (list): Feature groups as (name, columns left out), the first one holds the label. Default is TRAINING_GROUPS.
+        - version (int): Version of the feature groups. Default is 1.
+
+        Returns:
+        - pd.DataFrame: The joined training data.
+        """
+
+
+class HopsworksFeatureStore(FeatureStore):
+    """
+    Feature store backed by the Hopsworks Feature Store.
+    """
+
+    def __init__(self, project=None):
+        import hopsworks
+
+        # Logging into the Hopsworks project once and getting the feature store
+        self.project = project or hopsworks.login()
+        self.fs = self.project.get_feature_store()
+
+        # Feature group objects per (name, version). A new feature group is only saved by its first insert,
+        # so the object returned by get_or_create_feature_group is kept and used for every later call
+        self._groups = {}
+
+    def _group(self, name: str, version: int):
+        if (name, version) not in self._groups:
+            self._groups[(name, version)] = self.fs.get_feature_group(name=name, version=version)
+        return self._groups[(name, version)]
+
+    def create_feature_group(self, name: str, version: int = 1) -> None:
+        definition = FEATURE_GROUPS[name]
+        options = {'event_time': definition['event_time']} if definition['event_time'] else {}
+
+        self._groups[(name, version)] = self.fs.get_or_create_feature_group(
+            name=name,
+            version=version,
+            description=definition['description'],
+            primary_key=definition['primary_key'],
+            online_enabled=True,
+            **options,
+        )
+
+    def is_empty(self, name: str, version: int = 1) -> bool:
+        # A feature group created by get_or_create_feature_group has no id until its first insert saves it
+        fg = self._group(name, version)
+        return fg is None or fg.id is None
+
+    def update_feature_descriptions(self, name: str, feature_descriptions: list, version: int = 1) -> None:
+        fg = self._group(name, version)
+        for desc in feature_descriptions:
+            fg.update_feature_description(desc["name"], desc["description"])
+
+    @instrument()
+    def insert(self, name: str, df: pd.DataFrame, version: int = 1, wait_for_job: bool = False) -> int:
+        fg = self._group(name, version)
+        fg.insert(stored_types(df), write_options={"wait_for_job": wait_for_job})
+
+        return len(df)
+
+    def read(self, name: str, version: int = 1, columns: list = None, start: str = None, end: str = None) -> pd.DataFrame:
+        fg = self._group(name, version)
+        query = fg.select(columns) if columns else fg.select_all()
+
+        if start is not None:
+            query = query.filter(fg.date >= start)
+        if end is not None:
+            query = query.filter(fg.date <= end)
+
+        return query.read()
+
+    def read_online(self, name: str, keys: pd.DataFrame, version: int = 1) -> pd.DataFrame:
+        fg = self._group(name, version)
+        primary_key = FEATURE_GROUPS[name]['primary_key']
+        keys = stored_types(keys[primary_key])
+
+        # Only the rows with the requested key values are looked up, the join keeps the exact key combinations
+        query = fg.select_all()
+        for column in primary_key:
+            query = query.filter(fg.get_feature(column).isin(keys[column].unique().tolist()))
+
+        return query.read(online=True).merge(keys, how='inner')
+
+    @instrument()
+    def training_data(self, groups: list = TRAINING_GROUPS, version: int = 1) -> pd.DataFrame:
+        # Select features for training data and join them together and except duplicate columns
+        (name, excluded), *others = groups
+        query = self._group(name, version).select_except(excluded)
+        for name, excluded in others:
+            query = query.join(self._group(name, version).select_except(excluded), join_type="inner")
+
+        feature_view = self.fs.get_or_create_feature_view(
+            name=TRAINING_FEATURE_VIEW,
+            version=TRAINING_FEATURE_VIEW_VERSION,
+            query=query,
+        )
+
+        X, _ = feature_view.training_data(description='Electricity Prices Training Dataset')
+        return X
+
+
+class LocalFeatureStore(FeatureStore):
+    """
+    Feature store in local Parquet files partitioned by month, joined with DuckDB.
+
+    Every feature group is a folder '<name>_<version>' with a 'metadata.json' and one
+    'month=YYYY-MM/data.parquet' file per month of the 'date' column.
+    """
+
+    def __init__(self, directory: Path = LOCAL_STORE_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _path(self, name: str, version: int) -> Path:
+        return self.directory / f'{name}_{version}'
+
+    def _files(self, name: str, version: int, start: str = None, end: str = None) -> list:
+        # Partition files of a feature group, only the months between the start and end dates are listed
+        files = sorted(self._path(name, version).glob('month=*/data.parquet'))
+        if not files:
+            raise ValueError(f"Feature group '{name}' version {version} has no data in {self.directory}")
+
+        months = [path.parent.name[len('month='):] for path in files]
+        return [str(path) for path, month in zip(files, months) if (start is None or month >= start[:7]) and (end is None or month <= end[:7])]
+
+    def _metadata(self, name: str, version: int) -> dict:
+        path = self._path(name, version) / 'metadata.json'
+        if path.exists():
+            return json.loads(path.read_text())
+        return {'name': name, 'version': version, **FEATURE_GROUPS[name], 'features': []}
+
+    def _query(self, sql: str, params: list = None) -> pd.DataFrame:
+        import duckdb
+
+        # A new in-memory connection per query, so threads do not share a connection
+        with duckdb.connect() as con:
+            return con.execute(sql, params or []).df()
+
+    def create_feature_group(self, name: str, version: int = 1) -> None:
+        path = self._path(name, version)
+        if not (path / 'metadata.json').exists():
+            path.mkdir(parents=True, exist_ok=True)
+            (path / 'metadata.json').write_text(json.dumps(self._metadata(name, version), indent=2))
+
+    def is_empty(self, name: str, version: int = 1) -> bool:
+        return not any(self._path(name, version).glob('month=*/data.parquet'))
+
+    def update_feature_descriptions(self, name: str, feature_descriptions: list, version: int = 1) -> None:
+        self.create_feature_group(name, version)
+        metadata = self._metadata(name, version)
+        metadata['features'] = feature_descriptions
+        (self._path(name, version) / 'metadata.json').write_text(json.dumps(metadata, indent=2))
+
+    @instrument()
+    def insert(self, name: str, df: pd.DataFrame, version: int = 1, wait_for_job: bool = False) -> int:
+        self.create_feature_group(name, version)
+        primary_key = self._metadata(name, version)['primary_key']
+
+        # Rewrite every month that gets new rows, the new rows replace stored rows with the same primary key
+        months = df['date'].astype(str).str[:7]
+        with self._lock:
+            for month, rows in df.groupby(months.values, sort=True):
+                path = self._path(name, version) / f'month={month}' / 'data.parquet'
+                if path.exists():
+                    rows = pd.concat([pd.read_parquet(path), rows.astype({'date': str})], ignore_index=True)
+                rows = rows.astype({'date': str}).drop_duplicates(primary_key, keep='last').sort_values(primary_key)
+                _write(path, rows.reset_index(drop=True))
+
+        return len(df)
+
+    def read(self, name: str, version: int = 1, columns: list = None, start: str = None, end: str = None) -> pd.DataFrame:
+        select = ', '.join(f'"{column}"' for column in columns) if columns else '*'
+        primary_key = ', '.join(f'"{column}"' for column in self._metadata(name, version)['primary_key'])
+
+        # A feature group without data reads as an empty DataFrame
+        if self.is_empty(name, version):
+            return pd.DataFrame(columns=columns or [])
+
+        # Only the months of the date range are scanned and the date filter is pushed down into the Parquet scan
+        files = self._files(name, version, start, end)
+        if not files:
+            return pd.DataFrame(columns=columns or self._columns(name, version, []))
+
+        return self._query(
+            f"SELECT {select} FROM read_parquet(?, hive_partitioning = false) WHERE date >= ? AND date <= ? ORDER BY {primary_key}",
+            [files, start or '0000-00-00', end or '9999-99-99'],
+        )
+
+    def read_online(self, name: str, keys: pd.DataFrame, version: int = 1) -> pd.DataFrame:
+        import duckdb
+
+        primary_key = self._metadata(name, version)['primary_key']
+        on = ' AND '.join(f'f."{column}" = k."{column}"' for column in primary_key)
+        keys = keys[primary_key].astype({'date': str})
+
+        with duckdb.connect() as con:
+            con.register('keys', keys)
+            return con.execute(f"SELECT f.* FROM read_parquet(?, hive_partitioning = false) f SEMI JOIN keys k ON {on}", [self._files(name, version)]).df()
+
+    @instrument()
+    def training_data(self, groups: list = TRAINING_GROUPS, version: int = 1) -> pd.DataFrame:
+        (name, excluded), *others = groups
+        label = self._metadata(name, version)
+        columns = self._columns(name, version, excluded)
+
+        select = [f'g0."{column}"' for column in columns]
+        joins = ["read_parquet(?, hive_partitioning = false) g0"]
+        files = [self._files(name, version)]
+
+        for i, (name, excluded) in enumerate(others, start=1):
+            metadata = self._metadata(name, version)
+
+            # Join on the shared primary key columns, the event time becomes the point-in-time condition
+            keys = [column for column in metadata['primary_key'] if column in label['primary_key'] and column != metadata['event_time']]
+            conditions = [f'g0."{column}" = g{i}."{column}"' for column in keys]
+            if metadata['event_time'] and label['event_time']:
+                conditions.append(f'g0."{label["event_time"]}" >= g{i}."{metadata["event_time"]}"')
+                join = 'ASOF JOIN'
+            else:
+                join = 'JOIN'
+            joins.append(f"{join} read_parquet(?, hive_partitioning = false) g{i} ON {' AND '.join(conditions)}")
+            files.append(self._files(name, version))
+
+            # Columns that are already selected are not repeated
+            new_columns = [column for column in self._columns(name, version, excluded) if column not in columns]
+            select += [f'g{i}."{column}"' for column in new_columns]
+            columns += new_columns
+
+        order = ', '.join(f'g0."{column}"' for column in label['primary_key'])
+        return self._query(f"SELECT {', '.join(select)} FROM {' '.join(joins)} ORDER BY {order}", files)
+
+    def _columns(self, name: str, version: int, excluded: list) -> list:
+        # Column names from the Parquet schema, without reading any rows
+        schema = self._query("DESCRIBE SELECT * FROM read_parquet(?, hive_partitioning = false)", [self._files(name, version)])
+        return [column for column in schema['column_name'] if column not in excluded]
+
+
+def _write(path: Path, df: pd.DataFrame) -> None:
+    # Write to a temporary file first so concurrent readers never see a partial file
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f'.{os.getpid()}.{threading.get_ident()}.tmp')
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def get_feature_store(backend: str = None, **kwargs) -> FeatureStore:
+    """
+    Returns a feature store of the given backend.
+
+    Parameters:
+    - backend (str): 'hopsworks' or 'local'. Default is FEATURE_STORE_BACKEND.
+    - **kwargs: Arguments of the backend, 'project' for Hopsworks and 'directory' for the local store.
+
+    Returns:
+    - FeatureStore: The feature store.
+    """
+
+    backend = backend or FEATURE_STORE_BACKEND
+
+    if backend == 'hopsworks':
+        return HopsworksFeatureStore(**kwargs)
+    if backend == 'local':
+        return LocalFeatureStore(**kwargs)
+
+    raise ValueError(f"Unknown feature store backend '{backend}', must be 'hopsworks' or 'local'")
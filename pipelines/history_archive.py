@@ -0,0 +1,302 @@
+import json
+import os
+import threading
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from features.instrumentation import instrument
+
+
+# Location of the archive, can be overridden with an environment variable. The archive is committed to the
+# repository like the predictions, so the daily workflow keeps its appends and the app can read the history
+ARCHIVE_DIR = Path(os.environ.get('HISTORY_ARCHIVE_DIR', Path(__file__).resolve().parent.parent / 'data' / 'archive'))
+
+# The parts of a month are merged into one file when the month has more parts than this
+MAX_PARTS_PER_MONTH = 8
+
+# Datasets of the archive, both keep one row per hour with a 'timestamp' column in milliseconds
+DATASETS = {
+    'electricity_prices': "Hourly spot prices of DK1 and DK2 from Energidata API",
+    'weather_measurements': "Hourly weather measurements from Open Meteo API",
+    'renewable_energy_forecasts': "Hourly intraday forecasts of solar, onshore and offshore wind energy of DK1 from Energidata API",
+}
+
+# Days before today that a dataset may still be revised, the weather archive of Open Meteo fills in with a delay.
+# The feature pipeline fetches 7 past days, so the oldest of them is settled when it is appended.
+SETTLE_DAYS = {'weather_measurements': 6}
+
+
+def _bounds(start=None, end=None) -> tuple:
+    # Timestamps in milliseconds of a range, dates include their whole day and timestamps are inclusive
+    low = -2 ** 63 if start is None else int(start) if not isinstance(start, str) else pd.Timestamp(start).value // 1_000_000
+    if end is None:
+        high = 2 ** 63 - 1
+    elif isinstance(end, str):
+        high = (pd.Timestamp(end) + pd.Timedelta(days=1)).value // 1_000_000 - 1
+    else:
+        high = int(end)
+
+    return low, high
+
+
+class HistoryArchive:
+    """
+    Append-only archive of hourly history in uncompressed Arrow IPC files, partitioned by month.
+
+    Every append writes new part files and a file index with the first and last timestamp of every
+    part, so reads open only the parts of the requested range. The parts are memory mapped and sorted
+    by timestamp, the requested hours and columns are zero-copy slices of the mapped files.
+    """
+
+    def __init__(self, directory: Path = ARCHIVE_DIR):
+        self.directory = Path(directory)
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> Path:
+        return self.directory / name
+
+    def _index(self, name: str) -> dict:
+        # The index lists the parts of a dataset, parts that are not in the index are never read
+        path = self._path(name) / 'index.json'
+        if not path.exists():
+            return {'name': name, 'description': DATASETS.get(name), 'columns': None, 'last_timestamp': None, 'next_part': 0, 'parts': []}
+        return json.loads(path.read_text())
+
+    def _write_index(self, name: str, index: dict) -> None:
+        # Replace the index in one step, so readers see the parts before or after an append
+        path = self._path(name) / 'index.json'
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_text(json.dumps(index, indent=2))
+        os.replace(tmp_path, path)
+
+    def _write_part(self, name: str, index: dict, month: str, table: pa.Table) -> dict:
+        # One record batch per file, written uncompressed so it can be memory mapped
+        relative = f"month={month}/part-{index['next_part']:06d}.arrow"
+        index['next_part'] += 1
+        path = self._path(name) / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        with pa.OSFile(str(tmp_path), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table.combine_chunks())
+        os.replace(tmp_path, path)
+
+        timestamps = table.column('timestamp')
+        return {
+            'path': relative,
+            'month': month,
+            'rows': len(table),
+            'min_timestamp': int(timestamps[0].as_py()),
+            'max_timestamp': int(timestamps[-1].as_py()),
+        }
+
+    def last_timestamp(self, name: str) -> int:
+        """
+        Returns the last archived hour of a dataset.
+
+        Parameters:
+        - name (str): Name of the dataset, e.g. 'electricity_prices'.
+
+        Returns:
+        - int: Timestamp in milliseconds of the last archived hour, or None if the dataset is empty.
+        """
+
+        return self._index(name)['last_timestamp']
+
+    @instrument('history_archive.append')
+    def append(self, name: str, df: pd.DataFrame) -> int:
+        """
+        Appends the hours after the last archived hour, earlier hours are already archived and skipped.
+        Hours of the days that may still be revised (SETTLE_DAYS) are left for a later append.
+
+        Parameters:
+        - name (str): Name of the dataset, e.g. 'electricity_prices'.
+        - df (pd.DataFrame): Hourly rows with a 'timestamp' column in milliseconds and a 'date' column.
+
+        Returns:
+        - int: Number of appended rows.
+        """
+
+        with self._lock:
+            index = self._index(name)
+
+            # Only the hours after the archive are appended, sorted by time
+            if index['last_timestamp'] is not None:
+                df = df[df['timestamp'] > index['last_timestamp']]
+            if name in SETTLE_DAYS:
+                df = df[df['date'].astype(str) < (date.today() - timedelta(days=SETTLE_DAYS[name])).strftime('%Y-%m-%d')]
+            df = df.sort_values('timestamp').drop_duplicates('timestamp', keep='last')
+            if df.empty:
+                return 0
+
+            # Every part of a dataset has the columns and types of the first one
+            if index['columns'] is None:
+                index['columns'] = list(df.columns)
+            elif sorted(df.columns) != sorted(index['columns']):
+                raise ValueError(f"Columns of '{name}' do not match the archive, expected {index['columns']}, got {list(df.columns)}")
+            table = pa.Table.from_pandas(df[index['columns']].astype({'date': str}), preserve_index=False)
+            if index['parts']:
+                table = table.cast(self._schema(name, index))
+
+            # One new part per month of the new hours
+            months = df['date'].astype(str).str[:7].values
+            for month in sorted(set(months)):
+                positions = np.flatnonzero(months == month)
+                index['parts'].append(self._write_part(name, index, month, table.slice(positions[0], len(positions))))
+
+            index['last_timestamp'] = int(df['timestamp'].iloc[-1])
+            self._write_index(name, index)
+
+            # Merge the parts of the months with many small parts, e.g. after daily appends
+            for month in sorted(set(months)):
+                if sum(part['month'] == month for part in index['parts']) > MAX_PARTS_PER_MONTH:
+                    self._compact_month(name, index, month)
+
+        return len(df)
+
+    def _schema(self, name: str, index: dict) -> pa.Schema:
+        # Schema of the first part, read from the file footer without reading any rows
+        with pa.memory_map(str(self._path(name) / index['parts'][0]['path'])) as source:
+            return pa.ipc.open_file(source).schema
+
+    def _compact_month(self, name: str, index: dict, month: str) -> None:
+        # Write the rows of all parts of the month as one part, then drop the old parts from the index and the disk
+        parts = [part for part in index['parts'] if part['month'] == month]
+        table = pa.concat_tables([self._read_part(name, part) for part in parts])
+
+        index['parts'] = [part for part in index['parts'] if part['month'] != month] + [self._write_part(name, index, month, table)]
+        index['parts'].sort(key=lambda part: part['min_timestamp'])
+        self._write_index(name, index)
+
+        for part in parts:
+            (self._path(name) / part['path']).unlink(missing_ok=True)
+
+    def compact(self, name: str) -> None:
+        """
+        Merges the parts of every month of a dataset into one part per month.
+
+        Parameters:
+        - name (str): Name of the dataset.
+        """
+
+        with self._lock:
+            index = self._index(name)
+            for month in sorted({part['month'] for part in index['parts']}):
+                if sum(part['month'] == month for part in index['parts']) > 1:
+                    self._compact_month(name, index, month)
+
+    def _read_part(self, name: str, part: dict) -> pa.Table:
+        # Memory map the file, the table references the mapped pages instead of copying them.
+        # Closing the file is safe, the pages stay mapped until the table is released
+        with pa.memory_map(str(self._path(name) / part['path'])) as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def read_table(self, name: str, columns: list = None, start=None, end=None) -> pa.Table:
+        """
+        Reads the hours of a time range and the requested columns as a zero-copy Arrow table.
+
+        Only the parts that overlap the range are opened, and within a part the hours are found by a
+        binary search on the sorted timestamps.
+
+        Parameters:
+        - name (str): Name of the dataset.
+        - columns (list): Columns to read. Default is all columns.
+        - start: First hour as 'YYYY-MM-DD' date or timestamp in milliseconds. Default is the first archived hour.
+        - end: Last hour as 'YYYY-MM-DD' date (the whole day) or timestamp in milliseconds. Default is the last archived hour.
+
+        Returns:
+        - pa.Table: The hours of the range sorted by time.
+        """
+
+        index = self._index(name)
+        low, high = _bounds(start, end)
+
+        # The file index prunes the parts outside the range without opening them
+        tables = []
+        for part in index['parts']:
+            if part['max_timestamp'] < low or part['min_timestamp'] > high:
+                continue
+
+            table = self._read_part(name, part)
+
+            # The timestamps of a part are sorted, so the range is one slice of it
+            if part['min_timestamp'] < low or part['max_timestamp'] > high:
+                timestamps = table.column('timestamp').to_numpy()
+                first = np.searchsorted(timestamps, low, side='left')
+                last = np.searchsorted(timestamps, high, side='right')
+                table = table.slice(first, last - first)
+
+            tables.append(table.select(columns) if columns is not None else table)
+
+        # An empty dataset has no schema yet, an empty range keeps the schema of the dataset
+        if not index['parts']:
+            return pa.table({column: [] for column in columns or []})
+        if not tables:
+            schema = self._schema(name, index)
+            return schema.empty_table().select(columns) if columns is not None else schema.empty_table()
+
+        return pa.concat_tables(tables)
+
+    def read(self, name: str, columns: list = None, start=None, end=None) -> pd.DataFrame:
+        """
+        Reads the hours of a time range and the requested columns as a DataFrame.
+
+        Parameters:
+        - name (str): Name of the dataset.
+        - columns (list): Columns to read. Default is all columns.
+        - start: First hour as 'YYYY-MM-DD' date or timestamp in milliseconds. Default is the first archived hour.
+        - end: Last hour as 'YYYY-MM-DD' date (the whole day) or timestamp in milliseconds. Default is the last archived hour.
+
+        Returns:
+        - pd.DataFrame: The hours of the range sorted by time.
+        """
+
+        return self.read_table(name, columns, start, end).to_pandas()
+
+
+def get_archive() -> HistoryArchive:
+    """
+    Returns the history archive in ARCHIVE_DIR.
+
+    Returns:
+    - HistoryArchive: The archive.
+    """
+
+    return HistoryArchive(ARCHIVE_DIR)
+
+
+@instrument('history_archive.training_data')
+def training_data(archive: HistoryArchive = None, start=None, end=None, target: str = 'dk1_spotpricedkk_kwh') -> pd.DataFrame:
+    """
+    Builds the training data from the archive with the same columns as the training feature view.
+
+    Parameters:
+    - archive (HistoryArchive): The archive. Default is get_archive().
+    - start: First hour as 'YYYY-MM-DD' date or timestamp in milliseconds. Default is the first archived hour.
+    - end: Last hour as 'YYYY-MM-DD' date or timestamp in milliseconds. Default is the last archived hour.
+    - target (str): Price column of the training data. Default is 'dk1_spotpricedkk_kwh'.
+
+    Returns:
+    - pd.DataFrame: Prices, weather measures, renewable energy forecasts and calendar features per hour.
+    """
+
+    from features import calendar
+
+    archive = archive or get_archive()
+    empty = [name for name in DATASETS if archive.last_timestamp(name) is None]
+    if empty:
+        raise ValueError(f"The history archive in {archive.directory} has no {', '.join(empty)}, run the backfill first")
+
+    # Only the target price is read from the price files
+    df = archive.read('electricity_prices', ['timestamp', 'datetime', 'date', 'hour', target], start, end)
+
+    # The last row of the same day at or before every hour, like the point-in-time join of the feature view
+    for name in ['weather_measurements', 'renewable_energy_forecasts']:
+        rows = archive.read(name, None, start, end).drop(columns=['datetime', 'hour'])
+        df = pd.merge_asof(df, rows.rename(columns={'timestamp': 'joined_timestamp'}), left_on='timestamp', right_on='joined_timestamp', by='date', direction='backward')
+        df = df.dropna(subset=['joined_timestamp']).drop(columns='joined_timestamp')
+
+    # Adding the danish calendar features by looking up the dates
+    return calendar.join_calendar(df.reset_index(drop=True))
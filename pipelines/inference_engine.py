@@ -0,0 +1,119 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+
+
+# File names of the native booster and its schema in the model directory
+BOOSTER_FILE = "dk_electricity_model.ubj"
+SCHEMA_FILE = "model_schema.json"
+
+
+def export_model(model, model_dir: str, booster_file: str = BOOSTER_FILE) -> str:
+    """
+    Saves the booster of a trained model in XGBoost's native format together with its feature order.
+
+    Parameters:
+    - model: The trained XGBoost Regressor model.
+    - model_dir (str): Directory where the model is exported.
+    - booster_file (str): File name of the booster, '.ubj' for binary or '.json' for text. Default is BOOSTER_FILE.
+
+    Returns:
+    - str: Path of the saved booster.
+    """
+
+    booster = model.get_booster()
+    path = os.path.join(model_dir, booster_file)
+
+    os.makedirs(model_dir, exist_ok=True)
+    booster.save_model(path)
+
+    # The schema fixes the order of the feature columns of the input arrays
+    schema = {'booster': booster_file, 'features': list(booster.feature_names), 'dtype': 'float32'}
+    with open(os.path.join(model_dir, SCHEMA_FILE), 'w') as file:
+        json.dump(schema, file, indent=2)
+
+    return path
+
+
+class InferenceEngine:
+    """
+    Predicts with an XGBoost booster directly on contiguous float32 arrays in the feature order of the model.
+    """
+
+    def __init__(self, booster, feature_names: list, nthread: int = 1):
+        self.booster = booster
+        self.feature_names = list(feature_names)
+        self.nthread = nthread
+
+        # Threads used by inplace_predict
+        self.booster.set_param({'nthread': nthread})
+
+    @classmethod
+    def load(cls, model_dir: str, nthread: int = 1) -> 'InferenceEngine':
+        """
+        Loads the booster and its feature order from a model directory written by export_model.
+
+        Parameters:
+        - model_dir (str): Directory with the booster and its schema.
+        - nthread (int): Number of threads used for predictions. Default is 1.
+
+        Returns:
+        - InferenceEngine: The engine.
+        """
+
+        import xgboost as xgb
+
+        with open(os.path.join(model_dir, SCHEMA_FILE)) as file:
+            schema = json.load(file)
+
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(model_dir, schema['booster']))
+
+        return cls(booster, schema['features'], nthread)
+
+    @classmethod
+    def from_model(cls, model, nthread: int = 1) -> 'InferenceEngine':
+        """
+        Wraps the booster of a trained XGBoost Regressor model, e.g. one loaded with joblib.
+
+        Parameters:
+        - model: The trained XGBoost Regressor model.
+        - nthread (int): Number of threads used for predictions. Default is 1.
+
+        Returns:
+        - InferenceEngine: The engine.
+        """
+
+        booster = model.get_booster()
+        return cls(booster, booster.feature_names, nthread)
+
+    def to_array(self, df: pd.DataFrame) -> np.ndarray:
+        """
+        Selects the features of the model from a DataFrame as a contiguous float32 array.
+
+        Parameters:
+        - df (pd.DataFrame): DataFrame with at least the features of the model.
+
+        Returns:
+        - np.ndarray: Array of shape (rows, features) in the feature order of the model.
+        """
+
+        return np.ascontiguousarray(df[self.feature_names].to_numpy(dtype=np.float32))
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predicts an array of features without converting it to a DMatrix.
+
+        Parameters:
+        - X (np.ndarray): Array of shape (rows, features) in the feature order of the model, NaN for missing values.
+
+        Returns:
+        - np.ndarray: The predictions as float32 array.
+        """
+
+        if X.ndim != 2 or X.shape[1] != len(self.feature_names):
+            raise ValueError(f"Expected an array with {len(self.feature_names)} feature columns, got shape {X.shape}")
+
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        return self.booster.inplace_predict(X, validate_features=False).astype(np.float32)
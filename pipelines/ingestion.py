@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from features.instrumentation import instrument, count
+
+
+def delta(stored: pd.DataFrame, new: pd.DataFrame, primary_key: list, ignore: list = None) -> tuple:
+    """
+    Compares new rows with the stored rows of the same primary keys.
+
+    Float values are compared with a small tolerance, as the stored values may have been cast to
+    float32, and missing values are equal to each other. The 'datetime' column is not compared when the
+    int64 'timestamp' is part of the primary key, as it holds the same hour and may come back tz-aware.
+
+    Parameters:
+    - stored (pd.DataFrame): Rows already in the feature group.
+    - new (pd.DataFrame): Rows to ingest.
+    - primary_key (list): Primary key columns.
+    - ignore (list): Columns that do not count as a change, e.g. 'forecast_date'. Default is none.
+
+    Returns:
+    - tuple: DataFrame with the new and changed rows and a dictionary with the number of rows 'inserted', 'updated' and 'skipped'.
+    """
+
+    new = new.drop_duplicates(primary_key, keep='last').reset_index(drop=True)
+    if stored.empty:
+        return new, {'inserted': len(new), 'updated': 0, 'skipped': 0}
+
+    # Line up the stored values with the new rows on the primary key, the keys are compared as strings
+    keys = [new[column].astype(str) for column in primary_key]
+    stored_keys = [stored[column].astype(str) for column in primary_key]
+    stored = stored.set_index(stored_keys).loc[lambda df: ~df.index.duplicated(keep='last')]
+    positions = stored.index.get_indexer(pd.MultiIndex.from_arrays(keys) if len(keys) > 1 else keys[0])
+    exists = positions >= 0
+
+    # A row is changed when any value column differs from the stored value
+    changed = np.zeros(len(new), dtype=bool)
+    ignore = list(ignore or []) + (['datetime'] if 'timestamp' in primary_key else [])
+    columns = [column for column in new.columns if column not in primary_key and column not in ignore]
+    for column in columns:
+        if column not in stored.columns:
+            changed |= exists
+            continue
+
+        values = new[column].values
+        stored_values = stored[column].values[np.where(exists, positions, 0)]
+        if np.issubdtype(values.dtype, np.number) and np.issubdtype(stored_values.dtype, np.number):
+            same = np.isclose(values.astype(np.float64), stored_values.astype(np.float64), rtol=1e-6, equal_nan=True)
+        else:
+            same = pd.Series(values).astype(str).values == pd.Series(stored_values).astype(str).values
+        changed |= exists & ~same
+
+    inserted = ~exists
+    report = {'inserted': int(inserted.sum()), 'updated': int(changed.sum()), 'skipped': int((exists & ~changed).sum())}
+
+    return new[inserted | changed].reset_index(drop=True), report
+
+
+@instrument()
+def ingest(store, name: str, df: pd.DataFrame, version: int = 1, ignore: list = None, wait_for_job: bool = False) -> dict:
+    """
+    Writes only the new and changed rows of a DataFrame to a feature group.
+
+    The stored rows of the dates in the DataFrame are read once, compared on the primary key and the
+    delta is written in a single insert. A new or empty feature group gets all rows without a read.
+
+    Parameters:
+    - store (FeatureStore): Feature store with the feature group.
+    - name (str): Name of the feature group.
+    - df (pd.DataFrame): Rows to ingest.
+    - version (int): Version of the feature group. Default is 1.
+    - ignore (list): Columns that do not count as a change. Default is none.
+    - wait_for_job (bool): If True, waits for the insert job to finish. Default is False.
+
+    Returns:
+    - dict: Number of rows 'inserted', 'updated' and 'skipped'.
+    """
+
+    from pipelines.feature_store import FEATURE_GROUPS
+
+    store.create_feature_group(name, version)
+    if df.empty:
+        return {'inserted': 0, 'updated': 0, 'skipped': 0}
+
+    # Read the stored rows of the same dates, a new feature group cannot be read before its first insert
+    if store.is_empty(name, version):
+        stored = df.iloc[:0]
+    else:
+        dates = df['date'].astype(str)
+        stored = store.read(name, version, start=dates.min(), end=dates.max())
+
+    changes, report = delta(stored, df, FEATURE_GROUPS[name]['primary_key'], ignore)
+    if not changes.empty:
+        store.insert(name, changes, version, wait_for_job=wait_for_job)
+
+    count(**report)
+    return report
@@ -0,0 +1,280 @@
+import os
+from datetime import date, timedelta
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from features.instrumentation import instrument
+
+
+# Price areas and their code in the 'area' feature of the model
+AREAS = ['DK1', 'DK2']
+AREA_CODES = {'DK1': 1, 'DK2': 2}
+
+# Dependent variable of the multi-area model, the price of the area of the row
+TARGET = 'spotpricedkk_kwh'
+
+# Directory of the multi-area model in the repository, the daily workflow trains it once and commits it
+MODEL_DIR = os.path.join(Path(__file__).resolve().parent.parent, 'model', 'multi_area')
+
+# Predictions store of the multi-area model, apart from the DK1 store of the batch inference so neither run
+# overwrites the other. It is inside data/predictions, which the daily workflow commits for the app
+PREDICTIONS_DIR = Path(__file__).resolve().parent.parent / 'data' / 'predictions' / 'areas'
+
+
+def price_column(area: str) -> str:
+    # Column of the price of an area in the wide electricity prices, e.g. 'dk1_spotpricedkk_kwh'
+    return f'{area.lower()}_{TARGET}'
+
+
+def fetch_weather(areas: list = AREAS, forecast: bool = False, start: str = None, end: str = None, forecast_length: int = 5) -> dict:
+    """
+    Fetches the population weighted weather of every price area concurrently.
+
+    Parameters:
+    - areas (list): Price areas. Default is AREAS.
+    - forecast (bool): If True, fetches the weather forecast, otherwise the historical measures from start to end. Default is False.
+    - start (str): Start date of the historical measures.
+    - end (str): End date of the historical measures.
+    - forecast_length (int): Length of the weather forecast in days. Default is 5 days.
+
+    Returns:
+    - dict: Weather DataFrame per price area.
+    """
+
+    from features import weather_measures
+    from pipelines.concurrent_fetch import fetch_sources
+
+    if forecast:
+        options = {'forecast': True, 'forecast_length': forecast_length}
+    else:
+        options = {'historical': True, 'start': start, 'end': end}
+
+    frames, _ = fetch_sources({
+        area: (lambda area=area: weather_measures.multi_location_weather_measures(locations=area, aggregate=True, **options))
+        for area in areas
+    })
+
+    return frames
+
+
+def area_rows(wide: pd.DataFrame, weather: dict, areas: list = AREAS) -> pd.DataFrame:
+    """
+    Turns the wide price columns per area into one row per area and hour with the weather and calendar of the area.
+
+    Every area is a slice of the same columns: the price and its lag features lose the area prefix and
+    the area becomes the 'area' feature.
+
+    Parameters:
+    - wide (pd.DataFrame): DataFrame with 'timestamp' and the price and lag feature columns per area, e.g. 'dk1_spotpricedkk_kwh_lag_24h'.
+    - weather (dict): Weather DataFrame per price area.
+    - areas (list): Price areas. Default is AREAS.
+
+    Returns:
+    - pd.DataFrame: DataFrame with one row per area and hour, sorted by time and area.
+    """
+
+    from features import calendar
+
+    frames = []
+    for area in areas:
+        prefix = price_column(area)
+        columns = [column for column in wide.columns if column.startswith(prefix)]
+        area_slice = wide[['timestamp'] + columns].rename(columns={column: TARGET + column[len(prefix):] for column in columns})
+        frames.append(weather[area].merge(area_slice, on='timestamp', how='inner').assign(area=np.int8(AREA_CODES[area])))
+
+    df = pd.concat(frames, ignore_index=True).sort_values(['timestamp', 'area']).reset_index(drop=True)
+
+    # Adding the danish calendar features by looking up the dates
+    return calendar.join_calendar(df.astype({'date': str}))
+
+
+def training_data(start: str = '2022-01-01', end: str = None, areas: list = AREAS) -> pd.DataFrame:
+    """
+    Fetches the historical prices and weather of the price areas and builds the training data with one row per area and hour.
+
+    Parameters:
+    - start (str): First date of the training data. Default is '2022-01-01'.
+    - end (str): Last date of the training data. Default is yesterday.
+    - areas (list): Price areas. Default is AREAS.
+
+    Returns:
+    - pd.DataFrame: Training data with the 'area' feature, the lag features and 'spotpricedkk_kwh'.
+    """
+
+    from features import electricity_prices
+    from features.lag_features import add_lag_features
+
+    end = end or (date.today() - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    # The prices of all areas come in one wide frame, the lag features are computed for all areas in one pass
+    prices = electricity_prices.electricity_prices(historical=True, area=areas, start=start, end=end, backfill=True)
+    price_columns = [price_column(area) for area in areas]
+    wide, _ = add_lag_features(prices[['timestamp'] + price_columns], columns=price_columns)
+
+    return area_rows(wide, fetch_weather(areas, start=start, end=end), areas)
+
+
+@instrument('multi_area.train')
+def train(df: pd.DataFrame, params: dict = None, model_dir: str = MODEL_DIR) -> dict:
+    """
+    Trains one XGBoost Regressor for all price areas on the hours before the last 20% and evaluates it per area.
+
+    Parameters:
+    - df (pd.DataFrame): Training data from training_data.
+    - params (dict): Hyperparameters of the XGBoost Regressor. Default is the XGBoost defaults.
+    - model_dir (str): Directory where the model is exported. Default is MODEL_DIR.
+
+    Returns:
+    - dict: MAE per price area and over all areas.
+    """
+
+    import xgboost as xgb
+    from sklearn.metrics import mean_absolute_error
+    from pipelines.inference_engine import export_model
+
+    # Split in time, all areas of an hour are on the same side of the split
+    hours = np.sort(df['timestamp'].unique())
+    test = df['timestamp'] >= hours[int(len(hours) * 0.8)]
+
+    X = df.drop(columns=['date', 'datetime', 'timestamp'])
+    y = X.pop(TARGET)
+
+    model = xgb.XGBRegressor(**(params or {}))
+    model.fit(X[~test], y[~test])
+
+    # Evaluate the model per area on the test hours
+    y_pred = model.predict(X[test])
+    metrics = {f'MAE {area}': mean_absolute_error(y[test][X[test]['area'] == AREA_CODES[area]], y_pred[X[test]['area'].values == AREA_CODES[area]]) for area in AREA_CODES if (X['area'] == AREA_CODES[area]).any()}
+    metrics['MAE'] = mean_absolute_error(y[test], y_pred)
+
+    export_model(model, model_dir)
+
+    return metrics
+
+
+def load_price_state(first_timestamp: int, areas: list = AREAS, days: int = 8):
+    """
+    Builds the lag state with the prices of all areas of the last days before the first forecast hour.
+
+    Parameters:
+    - first_timestamp (int): Timestamp in milliseconds of the first forecast hour.
+    - areas (list): Price areas. Default is AREAS.
+    - days (int): Number of days of prices to fetch. Default is 8 days, enough for the 168 hour lag.
+
+    Returns:
+    - LagState: The state with one column per area.
+    """
+
+    from features import electricity_prices
+    from features.lag_features import LagState
+
+    # Fetching the prices of the last days and the prices of today, which are published the day before
+    start = (date.today() - timedelta(days=days)).strftime("%Y-%m-%d")
+    prices = pd.concat([
+        electricity_prices.electricity_prices(historical=True, area=areas, start=start),
+        electricity_prices.electricity_prices(historical=False, area=areas),
+    ], ignore_index=True)
+
+    state = LagState([price_column(area) for area in areas])
+    state.push(prices[prices['timestamp'] < first_timestamp].sort_values('timestamp'))
+
+    return state
+
+
+@instrument('multi_area.predict')
+def predict(engine, new_data: pd.DataFrame, state, areas: list = AREAS) -> pd.DataFrame:
+    """
+    Predicts all price areas and forecast hours, one batched call per hour for all areas.
+
+    Every prediction is added to the lag state, so it becomes the previous price of the next hours of its area.
+
+    Parameters:
+    - engine (InferenceEngine): Engine with the multi-area model.
+    - new_data (pd.DataFrame): One row per area and forecast hour from area_rows, sorted by time and area.
+    - state (LagState): State with one price column per area, in the order of the areas.
+    - areas (list): Price areas. Default is AREAS.
+
+    Returns:
+    - pd.DataFrame: Area x time table with 'area', 'time', 'horizon' and 'prediction'.
+    """
+
+    # Keep only the hours with a row for every area, so every hour is one slice of len(areas) rows
+    counts = new_data.groupby('timestamp')['area'].transform('size')
+    new_data = new_data[counts == len(areas)].sort_values(['timestamp', 'area']).reset_index(drop=True)
+
+    lagged = [name for name in engine.feature_names if name.startswith(TARGET + '_')]
+    columns = [engine.feature_names.index(name) for name in lagged]
+    X = engine.to_array(new_data.reindex(columns=new_data.columns.union(lagged, sort=False)))
+    predictions = np.empty(len(new_data), dtype=np.float32)
+
+    timestamps = new_data['timestamp'].values[::len(areas)]
+    price_columns = [price_column(area) for area in areas]
+
+    for i, timestamp in enumerate(timestamps):
+        rows = slice(i * len(areas), (i + 1) * len(areas))
+        hour = pd.DataFrame({'timestamp': [timestamp], **{column: [np.nan] for column in price_columns}})
+
+        # The features of the state are grouped per area, so they reshape to one row per area
+        features = state.transform(hour).values.reshape(len(areas), -1)
+        X[rows, columns] = features
+        predictions[rows] = engine.predict(X[rows])
+
+        state.push(hour.assign(**dict(zip(price_columns, predictions[rows]))))
+
+    codes = {code: area for area, code in AREA_CODES.items()}
+    return pd.DataFrame({
+        'area': new_data['area'].map(codes),
+        'time': new_data['datetime'],
+        'horizon': ((new_data['timestamp'] - timestamps[0]) // 3_600_000 + 1).astype('int16'),
+        'prediction': predictions,
+    })
+
+
+def run_training(start: str = '2022-01-01', areas: list = AREAS, model_dir: str = MODEL_DIR) -> dict:
+    """
+    Trains the multi-area model on the historical prices and weather and exports it.
+
+    Parameters:
+    - start (str): First date of the training data. Default is '2022-01-01'.
+    - areas (list): Price areas. Default is AREAS.
+    - model_dir (str): Directory where the model is exported. Default is MODEL_DIR.
+
+    Returns:
+    - dict: MAE per price area and over all areas.
+    """
+
+    return train(training_data(start, areas=areas), model_dir=model_dir)
+
+
+def run(forecast_length: int = 5, areas: list = AREAS, model_dir: str = MODEL_DIR, directory: Path = None) -> Path:
+    """
+    Runs the batch inference of all price areas and writes them to the area x time predictions store.
+
+    Parameters:
+    - forecast_length (int): Length of the weather forecast in days. Default is 5 days.
+    - areas (list): Price areas. Default is AREAS.
+    - model_dir (str): Directory of the multi-area model. Default is MODEL_DIR.
+    - directory (Path): Directory of the predictions store. Default is PREDICTIONS_DIR.
+
+    Returns:
+    - Path: Path of the written predictions file.
+    """
+
+    from pipelines import batch_inference
+    from pipelines.inference_engine import InferenceEngine, SCHEMA_FILE
+
+    # Without a model the other areas would silently go stale, so the run fails
+    if not os.path.exists(os.path.join(model_dir, SCHEMA_FILE)):
+        raise FileNotFoundError(f"No multi-area model in {model_dir}, train it with 'python -m pipelines area-training'")
+
+    engine = InferenceEngine.load(model_dir)
+
+    # One row per area and forecast hour, with the weather forecast of the area
+    weather = fetch_weather(areas, forecast=True, forecast_length=forecast_length)
+    hours = pd.concat([weather[area][['timestamp']] for area in areas]).drop_duplicates()
+    new_data = area_rows(hours, weather, areas)
+
+    state = load_price_state(new_data['timestamp'].min(), areas)
+    predictions_df = predict(engine, new_data, state, areas)
+
+    return batch_inference.write_predictions(predictions_df, directory=directory or PREDICTIONS_DIR)
@@ -0,0 +1,181 @@
+import os
+from features.instrumentation import instrument
+
+
+# Directory where the trained model is exported before it is uploaded to the Model Registry
+MODEL_DIR = "model"
+
+# Name of the model in the Model Registry, every upload registers a new version of it
+MODEL_NAME = "electricity_price_prediction_model"
+
+# Dependent variable of the model
+TARGET = 'dk1_spotpricedkk_kwh'
+
+
+def time_split(X, test_size: float = 0.2) -> tuple:
+    """
+    Splits the data in time: the first hours are used for training and the last hours for testing.
+
+    Parameters:
+    - X (pd.DataFrame): Data with a 'timestamp' column.
+    - test_size (float): Share of the hours used for testing. Default is 0.2.
+
+    Returns:
+    - tuple: The training and the testing part, both sorted by time.
+    """
+
+    X = X.sort_values('timestamp').reset_index(drop=True)
+    split = int(len(X) * (1 - test_size))
+
+    return X.iloc[:split], X.iloc[split:]
+
+
+def split_target(X) -> tuple:
+    """
+    Splits the data into the features of the model and the dependent variable.
+
+    Parameters:
+    - X (pd.DataFrame): Data including 'dk1_spotpricedkk_kwh' and the 'date', 'datetime' and 'timestamp' columns.
+
+    Returns:
+    - tuple: The features and the dependent variable.
+    """
+
+    # Drop the columns 'date', 'datetime', and 'timestamp' and take the dependent variable out of the features
+    X = X.drop(columns=['date', 'datetime', 'timestamp'])
+    y = X.pop(TARGET)
+
+    return X, y
+
+
+@instrument()
+def train(X, params: dict = None):
+    """
+    Trains the XGBoost Regressor on the training data and evaluates it on the last hours.
+
+    Parameters:
+    - X (pd.DataFrame): Training data from the feature view, including 'dk1_spotpricedkk_kwh'.
+    - params (dict): Hyperparameters of the XGBoost Regressor, e.g. the best row of the backtest leaderboard. Default is the XGBoost defaults.
+
+    Returns:
+    - tuple: The trained model, the features and target of the training split and the metrics.
+    """
+
+    import xgboost as xgb
+    from sklearn.metrics import mean_squared_error, r2_score, mean_absolute_error
+    from features.lag_features import add_lag_features
+
+    # Lag and rolling features of the previous prices, computed over the full history in time order
+    X, _ = add_lag_features(X)
+
+    # Split in time into 80% training and 20% testing sets, so the model is never tested on hours before its training data
+    train_df, test_df = time_split(X, test_size=0.2)
+    X_train, y_train = split_target(train_df)
+    X_test, y_test = split_target(test_df)
+
+    # Train the XGBoost Regressor on the training data
+    model = xgb.XGBRegressor(**(params or {}))
+    model.fit(X_train, y_train)
+
+    # Evaluate the model on the test set
+    y_pred = model.predict(X_test)
+    metrics = {
+        "MSE": mean_squared_error(y_test, y_pred),
+        "R squared": r2_score(y_test, y_pred),
+        "MAE": mean_absolute_error(y_test, y_pred),
+    }
+
+    return model, X_train, y_train, metrics
+
+
+def save_model(model, X_train, y_train, metrics: dict, model_dir: str = MODEL_DIR, project=None):
+    """
+    Saves the model as a joblib file and as a native booster and uploads them to the Hopsworks Model Registry.
+
+    Parameters:
+    - model: The trained XGBoost Regressor model.
+    - X_train (pd.DataFrame): Features of the training split, used for the model schema.
+    - y_train (pd.Series): Target of the training split, used for the model schema.
+    - metrics (dict): Evaluation metrics of the model.
+    - model_dir (str): Directory where the model is exported. Default is MODEL_DIR.
+    - project: Logged in Hopsworks project. If None, the model is only saved in the model directory.
+    """
+
+    import joblib
+    from pipelines.inference_engine import export_model
+
+    # Save the XGBoost Regressor model as joblib file in the model directory
+    os.makedirs(model_dir, exist_ok=True)
+    joblib.dump(model, model_dir + "/dk_electricity_model.pkl")
+
+    # Save the booster in the native format with its feature order, which is what the batch inference loads
+    export_model(model, model_dir)
+
+    if project is None:
+        return
+
+    from hsml.schema import Schema
+    from hsml.model_schema import ModelSchema
+
+    # Create a model schema using the input and output schemas
+    model_schema = ModelSchema(Schema(X_train), Schema(y_train))
+
+    # Create an entry in the model registry and upload the model to Hopsworks
+    mr = project.get_model_registry()
+    xgb_model = mr.python.create_model(
+        name=MODEL_NAME,
+        metrics=metrics,
+        model_schema=model_schema,
+        input_example=X_train.sample(),
+        description="DK1 Electricity Price Predictor",
+    )
+    xgb_model.save(model_dir)
+
+
+def load_training_data(store=None, source: str = 'feature_store'):
+    """
+    Loads the training data from the feature store or from the history archive.
+
+    Parameters:
+    - store (FeatureStore): Feature store with the training data. Default is the store of the configured backend.
+    - source (str): 'feature_store' joins the feature groups in the feature view, 'archive' reads the memory mapped history archive. Default is 'feature_store'.
+
+    Returns:
+    - pd.DataFrame: Prices, weather measures, renewable energy forecasts and calendar features per hour.
+    """
+
+    if source == 'archive':
+        from pipelines import history_archive
+        return history_archive.training_data()
+    if source == 'feature_store':
+        from pipelines.feature_store import get_feature_store
+        return (store or get_feature_store()).training_data()
+
+    raise ValueError(f"Unknown training data source '{source}', must be 'feature_store' or 'archive'")
+
+
+def run(model_dir: str = MODEL_DIR, store=None, source: str = 'feature_store') -> dict:
+    """
+    Runs the training pipeline: builds the training data from the feature store or the history archive, trains the model and saves it.
+
+    The model is uploaded to the Model Registry when the feature store is the Hopsworks Feature Store.
+
+    Parameters:
+    - model_dir (str): Directory where the model is exported. Default is MODEL_DIR.
+    - store (FeatureStore): Feature store with the training data and the Model Registry. Default is the store of the configured backend.
+    - source (str): Source of the training data, 'feature_store' or 'archive'. Default is 'feature_store'.
+
+    Returns:
+    - dict: Evaluation metrics of the model.
+    """
+
+    from pipelines.feature_store import get_feature_store
+
+    # Retrieve the training data by joining the feature groups or from the history archive
+    store = store or get_feature_store()
+    X = load_training_data(store, source)
+
+    model, X_train, y_train, metrics = train(X)
+    save_model(model, X_train, y_train, metrics, model_dir, project=getattr(store, 'project', None))
+
+    return metrics
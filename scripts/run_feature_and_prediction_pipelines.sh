@@ -2,10 +2,10 @@
 
 set -e
 
-cd notebooks
+# Train the multi-area model when it is not committed yet, the workflow commits it for the next runs
+if [ ! -f model/multi_area/model_schema.json ]; then
+    python -m pipelines area-training
+fi
 
-# Run the feature pipeline
-jupyter nbconvert --to notebook --execute 2_feature_pipeline.ipynb
-
-# Run the batch inference pipeline
-jupyter nbconvert --to notebook --execute 4_batch_inference.ipynb
+# Run the feature pipeline, the DK1 batch inference and the batch inference of all price areas as plain Python modules
+python -m pipelines feature inference area-inference